@@ -3,6 +3,8 @@ from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from flask_session import Session
 from app.routes import register_blueprints
+from app.extensions import MsgspecJSONProvider
+from config.database import close_db_session
 from apscheduler.schedulers.background import BackgroundScheduler
 import os
 from dotenv import load_dotenv
@@ -15,14 +17,17 @@ _scheduler = BackgroundScheduler()
 
 def create_app():
     app = Flask(__name__)
+    app.json = MsgspecJSONProvider(app)
     app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'default_secret_key_CHANGE_THIS')
     app.config["SESSION_TYPE"] = "filesystem"
 
-    CORS(app)
+    # Arrow responses carry grid metadata in headers the browser must be allowed to read
+    CORS(app, expose_headers=['X-Total-Rows', 'X-Offset', 'X-Session-Id'])
     JWTManager(app)
     Session(app)
 
     register_blueprints(app)
+    app.teardown_appcontext(close_db_session)
 
     if not app.testing:
         import os as _os
@@ -0,0 +1,9 @@
+from flask.json.provider import DefaultJSONProvider
+from app.services.frame_serializer import FrameSerializer
+
+
+class MsgspecJSONProvider(DefaultJSONProvider):
+    """jsonify() backed by msgspec; grid payloads are large and the stdlib encoder is the bottleneck."""
+
+    def dumps(self, obj, **kwargs) -> str:
+        return FrameSerializer.dumps(obj)
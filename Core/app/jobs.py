@@ -1,4 +1,3 @@
-import os
 from datetime import datetime
 
 
@@ -6,6 +5,11 @@ def cleanup_expired_files():
     """Remove disk files and deactivate DB records for conversations past their TTL."""
     from config.database import SessionLocal
     from app.models.conversation import Conversation
+    from app.services.snapshot_service import SnapshotService
+    from app.services.dataframe_cache import dataframe_cache
+    from app.services.excel_service import ExcelService
+    from app.services.llm_cache_service import LLMCacheService
+    from app.services.export_cache import ExportCache
 
     session = SessionLocal()
     try:
@@ -15,8 +19,11 @@ def cleanup_expired_files():
             Conversation.expires_at <= datetime.utcnow()
         ).all()
         for conv in expired:
-            if conv.file_path and os.path.exists(conv.file_path):
-                os.remove(conv.file_path)
+            if conv.file_path:
+                ExcelService.remove_upload(conv.file_path)
+            SnapshotService.discard(conv.id)
+            ExportCache.discard(conv.id)
+            dataframe_cache.invalidate(conv.id)
             conv.is_active = False
         session.commit()
         if expired:
@@ -26,3 +33,11 @@ def cleanup_expired_files():
         print(f"[TTL CLEANUP] Error: {e}")
     finally:
         session.close()
+
+    purged = LLMCacheService.purge_expired()
+    if purged:
+        print(f"[TTL CLEANUP] Purged {purged} expired LLM cache entries")
+
+    evicted = ExportCache.evict()
+    if evicted:
+        print(f"[TTL CLEANUP] Evicted {evicted} cached export(s) over the size limit")
@@ -1,5 +1,6 @@
 from .user import User
 from .conversation import Conversation
 from .command import Command
+from .llm_cache import LLMCacheEntry
 
-__all__ = ['User', 'Conversation', 'Command']
+__all__ = ['User', 'Conversation', 'Command', 'LLMCacheEntry']
@@ -1,18 +1,30 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Boolean
+from sqlalchemy import Column, Integer, Float, String, DateTime, ForeignKey, Text, Boolean, LargeBinary, Index
 from config.database import Base
 from datetime import datetime
 
 class Command(Base):
     __tablename__ = 'commands'
+    __table_args__ = (
+        # Active history in order (replay, versions, undo) and the latest active chart
+        Index('ix_commands_conversation_active_id', 'conversation_id', 'is_active', 'id'),
+    )
     id = Column(Integer, primary_key=True)
     conversation_id = Column(Integer, ForeignKey('conversations.id'), nullable=False)
     prompt = Column(Text, nullable=False)
     chart_generated_code = Column(Text, nullable=True)
     generated_code = Column(Text, nullable=False)
+    code_hash = Column(String(64), nullable=True)  # sha256 of generated_code
+    compiled_code = Column(LargeBinary, nullable=True)  # Validated bytecode: interpreter magic + marshal
     explanation = Column(Text, nullable=True)
     intent_type = Column(String(20), nullable=False, default='DATA_MUTATION')
     is_active = Column(Boolean, default=True, nullable=False)
     created_at = Column(DateTime(), default=datetime.utcnow, nullable=False)
+    # Request metrics for offline analysis (see app.services.tracing); llm_ms is null on the fast path
+    llm_ms = Column(Float, nullable=True)
+    exec_ms = Column(Float, nullable=True)
+    rows_in = Column(Integer, nullable=True)
+    rows_out = Column(Integer, nullable=True)
+    payload_bytes = Column(Integer, nullable=True)  # Size of the done event sent to the client
 
     def serialize(self):
         return {
@@ -1,16 +1,33 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Index
+from sqlalchemy.orm import relationship
 from config.database import Base
 from datetime import datetime
 
 class Conversation(Base):
     __tablename__ = 'conversations'
+    __table_args__ = (
+        Index('ix_conversations_user_active_created', 'user_id', 'is_active', 'created_at'),
+        Index('ix_conversations_active_expires', 'is_active', 'expires_at'),  # TTL cleanup
+    )
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     file_path = Column(String(255), nullable=False)
+    file_hash = Column(String(64), nullable=True)  # sha256 of the uploaded file, part of every state version
     filename = Column(String(255), nullable=False)
     is_active = Column(Boolean(), default=True)
     created_at = Column(DateTime(), default=datetime.utcnow, nullable=False)
     expires_at = Column(DateTime(), nullable=True)
+    # Denormalized from commands, kept by StateManager (no FK: they move on every write/undo)
+    head_command_id = Column(Integer, nullable=True)  # Last active command
+    active_chart_command_id = Column(Integer, nullable=True)  # Last active command with chart code
+
+    # Active history in order; StateManager.get_session joins it into the conversation query
+    active_commands = relationship(
+        'Command',
+        primaryjoin='and_(Conversation.id == foreign(Command.conversation_id), Command.is_active == True)',
+        order_by='Command.id',
+        viewonly=True,
+    )
 
     def serialize(self):
         return {
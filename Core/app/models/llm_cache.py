@@ -0,0 +1,27 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text
+from config.database import Base
+from datetime import datetime
+
+class LLMCacheEntry(Base):
+    __tablename__ = 'llm_cache'
+    id = Column(Integer, primary_key=True)
+    cache_key = Column(String(64), unique=True, nullable=False, index=True)
+    model = Column(String(120), nullable=False)
+    prompt = Column(Text, nullable=False)
+    code = Column(Text, nullable=False)
+    explanation = Column(Text, nullable=True)
+    intent = Column(String(20), nullable=False)
+    hit_count = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime(), default=datetime.utcnow, nullable=False)
+    last_hit_at = Column(DateTime(), nullable=True)
+
+    def serialize(self):
+        return {
+            "id": self.id,
+            "model": self.model,
+            "prompt": self.prompt,
+            "intent": self.intent,
+            "hit_count": self.hit_count,
+            "created_at": self.created_at.isoformat(),
+            "last_hit_at": self.last_hit_at.isoformat() if self.last_hit_at else None
+        }
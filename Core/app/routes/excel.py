@@ -1,12 +1,26 @@
-from flask import Blueprint, request, jsonify, Response, stream_with_context, send_file
-import io
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 import json
+import time
+import types
 import pandas as pd
-import openpyxl
-from app.services.excel_service import ExcelService
-from app.services.llm_service import LLMService
+from app.services.excel_service import ExcelService, GRID_WINDOW_ROWS, GRID_MAX_WINDOW_ROWS
+from app.services.llm_service import LLMService, LLMTimeout
+from app.services.llm_governor import llm_governor, LLMUnavailable
+from app.services.llm_cache_service import LLMCacheService
+from app.services.intent_parser import IntentParser
+from app.services.column_profile import ColumnProfiler, COLUMN_PROFILE_ENABLED
 from app.services.code_execution_service import CodeExecutionService
 from app.services.state_manager import StateManager
+from app.services.frame_serializer import FrameSerializer, ARROW_MIMETYPE
+from app.services.frame_diff import FrameDiff
+from app.services.formula_overlay import FormulaOverlay
+from app.services.formula_engine import FormulaEngine
+from app.services.export_service import ExportService, EXPORT_MIMETYPES
+from app.services.export_cache import ExportCache
+from app.services.snapshot_service import SnapshotService
+from app.services.dataframe_cache import dataframe_cache
+from app.services.sandbox_pool import sandbox_pool
+from app.services.tracing import Trace, TRACE_DEBUG
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
 excel_bp = Blueprint('excel', __name__)
@@ -20,6 +34,93 @@ def format_sse(data: str, event: str = None) -> str:
     return msg + f'data: {data}\n\n'
 
 
+# SSE comment: clients ignore it, but writing it fails once the client has gone away, which
+# closes the stream generator (GeneratorExit) instead of leaving it waiting on the model
+SSE_HEARTBEAT = ': keepalive\n\n'
+
+
+def _grid_layout() -> str:
+    """Grid payload layout requested by the client (?layout=columns), defaulting to row dicts."""
+    return 'columns' if request.values.get('layout') == 'columns' else 'rows'
+
+
+def _state_etag(session_id, user_id, variant: str) -> str:
+    """ETag of a representation of the conversation's current state (see StateManager.get_version)."""
+    return f"{StateManager.get_version(session_id, user_id)}-{variant}"
+
+
+def _cacheable(response, etag: str):
+    """Tag a response so clients revalidate with If-None-Match instead of re-downloading."""
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _wants_delta() -> bool:
+    """Client can apply grid patches (delta=1) instead of receiving the full window."""
+    return request.values.get('delta') == '1'
+
+
+def _wants_arrow() -> bool:
+    """True when the client negotiated Arrow IPC (Accept header); JSON stays the default."""
+    return request.accept_mimetypes.best_match(['application/json', ARROW_MIMETYPE]) == ARROW_MIMETYPE
+
+
+def _arrow_response(df, offset: int = 0, limit: int = None, columns: list = None, headers: dict = None):
+    """Grid window as an Arrow IPC stream; row count and window bounds travel in headers."""
+    window = ExcelService.slice_window(df, offset, limit, columns)
+    response = Response(FrameSerializer.to_arrow_ipc(window), mimetype=ARROW_MIMETYPE)
+    response.headers['X-Total-Rows'] = str(len(df))
+    response.headers['X-Offset'] = str(offset)
+    for key, value in (headers or {}).items():
+        response.headers[key] = value
+    return response
+
+
+def _grid_update(conversation_id, before, after, layout: str, wants_arrow: bool, wants_delta: bool):
+    """(data, data_ref, patch) for a done event: a patch when asked for and cheaper, else the grid."""
+    patch_data = FrameDiff.compute(before, after) if wants_delta else None
+    if patch_data is not None:
+        return None, None, patch_data
+    if wants_arrow:
+        # Binary frames cannot travel over SSE: point the client at the window endpoint
+        return None, {
+            "url": f"/excel/conversation/{conversation_id}/rows",
+            "format": ARROW_MIMETYPE,
+            "total_rows": len(after)
+        }, None
+    return ExcelService.format_dataframe_response(after, layout=layout), None, None
+
+
+def _done_event(trace: Trace, payload: dict, dumps=json.dumps) -> str:
+    """
+    Serialize a done event and close the request's trace: the metrics go to the command
+    row and one [TRACE] log line; with TRACE_DEBUG the stage timings also ride the event.
+    """
+    with trace.stage('serialize'):
+        body = dumps(payload)
+    trace.count(payload_bytes=len(body.encode('utf-8')))
+    command_id = trace.fields.get('command_id')
+    if command_id is not None:
+        try:
+            with trace.stage('metrics'):
+                StateManager.record_metrics(
+                    command_id,
+                    llm_ms=trace.ms('llm'),
+                    exec_ms=trace.ms('execute'),
+                    rows_in=trace.counters.get('rows_in'),
+                    rows_out=trace.counters.get('rows_out'),
+                    payload_bytes=trace.counters['payload_bytes']
+                )
+        except Exception as metrics_err:
+            # The change itself is stored: losing its metrics must not fail the request
+            print(f"[TRACE] Metrics not recorded for command {command_id}: {metrics_err}")
+    trace.log()
+    if TRACE_DEBUG:
+        body = dumps({**payload, "timings": trace.breakdown()})
+    return body
+
+
 @excel_bp.post('/upload')
 @jwt_required()
 def upload_excel():
@@ -47,7 +148,9 @@ def upload_excel():
         session_data = StateManager.get_session(session_id, current_user_id)
 
         df = session_data['initial_df']
-        data = ExcelService.format_dataframe_response(df)
+        if _wants_arrow():
+            return _arrow_response(df, headers={'X-Session-Id': str(session_id)}), 200
+        data = ExcelService.format_dataframe_response(df, layout=_grid_layout())
 
         return jsonify({
             "status": "success",
@@ -75,23 +178,81 @@ def transform_excel():
     if len(prompt) > 2000:
         return jsonify({"error": "El prompt es demasiado largo (máximo 2000 caracteres)"}), 400
 
+    layout = _grid_layout()
+    wants_arrow = _wants_arrow()
+    wants_delta = _wants_delta()
+
+    use_llm_cache = request.values.get('no_cache') != '1'
+
     def generate():
+        code_data = None
+        trace = Trace('transform', session_id=session_id)
         try:
             yield format_sse(json.dumps({"step": "Interpretando..."}), event="progress")
 
-            session = StateManager.get_session(session_id, current_user_id)
-            file_path = session['conversation'].file_path
+            with trace.stage('session'):
+                session = StateManager.get_session(session_id, current_user_id)
+            conversation_id = session['conversation'].id
 
             # Replay to get current DataFrame
-            current_df = _replay_session(session)
+            with trace.stage('replay'):
+                current_df = _replay_session(session)
+                overlay = FormulaOverlay.build(session['commands'])
+                version = StateManager.state_version(session['commands'])
+            trace.count(rows_in=len(current_df))
 
             columns = current_df.columns.tolist()
-            sample_data = None
-            if not current_df.empty:
-                sample_data = current_df.iloc[0].where(pd.notnull(current_df.iloc[0]), None).to_dict()
 
-            # Generate transformation code from LLM
-            code_data = LLMService.generate_transformation_code(prompt, columns, sample_data)
+            # Mechanical prompts (sort, filter, rename...) skip the LLM entirely
+            dtypes = [str(dtype) for dtype in current_df.dtypes]
+            with trace.stage('parse'):
+                code_data = IntentParser.parse(prompt, columns, dtypes, len(current_df))
+            parse_ms = trace.timings['parse']
+            IntentParser.record(code_data, parse_ms)
+            if code_data is not None:
+                trace.fields['rule'] = code_data['rule']
+                print(f"[FAST PATH] rule={code_data['rule']} parse_ms={parse_ms:.2f}")
+            else:
+                # Describe the data to the model: a cached, token-budgeted column profile, or the
+                # column list and first row when profiles are disabled
+                sample_data, schema = None, None
+                with trace.stage('context'):
+                    if COLUMN_PROFILE_ENABLED:
+                        schema, context_tokens = ColumnProfiler.context(
+                            conversation_id, version, current_df, prompt
+                        )
+                        trace.count(context_tokens=context_tokens)
+                    elif not current_df.empty:
+                        sample_data = current_df.iloc[0].where(pd.notnull(current_df.iloc[0]), None).to_dict()
+
+                # Generate transformation code from LLM, forwarding the explanation as it is written.
+                # Only time spent inside the LLM generator counts, not the client reading tokens
+                with trace.stage('llm'):
+                    llm_output = LLMService.generate_transformation_code(
+                        prompt, columns, sample_data, dtypes=dtypes, use_cache=use_llm_cache, stream=True,
+                        user_id=current_user_id, schema=schema
+                    )
+                if isinstance(llm_output, types.GeneratorType):
+                    try:
+                        while True:
+                            with trace.stage('llm'):
+                                item = next(llm_output, None)
+                            if item is None:
+                                break
+                            event, value = item
+                            if event == 'token':
+                                yield format_sse(json.dumps({"text": value}), event="token")
+                            elif event == 'waiting':
+                                yield SSE_HEARTBEAT
+                            elif event == 'queued':
+                                yield format_sse(json.dumps({"step": f"En cola (posición {value})...",
+                                                             "queue_position": value}), event="progress")
+                            else:
+                                code_data = value
+                    finally:
+                        llm_output.close()  # Cancels the model call if the client left mid-stream
+                else:
+                    code_data = llm_output
 
             if isinstance(code_data, dict):
                 code = code_data['code']
@@ -100,49 +261,60 @@ def transform_excel():
             else:
                 code, explanation = code_data
                 intent = 'DATA_MUTATION'
+            trace.fields['intent'] = intent
 
             yield format_sse(json.dumps({"step": "Ejecutando..."}), event="progress")
 
             if intent == 'FORMULA_WRITE':
                 # code may be already a list (parsed by LLM service) or a JSON string
                 formula_instructions = code if isinstance(code, list) else json.loads(code)
-                CodeExecutionService.apply_formula_write(file_path, formula_instructions)
-                StateManager.add_command(
-                    session_id, prompt,
-                    json.dumps(formula_instructions),  # must be a string for Text column
-                    explanation,
-                    intent_type='FORMULA_WRITE'
-                )
-                # Re-read keeping formula strings — pd.read_excel can't do this,
-                # so we use openpyxl directly (data_only=False preserves formula text)
-                wb = openpyxl.load_workbook(file_path, data_only=False)
-                ws = wb.active
-                rows = list(ws.values)
-                if rows:
-                    headers = [str(c) if c is not None else '' for c in rows[0]]
-                    updated_df = pd.DataFrame(rows[1:], columns=headers)
-                else:
-                    updated_df = pd.DataFrame()
-                data = ExcelService.format_dataframe_response(updated_df)
-                yield format_sse(json.dumps({
+                for instruction in formula_instructions:
+                    FormulaOverlay.cell_position(instruction['cell'])  # Reject bad references before storing
+                with trace.stage('persist'):
+                    command_id = StateManager.add_command(
+                        session_id, prompt,
+                        json.dumps(formula_instructions),  # must be a string for Text column
+                        explanation,
+                        intent_type='FORMULA_WRITE'
+                    )
+                trace.fields['command_id'] = command_id
+                # Formulas live in the overlay until export: the data itself is unchanged
+                dataframe_cache.put(conversation_id, StateManager.extend_version(
+                    version, command_id, json.dumps(formula_instructions)), current_df)
+                # Only the written cells and their dependents are evaluated for the new grid
+                with trace.stage('execute'):
+                    before = _overlay_frame(conversation_id, current_df, overlay)
+                    after = _overlay_frame(conversation_id, current_df, FormulaOverlay.merge(dict(overlay), formula_instructions))
+                trace.count(rows_out=len(after))
+                with trace.stage('grid'):
+                    data, data_ref, patch_data = _grid_update(conversation_id, before, after, layout, wants_arrow, wants_delta)
+                yield format_sse(_done_event(trace, {
                     "step": "Listo",
                     "type": "formula",
                     "data": data,
+                    "data_ref": data_ref,
+                    "patch": patch_data,
                     "explanation": explanation,
                     "chart_data": None,
                     "has_chart": False
-                }), event="done")
+                }, FrameSerializer.dumps), event="done")
 
             elif intent == 'VISUAL_UPDATE':
-                chart_json = CodeExecutionService.execute_chart_generation(current_df, code)
-                StateManager.add_command(
-                    session_id, prompt,
-                    "pass",
-                    explanation,
-                    chart_code=code,
-                    intent_type='VISUAL_UPDATE'
-                )
-                yield format_sse(json.dumps({
+                with trace.stage('chart'):
+                    chart_json = CodeExecutionService.execute_chart_generation(current_df, code)
+                with trace.stage('persist'):
+                    command_id = StateManager.add_command(
+                        session_id, prompt,
+                        "pass",
+                        explanation,
+                        chart_code=code,
+                        intent_type='VISUAL_UPDATE'
+                    )
+                trace.fields['command_id'] = command_id
+                trace.count(rows_out=len(current_df))
+                # Chart commands leave the data untouched — the current frame is the new head
+                dataframe_cache.put(conversation_id, StateManager.extend_version(version, command_id, "pass", code), current_df)
+                yield format_sse(_done_event(trace, {
                     "step": "Listo",
                     "type": "chart",
                     "data": None,
@@ -152,43 +324,77 @@ def transform_excel():
                 }), event="done")
 
             else:
-                # DATA_MUTATION — pre-exec validate, execute, store
-                for pattern in ['import ', 'open(', 'os.', 'sys.', 'subprocess.', '__class__', '__subclasses__']:
-                    if pattern in code:
-                        raise ValueError(f"Forbidden pattern in generated code: {pattern!r}")
-
-                StateManager.add_command(
-                    session_id, prompt,
-                    code,
-                    explanation,
-                    intent_type='DATA_MUTATION'
-                )
-                modified_df = CodeExecutionService.execute_transformation(current_df, code)
-                data = ExcelService.format_dataframe_response(modified_df)
-
-                # Reactive chart update if one is active
+                # DATA_MUTATION — validate + compile once, store, execute
+                with trace.stage('compile'):
+                    compiled = CodeExecutionService.compile_transformation(code)
+
+                with trace.stage('persist'):
+                    command_id = StateManager.add_command(
+                        session_id, prompt,
+                        code,
+                        explanation,
+                        intent_type='DATA_MUTATION'
+                    )
+                trace.fields['command_id'] = command_id
+                with trace.stage('execute'):
+                    modified_df = CodeExecutionService.execute_transformation(current_df, compiled)
+                trace.count(rows_out=len(modified_df))
+                if SnapshotService.should_checkpoint(len(session['commands']), trace.timings['execute'] / 1000):
+                    with trace.stage('snapshot'):
+                        SnapshotService.save(conversation_id, command_id, modified_df)
+                dataframe_cache.put(conversation_id, StateManager.extend_version(version, command_id, code), modified_df)
+
+                with trace.stage('grid'):
+                    data, data_ref, patch_data = _grid_update(
+                        conversation_id,
+                        _overlay_frame(conversation_id, current_df, overlay),
+                        _overlay_frame(conversation_id, modified_df, overlay),
+                        layout, wants_arrow, wants_delta
+                    )
+
+                # Reactive chart update if one is active (a data mutation never changes which)
                 updated_chart_data = None
                 has_chart = False
-                chart_code = StateManager.get_active_chart_code(session_id)
+                chart_code = session['chart_code']
                 if chart_code:
                     try:
-                        chart_json = CodeExecutionService.execute_chart_generation(modified_df, chart_code)
+                        with trace.stage('chart'):
+                            chart_json = CodeExecutionService.execute_chart_generation(modified_df, chart_code)
                         updated_chart_data = json.loads(chart_json)
                         has_chart = True
                     except Exception as chart_err:
                         print(f"Reactive chart update failed: {chart_err}")
 
-                yield format_sse(json.dumps({
+                yield format_sse(_done_event(trace, {
                     "step": "Listo",
                     "type": "update",
                     "data": data,
+                    "data_ref": data_ref,
+                    "patch": patch_data,
                     "explanation": explanation,
                     "chart_data": updated_chart_data,
                     "has_chart": has_chart
-                }), event="done")
-
+                }, FrameSerializer.dumps), event="done")
+
+        except GeneratorExit:
+            # The client went away: nothing after the last delivered event runs (no persist, no exec)
+            print(f"[TRANSFORM] Client disconnected, request abandoned: session={session_id}")
+            trace.log(disconnected=True)
+            raise
+        except LLMTimeout as e:
+            print(f"[TRANSFORM ERROR] prompt={prompt!r} error={e}")
+            trace.log(error='LLMTimeout')
+            yield format_sse(json.dumps({"error": "El modelo tardó demasiado en responder. Intenta de nuevo."}), event="error")
+        except LLMUnavailable as e:
+            print(f"[TRANSFORM ERROR] prompt={prompt!r} error={e}")
+            trace.log(error='LLMUnavailable')
+            yield format_sse(json.dumps({"error": "El servicio de IA no está disponible en este momento. Intenta en unos minutos."}), event="error")
         except Exception as e:
             print(f"[TRANSFORM ERROR] prompt={prompt!r} error={e}")
+            trace.log(error=type(e).__name__)
+            if isinstance(code_data, dict) and code_data.get('cache_key'):
+                # Never serve an answer that just failed again
+                LLMCacheService.discard(code_data['cache_key'])
             yield format_sse(json.dumps({"error": "No pude aplicar ese cambio. Intenta ser más específico."}), event="error")
 
     return Response(
@@ -214,18 +420,22 @@ def undo_excel():
         # Peek at command count before undo to detect no-op
         pre_session = StateManager.get_session(session_id, current_user_id)
         had_commands = len(pre_session['commands']) > 0
+        previous_df = _display_frame(pre_session, _replay_session(pre_session)) \
+            if _wants_delta() and had_commands else None
 
-        StateManager.undo_last_command(session_id)
-
-        session = StateManager.get_session(session_id, current_user_id)
+        # Undoing a formula just drops it from the overlay; the uploaded file is never rewritten
+        session = StateManager.undo_last_command(session_id, pre_session)
         current_df = _replay_session(session)
+        display_df = _display_frame(session, current_df)
 
-        data = ExcelService.format_dataframe_response(current_df)
+        patch_data = FrameDiff.compute(previous_df, display_df) if previous_df is not None else None
+        data = None if patch_data is not None else \
+            ExcelService.format_dataframe_response(display_df, layout=_grid_layout())
 
         # Chart sync — re-execute active chart code post-undo
         chart_data = None
         has_chart = False
-        chart_code = StateManager.get_active_chart_code(session_id)
+        chart_code = session['chart_code']
         if chart_code:
             try:
                 chart_json = CodeExecutionService.execute_chart_generation(current_df, chart_code)
@@ -238,6 +448,7 @@ def undo_excel():
             "status": "success",
             "message": "Deshacer exitoso",
             "data": data,
+            "patch": patch_data,
             "chart_data": chart_data,
             "has_chart": has_chart,
             "undone": had_commands
@@ -257,12 +468,12 @@ def reset_excel():
         return jsonify({"error": "Faltan datos (session_id)"}), 400
 
     try:
-        StateManager.clear_commands(session_id)
-
+        # Ownership is checked by loading the session before anything is cleared
         session = StateManager.get_session(session_id, current_user_id)
+        StateManager.clear_commands(session_id)
         original_df = session['initial_df']
 
-        data = ExcelService.format_dataframe_response(original_df)
+        data = ExcelService.format_dataframe_response(original_df, layout=_grid_layout())
 
         return jsonify({
             "status": "success",
@@ -294,17 +505,22 @@ def get_conversations():
 def get_conversation_state(session_id):
     current_user_id = get_jwt_identity()
     try:
+        # 0. Unchanged since the client's last fetch: skip replay and serialization
+        etag = _state_etag(session_id, current_user_id, _grid_layout())
+        if request.if_none_match.contains(etag):
+            return _cacheable(Response(status=304), etag)
+
         # 1. Get Session
         session_data = StateManager.get_session(session_id, current_user_id)
 
         # 2. Replay to get current Grid
         current_df = _replay_session(session_data)
-        grid_data = ExcelService.format_dataframe_response(current_df)
+        grid_data = ExcelService.format_dataframe_response(_display_frame(session_data, current_df), layout=_grid_layout())
 
         # 3. Get Active Chart (Persistence)
         chart_data = None
         has_chart = False
-        chart_code = StateManager.get_active_chart_code(session_id)
+        chart_code = session_data['chart_code']
         if chart_code:
             try:
                 chart_json = CodeExecutionService.execute_chart_generation(current_df, chart_code)
@@ -333,7 +549,7 @@ def get_conversation_state(session_id):
                 "timestamp": cmd.created_at.isoformat()
             })
 
-        return jsonify({
+        return _cacheable(jsonify({
             "status": "success",
             "data": {
                 "filename": session_data['conversation'].filename,
@@ -342,10 +558,50 @@ def get_conversation_state(session_id):
                 "has_chart": has_chart,
                 "messages": formatted_messages
             }
-        }), 200
+        }), etag), 200
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 403
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@excel_bp.get('/conversation/<int:session_id>/rows')
+@jwt_required()
+def get_conversation_rows(session_id):
+    """Return a window of the current grid: ?offset=&limit=&columns=col1,col2"""
+    current_user_id = get_jwt_identity()
+
+    offset = request.args.get('offset', 0, type=int)
+    limit = request.args.get('limit', GRID_WINDOW_ROWS, type=int)
+    columns_arg = request.args.get('columns')
+    if offset is None or offset < 0:
+        return jsonify({"error": "offset inválido"}), 400
+    if limit is None or limit < 1 or limit > GRID_MAX_WINDOW_ROWS:
+        return jsonify({"error": f"limit debe estar entre 1 y {GRID_MAX_WINDOW_ROWS}"}), 400
 
+    try:
+        session_data = StateManager.get_session(session_id, current_user_id)
     except ValueError as e:
         return jsonify({"error": str(e)}), 403
+
+    try:
+        current_df = _display_frame(session_data, _replay_session(session_data))
+
+        columns = None
+        if columns_arg:
+            columns = [c for c in columns_arg.split(',') if c]
+            unknown = [c for c in columns if c not in current_df.columns]
+            if unknown:
+                return jsonify({"error": f"Columnas desconocidas: {unknown}"}), 400
+
+        if _wants_arrow():
+            return _arrow_response(current_df, offset=offset, limit=limit, columns=columns), 200
+        data = ExcelService.format_dataframe_response(current_df, offset=offset, limit=limit, columns=columns, layout=_grid_layout())
+        return jsonify({
+            "status": "success",
+            "data": data
+        }), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -369,28 +625,66 @@ def delete_conversation(session_id):
         return jsonify({"error": str(e)}), 500
 
 
+@excel_bp.get('/metrics')
+@jwt_required()
+def get_metrics():
+    """Process-local performance counters, used to size caches."""
+    return jsonify({
+        "status": "success",
+        "metrics": {
+            "dataframe_cache": dataframe_cache.stats(),
+            "llm_cache": LLMCacheService.stats(),
+            "fast_path": IntentParser.stats(),
+            "sandbox": sandbox_pool.stats(),
+            "llm_governor": llm_governor.stats(),
+            "column_profile": ColumnProfiler.stats()
+        }
+    }), 200
+
+
 @excel_bp.get('/download/<int:session_id>')
 @jwt_required()
 def download_excel(session_id):
+    """
+    Streams the current state as ?format=xlsx (default, overlay formulas included),
+    csv or parquet (computed values). Rows are encoded and sent chunk by chunk, and
+    the rendered file is kept in the export cache under the state's version hash.
+    Ownership and the version come from one light query; the session (frames and
+    commands) is only loaded when the export has to be rendered.
+    """
     current_user_id = get_jwt_identity()
+    export_format = request.args.get('format', 'xlsx').lower()
+    if export_format not in EXPORT_MIMETYPES:
+        return jsonify({"error": f"Formato no soportado: {export_format}"}), 400
     try:
-        session_data = StateManager.get_session(session_id, current_user_id)
-        current_df = _replay_session(session_data)
-        filename = session_data['conversation'].filename
-        safe_name = filename if filename.lower().endswith('.xlsx') \
-                    else filename.rsplit('.', 1)[0] + '.xlsx'
-
-        buf = io.BytesIO()
-        with pd.ExcelWriter(buf, engine='openpyxl') as writer:
-            current_df.to_excel(writer, index=False, sheet_name='Sheet1')
-        buf.seek(0)  # CRITICAL: reset cursor — without this, send_file sends 0 bytes
-
-        return send_file(
-            buf,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=safe_name,
-        )
+        version, filename = StateManager.get_version_info(session_id, current_user_id)
+        etag = f"{version}-{export_format}"
+        if request.if_none_match.contains(etag):
+            return _cacheable(Response(status=304), etag)
+
+        safe_name = filename.rsplit('.', 1)[0] + '.' + export_format
+
+        cached_path = ExportCache.get(session_id, version, export_format)
+        if cached_path:
+            chunks = ExportCache.read(cached_path)
+        else:
+            session_data = StateManager.get_session(session_id, current_user_id)
+            current_df = _replay_session(session_data)
+            overlay = FormulaOverlay.build(session_data['commands'])
+            if export_format == 'xlsx':
+                # The only place formulas are ever written into a workbook
+                rendered = ExportService.xlsx_chunks(current_df, overlay)
+            elif export_format == 'csv':
+                rendered = ExportService.csv_chunks(_overlay_frame(session_id, current_df, overlay))
+            else:
+                rendered = ExportService.parquet_chunks(_overlay_frame(session_id, current_df, overlay))
+            chunks = ExportCache.tee(session_id, version, export_format, rendered)
+
+        return _cacheable(Response(
+            stream_with_context(chunks),
+            mimetype=EXPORT_MIMETYPES[export_format],
+            headers={'Content-Disposition': f'attachment; filename="{safe_name}"'}
+        ), etag)
     except ValueError as e:
         return jsonify({"error": str(e)}), 403
     except Exception as e:
@@ -398,25 +692,62 @@ def download_excel(session_id):
 
 
 def _replay_session(session):
-    """Helper to replay all commands from initial_df, routing by intent_type."""
-    df = session['initial_df'].copy()
-    file_path = session['conversation'].file_path
-
-    for cmd in session['commands']:
+    """
+    Helper to replay active commands, routing by intent_type.
+    Serves the in-process cache when the head command is unchanged; otherwise starts
+    from the newest snapshot checkpoint (or initial_df) and only runs the tail,
+    checkpointing every SNAPSHOT_INTERVAL commands and after expensive steps.
+    The returned frame may be shared with the cache and must not be mutated in place.
+    """
+    conversation = session['conversation']
+    commands = session['commands']
+    command_ids = [getattr(cmd, 'id', None) for cmd in commands]
+    version = StateManager.state_version(commands)
+
+    if version is not None:
+        cached = dataframe_cache.get(conversation.id, version)
+        if cached is not None:
+            return cached
+
+    # The loop owns its working frame: only the first step against the shared initial_df
+    # takes a working copy (lazy under copy-on-write); later steps mutate in place
+    start, df = SnapshotService.load_latest(conversation.id, command_ids)
+    owned = df is not None
+    if df is None:
+        df = session['initial_df']
+
+    for position in range(start, len(commands)):
+        cmd = commands[position]
         intent = getattr(cmd, 'intent_type', 'DATA_MUTATION') or 'DATA_MUTATION'
         code = cmd.generated_code if hasattr(cmd, 'generated_code') else cmd
 
-        if intent == 'FORMULA_WRITE':
-            # Apply formula to disk; do not update in-memory df
-            # (formula_instructions stored as JSON string in generated_code)
-            try:
-                formula_instructions = json.loads(code)
-                CodeExecutionService.apply_formula_write(file_path, formula_instructions)
-            except Exception as e:
-                print(f"[_replay_session] FORMULA_WRITE failed for cmd {getattr(cmd, 'id', '?')}: {e}")
-        else:
-            # DATA_MUTATION or VISUAL_UPDATE — execute against df
+        step_started = time.perf_counter()
+        # FORMULA_WRITE only feeds the overlay (see _display_frame); DATA_MUTATION or
+        # VISUAL_UPDATE execute against df
+        if intent != 'FORMULA_WRITE':
             if code and code != 'pass':
-                df = CodeExecutionService.execute_transformation(df, code)
+                compiled = CodeExecutionService.load_compiled(
+                    code, getattr(cmd, 'code_hash', None), getattr(cmd, 'compiled_code', None)
+                )
+                df = CodeExecutionService.execute_transformation(df, compiled, owned=owned)
+                owned = True
 
+        elapsed = time.perf_counter() - step_started
+        if command_ids[position] is not None and SnapshotService.should_checkpoint(position, elapsed):
+            SnapshotService.save(conversation.id, command_ids[position], df)
+
+    if version is not None:
+        dataframe_cache.put(conversation.id, version, df)
     return df
+
+
+def _display_frame(session, df):
+    """df with the active formula overlay shown in place (df itself when there is none)."""
+    return _overlay_frame(session['conversation'].id, df, FormulaOverlay.build(session['commands']))
+
+
+def _overlay_frame(conversation_id, df, overlay):
+    """Overlay cells shown as their computed values; the formula text itself is kept for export."""
+    if not overlay:
+        return df
+    return FormulaOverlay.apply(df, overlay, FormulaEngine.values_for(conversation_id, df, overlay))
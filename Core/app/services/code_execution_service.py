@@ -1,32 +1,111 @@
+import os
+import builtins
+import hashlib
+import marshal
+import threading
+import importlib.util
 import pandas as pd
 import numpy as np
 import traceback
+from collections import OrderedDict
+from types import CodeType
+from typing import Optional, Tuple, Union
+from app.services.code_validator import CodeValidator
+from app.services.sandbox_pool import sandbox_pool
 
-FORBIDDEN_PATTERNS = [
-    'import ',
-    'open(',
-    'os.',
-    'sys.',
-    'subprocess.',
-    '__class__',
-    '__subclasses__',
-]
+COMPILED_CACHE_SIZE = int(os.getenv('COMPILED_CACHE_SIZE', '4096'))  # Code objects kept per process
+
+_compiled = OrderedDict()
+_compiled_lock = threading.Lock()
+
+# Builtins chart code may call; transformations get none
+CHART_BUILTINS = {
+    name: getattr(builtins, name)
+    for name in ('len', 'range', 'list', 'dict', 'tuple', 'set', 'str', 'int', 'float', 'bool', 'round',
+                 'min', 'max', 'sum', 'abs', 'sorted', 'zip', 'enumerate', 'reversed', 'any', 'all')
+}
 
 
 class CodeExecutionService:
     @staticmethod
-    def execute_transformation(df: pd.DataFrame, code: str) -> pd.DataFrame:
-        # Pre-exec: reject forbidden patterns before any execution
-        for pattern in FORBIDDEN_PATTERNS:
-            if pattern in code:
-                raise ValueError(f"Forbidden pattern in generated code: {pattern!r}")
+    def code_hash(code: str) -> str:
+        return hashlib.sha256(code.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _remember(digest: str, compiled: CodeType) -> CodeType:
+        with _compiled_lock:
+            _compiled[digest] = compiled
+            _compiled.move_to_end(digest)
+            while len(_compiled) > COMPILED_CACHE_SIZE:
+                _compiled.popitem(last=False)
+        return compiled
+
+    @staticmethod
+    def compile_transformation(code: str, digest: str = None) -> CodeType:
+        """Validate (AST whitelist) and compile once; later calls hit the per-process cache."""
+        digest = digest or CodeExecutionService.code_hash(code)
+        with _compiled_lock:
+            compiled = _compiled.get(digest)
+            if compiled is not None:
+                _compiled.move_to_end(digest)
+                return compiled
+        tree = CodeValidator.validate(code)
+        return CodeExecutionService._remember(digest, compile(tree, '<transformation>', 'exec'))
+
+    @staticmethod
+    def dump_compiled(code: str) -> Tuple[str, bytes]:
+        """(content hash, bytecode blob) to persist next to a Command row."""
+        digest = CodeExecutionService.code_hash(code)
+        compiled = CodeExecutionService.compile_transformation(code, digest)
+        return digest, importlib.util.MAGIC_NUMBER + marshal.dumps(compiled)
+
+    @staticmethod
+    def load_compiled(code: str, digest: Optional[str] = None, blob: Optional[bytes] = None) -> CodeType:
+        """
+        Code object for a stored command: per-process cache, then the persisted bytecode
+        (only when it was produced by this interpreter version for this exact source),
+        then validate + compile.
+        """
+        actual = CodeExecutionService.code_hash(code)
+        with _compiled_lock:
+            compiled = _compiled.get(actual)
+        if compiled is not None:
+            return compiled
+        magic = importlib.util.MAGIC_NUMBER
+        if blob and digest == actual and bytes(blob[:len(magic)]) == magic:
+            try:
+                return CodeExecutionService._remember(actual, marshal.loads(bytes(blob[len(magic):])))
+            except (ValueError, EOFError, TypeError):
+                pass  # Corrupt blob: fall back to compiling the source
+        return CodeExecutionService.compile_transformation(code, actual)
+
+    @staticmethod
+    def working_copy(df: pd.DataFrame) -> pd.DataFrame:
+        """Private handle on a shared frame: lazy under pandas copy-on-write, a deep copy otherwise."""
+        return df.copy(deep=not pd.options.mode.copy_on_write)
+
+    @staticmethod
+    def execute_transformation(df: pd.DataFrame, code: Union[str, CodeType], owned: bool = False) -> pd.DataFrame:
+        """
+        Run generated code against df and return the result. `owned=True` means the caller
+        holds the only reference to df (e.g. an intermediate replay frame), so the code may
+        mutate it directly instead of a working copy.
+        """
+        # Pre-exec: validation happens once, at compile time
+        compiled = code if isinstance(code, CodeType) else CodeExecutionService.compile_transformation(code)
+        if sandbox_pool.enabled:
+            return sandbox_pool.run_transformation(df, compiled)
+        return CodeExecutionService.run_transformation(df, compiled, owned=owned)
 
+    @staticmethod
+    def run_transformation(df: pd.DataFrame, compiled: CodeType, owned: bool = False) -> pd.DataFrame:
+        """Execute validated code in the current process (sandbox workers call this)."""
         original_rows = len(df)
-        local_scope = {'df': df.copy()}
+        local_scope = {'df': df if owned else CodeExecutionService.working_copy(df)}
         global_scope = {'__builtins__': {}, 'pd': pd, 'np': np}
 
         try:
-            exec(code, global_scope, local_scope)
+            exec(compiled, global_scope, local_scope)
 
             modified_df = local_scope.get('df')
 
@@ -51,33 +130,41 @@ class CodeExecutionService:
             raise Exception(f"Code execution error: {str(e)}\nDetails: {error_details}")
 
     @staticmethod
-    def apply_formula_write(file_path: str, formula_instructions: list) -> None:
-        """Write formula strings to .xlsx cells on disk via openpyxl."""
-        import openpyxl
-        wb = openpyxl.load_workbook(file_path)
-        ws = wb.active
-        for instruction in formula_instructions:
-            ws[instruction["cell"]] = instruction["formula"]
-        wb.save(file_path)
+    def _chart_modules() -> dict:
+        import json
+        import plotly
+        import plotly.express as px
+        import plotly.graph_objects as go
+        return {'pd': pd, 'px': px, 'go': go, 'plotly': plotly, 'json': json}
+
+    @staticmethod
+    def compile_chart(code: str) -> CodeType:
+        """Validate chart code against the chart scope's modules and compile it once."""
+        digest = CodeExecutionService.code_hash('chart\0' + code)
+        with _compiled_lock:
+            compiled = _compiled.get(digest)
+            if compiled is not None:
+                _compiled.move_to_end(digest)
+                return compiled
+        tree = CodeValidator.validate(code, CodeExecutionService._chart_modules())
+        return CodeExecutionService._remember(digest, compile(tree, '<chart>', 'exec'))
 
     @staticmethod
     def execute_chart_generation(df: pd.DataFrame, code: str) -> str:
-        import plotly.express as px
-        import plotly.graph_objects as go
-        import plotly
-        import json
+        CodeExecutionService.compile_chart(code)  # Reject before shipping anything to a worker
+        if sandbox_pool.enabled:
+            return sandbox_pool.run_chart_generation(df, code)
+        return CodeExecutionService.run_chart_generation(df, code)
 
-        local_scope = {'df': df.copy()}
-        global_scope = {
-            'pd': pd,
-            'px': px,
-            'go': go,
-            'plotly': plotly,
-            'json': json
-        }
+    @staticmethod
+    def run_chart_generation(df: pd.DataFrame, code: str) -> str:
+        """Execute validated chart code in the current process (sandbox workers call this)."""
+        compiled = CodeExecutionService.compile_chart(code)
+        local_scope = {'df': CodeExecutionService.working_copy(df)}
+        global_scope = {'__builtins__': CHART_BUILTINS, **CodeExecutionService._chart_modules()}
 
         try:
-            exec(code, global_scope, local_scope)
+            exec(compiled, global_scope, local_scope)
 
             fig = local_scope.get('fig')
 
@@ -0,0 +1,218 @@
+import ast
+import types
+import numpy as np
+import pandas as pd
+
+# Statements and expressions generated transformations may use. Everything else
+# (imports, function/class definitions, while loops, with/try, global, yield...) is rejected.
+ALLOWED_NODES = (
+    ast.Module, ast.Expr, ast.Assign, ast.AugAssign, ast.AnnAssign, ast.Delete, ast.Pass,
+    ast.If, ast.For, ast.Break, ast.Continue,
+    ast.Name, ast.Load, ast.Store, ast.Del, ast.Attribute, ast.Subscript, ast.Slice, ast.Starred,
+    ast.Call, ast.keyword, ast.Constant, ast.List, ast.Tuple, ast.Dict, ast.Set,
+    ast.BinOp, ast.UnaryOp, ast.BoolOp, ast.Compare, ast.IfExp,
+    ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp, ast.comprehension,
+    ast.Lambda, ast.arguments, ast.arg, ast.JoinedStr, ast.FormattedValue,
+    ast.operator, ast.unaryop, ast.boolop, ast.cmpop, ast.expr_context,
+)
+
+# Names that could reach the interpreter even without builtins
+FORBIDDEN_NAMES = {
+    'eval', 'exec', 'compile', 'open', 'input', 'breakpoint', 'help',
+    'getattr', 'setattr', 'delattr', 'globals', 'locals', 'vars', 'dir', 'type', 'object',
+}
+
+# Public pandas/numpy attributes that touch the filesystem, network or clipboard
+FORBIDDEN_ATTRIBUTES = {
+    'to_csv', 'to_excel', 'to_json', 'to_parquet', 'to_pickle', 'to_hdf', 'to_sql', 'to_feather',
+    'to_stata', 'to_html', 'to_latex', 'to_markdown', 'to_xml', 'to_clipboard', 'to_orc', 'to_gbq',
+    'to_string', 'tofile', 'dump', 'dumps', 'save', 'savez', 'savez_compressed', 'savetxt',
+    'load', 'loadtxt', 'fromfile', 'fromregex', 'genfromtxt', 'memmap', 'DataSource', 'ExcelWriter',
+    'ExcelFile', 'HDFStore', 'savefig',
+    'f_globals', 'f_locals', 'f_back', 'gi_frame', 'gi_code', 'cr_frame', 'tb_frame', 'co_code',
+    'write_html', 'write_image', 'write_json', 'to_image', 'show',
+}
+
+# Attribute names that lead to (or are) interpreter, OS or import machinery on objects that
+# are not modules (modules are checked against ALLOWED_MEMBERS instead)
+MODULE_ATTRIBUTES = {
+    'os', 'sys', 'subprocess', 'io', 'common', 'popen', 'system', 'builtins', 'importlib', 'shutil',
+    'socket', 'pathlib', 'pickle', 'marshal', 'ctypes', 'ctypeslib', 'multiprocessing', 'threading',
+    'signal', 'posix', 'nt', 'spawnv', 'execv', 'execl', 'fork', 'kill', 'compat', 'util', 'f2py', 'testing',
+}
+
+ANY = '*'  # Every public member that is not itself a module
+
+# What generated code may reach from each module, by module name. Anything else on a module
+# (pd.read_csv, pd.ExcelFile, np.fromregex, np.load, np.lib...) is rejected, so new I/O entry
+# points in pandas/numpy are closed by default. Submodules are only entered when listed here.
+ALLOWED_MEMBERS = {
+    'pandas': {
+        'DataFrame', 'Series', 'Index', 'MultiIndex', 'RangeIndex', 'DatetimeIndex', 'CategoricalIndex',
+        'Categorical', 'CategoricalDtype', 'Timestamp', 'Timedelta', 'Period', 'Interval', 'DateOffset',
+        'NaT', 'NA', 'NamedAgg', 'Grouper', 'IndexSlice', 'isna', 'isnull', 'notna', 'notnull',
+        'to_numeric', 'to_datetime', 'to_timedelta', 'concat', 'merge', 'merge_asof', 'merge_ordered',
+        'cut', 'qcut', 'pivot', 'pivot_table', 'crosstab', 'melt', 'wide_to_long', 'get_dummies',
+        'from_dummies', 'factorize', 'unique', 'date_range', 'bdate_range', 'period_range',
+        'timedelta_range', 'interval_range', 'infer_freq', 'array', 'json_normalize',
+        'Int64Dtype', 'Int32Dtype', 'Float64Dtype', 'StringDtype', 'BooleanDtype', 'offsets', 'api',
+    },
+    'pandas.tseries.offsets': ANY,
+    'pandas.api': {'types'},
+    'pandas.api.types': ANY,
+    'numpy': {
+        'nan', 'inf', 'pi', 'e', 'newaxis', 'where', 'select', 'piecewise', 'nan_to_num', 'isnan', 'isinf',
+        'isfinite', 'isnat', 'isin', 'isclose', 'round', 'around', 'rint', 'abs', 'absolute', 'sign',
+        'sqrt', 'cbrt', 'square', 'power', 'exp', 'expm1', 'log', 'log10', 'log2', 'log1p', 'floor', 'ceil',
+        'trunc', 'clip', 'minimum', 'maximum', 'fmin', 'fmax', 'add', 'subtract', 'multiply', 'divide',
+        'floor_divide', 'mod', 'remainder', 'sin', 'cos', 'tan', 'arcsin', 'arccos', 'arctan', 'arctan2',
+        'hypot', 'degrees', 'radians', 'logical_and', 'logical_or', 'logical_not', 'logical_xor',
+        'all', 'any', 'sum', 'prod', 'mean', 'average', 'median', 'std', 'var', 'min', 'max', 'ptp',
+        'cumsum', 'cumprod', 'diff', 'percentile', 'quantile', 'nansum', 'nanmean', 'nanmedian', 'nanstd',
+        'nanvar', 'nanmin', 'nanmax', 'nanpercentile', 'nanquantile', 'count_nonzero', 'argmin', 'argmax',
+        'argsort', 'sort', 'unique', 'searchsorted', 'digitize', 'histogram', 'bincount', 'interp',
+        'corrcoef', 'cov', 'polyfit', 'polyval', 'arange', 'linspace', 'zeros', 'ones', 'full',
+        'zeros_like', 'ones_like', 'full_like', 'array', 'asarray', 'concatenate', 'stack', 'vstack',
+        'hstack', 'repeat', 'tile', 'split', 'flatnonzero', 'nonzero', 'dtype', 'datetime64',
+        'timedelta64', 'datetime_as_string', 'busday_count', 'is_busday', 'int8', 'int16', 'int32',
+        'int64', 'uint8', 'uint16', 'uint32', 'uint64', 'float16', 'float32', 'float64', 'bool_',
+        'str_', 'object_', 'random', 'linalg', 'fft', 'char', 'emath', 'strings', 'dtypes',
+    },
+    'numpy.random': {
+        'rand', 'randn', 'randint', 'random', 'choice', 'normal', 'uniform', 'seed', 'default_rng',
+        'permutation', 'shuffle', 'poisson', 'binomial', 'exponential',
+    },
+    'numpy.linalg': ANY,
+    'numpy.fft': ANY,
+    'numpy.char': ANY,
+    'numpy.lib.scimath': ANY,  # np.emath
+    'numpy.strings': ANY,
+    'numpy.dtypes': ANY,
+    # Chart scope (see CodeExecutionService._chart_modules)
+    'plotly': {'express', 'graph_objects', 'colors'},
+    'plotly.express': {
+        'area', 'bar', 'bar_polar', 'box', 'choropleth', 'density_contour', 'density_heatmap', 'ecdf',
+        'funnel', 'funnel_area', 'histogram', 'icicle', 'imshow', 'line', 'line_3d', 'line_geo',
+        'line_polar', 'line_ternary', 'parallel_categories', 'parallel_coordinates', 'pie', 'scatter',
+        'scatter_3d', 'scatter_geo', 'scatter_matrix', 'scatter_polar', 'scatter_ternary', 'strip',
+        'sunburst', 'timeline', 'treemap', 'violin', 'colors', 'Constant', 'IdentityMap', 'Range', 'NO_COLOR',
+    },
+    'plotly.graph_objects': ANY,
+    'plotly.colors': ANY,
+    'plotly.express.colors': ANY,
+    '_plotly_utils.colors.qualitative': ANY,
+    '_plotly_utils.colors.sequential': ANY,
+    '_plotly_utils.colors.diverging': ANY,
+    '_plotly_utils.colors.cyclical': ANY,
+    'json': {'dumps', 'loads'},
+}
+ALLOWED_PACKAGES = ('plotly.graph_objs.',)  # go.layout.xaxis...: figure property classes only
+
+# Module names bound in the transformation scope (see CodeExecutionService.run_transformation)
+TRANSFORM_MODULES = {'pd': pd, 'np': np}
+
+# Keyword arguments that let query()/eval() resolve names from outside the frame
+_EXPRESSION_SCOPE_KEYWORDS = {'local_dict', 'global_dict', 'resolvers', 'level'}
+
+_MISSING = object()
+
+
+class CodeValidator:
+    """
+    Static validation of generated code: a whitelist of AST node types, no private/dunder
+    names or attributes, and no pandas/numpy I/O. Attribute chains starting at a module
+    (pd.x.y) are resolved here and may only reach what ALLOWED_MEMBERS lists for each
+    module; the modules themselves can only be used as the base of such a chain, never
+    aliased. Column access through attributes (df.os_name) stays legitimate, so attributes
+    of other objects are checked against FORBIDDEN_ATTRIBUTES and MODULE_ATTRIBUTES.
+    query()/eval() expressions must be literal strings without '@' scope references.
+    """
+
+    @staticmethod
+    def _reject(what: str):
+        raise ValueError(f"Forbidden pattern in generated code: {what}")
+
+    @staticmethod
+    def _allowed(module: types.ModuleType):
+        name = module.__name__
+        if name in ALLOWED_MEMBERS:
+            return ALLOWED_MEMBERS[name]
+        return ANY if name.startswith(ALLOWED_PACKAGES) else None
+
+    @staticmethod
+    def _check_module_chain(node: ast.Attribute, modules: dict) -> None:
+        chain = []
+        base = node
+        while isinstance(base, ast.Attribute):
+            chain.append(base.attr)
+            base = base.value
+        if not (isinstance(base, ast.Name) and base.id in modules):
+            return
+        target, path = modules[base.id], base.id
+        for attr in reversed(chain):
+            if not isinstance(target, types.ModuleType):
+                return  # A class or function: its attributes are checked like any other
+            path = f"{path}.{attr}"
+            allowed = CodeValidator._allowed(target)
+            if allowed is None or (allowed is not ANY and attr not in allowed):
+                CodeValidator._reject(f"{path!r} is not an allowed pandas/numpy/plotly member")
+            value = getattr(target, attr, _MISSING)
+            if value is _MISSING:
+                CodeValidator._reject(f"unknown attribute {path!r}")
+            if isinstance(value, types.ModuleType) and CodeValidator._allowed(value) is None:
+                CodeValidator._reject(f"module {path!r}")
+            target = value
+
+    @staticmethod
+    def _check_expression_call(node: ast.Call, modules: dict) -> None:
+        """df.query('a > 1') / df.eval('a * 2'): a literal expression that only sees the frame's columns."""
+        if not (isinstance(node.func, ast.Attribute) and node.func.attr in ('query', 'eval')):
+            return
+        if isinstance(node.func.value, ast.Name) and node.func.value.id in modules:
+            CodeValidator._reject(f"{node.func.value.id}.{node.func.attr}()")  # Resolves names from the caller's scope
+        expression = node.args[0] if node.args else next(
+            (keyword.value for keyword in node.keywords if keyword.arg in ('expr', 'expression')), None)
+        if not (isinstance(expression, ast.Constant) and isinstance(expression.value, str)):
+            CodeValidator._reject(f"non-literal {node.func.attr}() expression")
+        if '@' in expression.value:
+            CodeValidator._reject(f"'@' in {node.func.attr}() expression")
+        for keyword in node.keywords:
+            if keyword.arg is None or keyword.arg in _EXPRESSION_SCOPE_KEYWORDS:
+                CodeValidator._reject(f"{node.func.attr}() argument {keyword.arg or '**'!r}")
+
+    @staticmethod
+    def validate(code: str, modules: dict = None) -> ast.Module:
+        """
+        Return the parsed module, or raise ValueError describing the first violation.
+        modules maps the module names bound in the execution scope to the modules
+        (TRANSFORM_MODULES by default).
+        """
+        modules = TRANSFORM_MODULES if modules is None else modules
+        try:
+            tree = ast.parse(code, mode='exec')
+        except SyntaxError as e:
+            raise ValueError(f"Generated code is not valid Python: {e.msg} (line {e.lineno})")
+
+        # Module names may only appear as the base of an attribute chain (pd.to_numeric, not m = pd)
+        chain_bases = {id(node.value) for node in ast.walk(tree)
+                       if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name)}
+
+        for node in ast.walk(tree):
+            if not isinstance(node, ALLOWED_NODES):
+                CodeValidator._reject(type(node).__name__)
+            if isinstance(node, ast.Name):
+                if node.id.startswith('_') or node.id in FORBIDDEN_NAMES:
+                    CodeValidator._reject(f"name {node.id!r}")
+                if node.id in modules and (id(node) not in chain_bases or not isinstance(node.ctx, ast.Load)):
+                    CodeValidator._reject(f"module {node.id!r} used as a value")
+            if isinstance(node, ast.Attribute):
+                if node.attr.startswith('_') or node.attr in FORBIDDEN_ATTRIBUTES or node.attr.startswith('read_'):
+                    CodeValidator._reject(f"attribute {node.attr!r}")
+                if node.attr in MODULE_ATTRIBUTES:
+                    CodeValidator._reject(f"attribute {node.attr!r}")
+                CodeValidator._check_module_chain(node, modules)
+            if isinstance(node, ast.Call):
+                CodeValidator._check_expression_call(node, modules)
+            if isinstance(node, ast.arg) and (node.arg.startswith('_') or node.arg in modules):
+                CodeValidator._reject(f"name {node.arg!r}")
+        return tree
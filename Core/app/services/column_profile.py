@@ -0,0 +1,208 @@
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+from typing import List, Tuple
+import numpy as np
+import pandas as pd
+from app.services.formula_overlay import FormulaOverlay
+
+COLUMN_PROFILE_ENABLED = os.getenv('COLUMN_PROFILE_ENABLED', '1') == '1'  # 0: column list + first row, as before
+LLM_CONTEXT_TOKEN_BUDGET = int(os.getenv('LLM_CONTEXT_TOKEN_BUDGET', '800'))  # For the schema part of the prompt
+COLUMN_PROFILE_CACHE_ENTRIES = int(os.getenv('COLUMN_PROFILE_CACHE_ENTRIES', '64'))
+
+PROFILE_EXAMPLES = 3
+PROFILE_SCAN_ROWS = 1000  # Examples come from the first rows only
+_VALUE_CHARS = 32
+_DETAIL_SHARE = 0.75  # Of the budget, for full lines; the rest lists the names of the columns left out
+# Profiles are mostly numbers, quotes and separators, which tokenize finely: 2.2-2.6 characters
+# per token with litellm.token_counter (see benchmarks/bench_prompt.py), not prose's ~4
+_CHARS_PER_TOKEN = 2.5
+
+_lock = threading.Lock()
+_profiles = OrderedDict()  # (conversation_id, state version) -> profile
+_stats = {"requests": 0, "hits": 0, "total_profile_ms": 0.0, "total_tokens": 0, "columns": 0, "columns_detailed": 0}
+
+
+def estimate_tokens(text: str) -> int:
+    """Token count of rendered profile text, without loading a tokenizer."""
+    return int(len(text) / _CHARS_PER_TOKEN + 0.999)
+
+
+def _short(value) -> str:
+    if isinstance(value, np.datetime64):
+        value = pd.Timestamp(value)
+    if isinstance(value, (float, np.floating)):
+        return f"{value:.6g}"
+    if isinstance(value, pd.Timestamp):
+        return value.date().isoformat() if value == value.normalize() else value.isoformat()
+    text = str(value)
+    if len(text) > _VALUE_CHARS:
+        text = text[:_VALUE_CHARS - 1] + '…'
+    return repr(text) if isinstance(value, str) else text
+
+
+class ColumnProfiler:
+    """
+    Compact description of a DataFrame for the LLM prompt: per column its dtype, null
+    ratio, distinct count, range and a few example values. Profiles are computed with
+    whole-frame reductions and cached per (conversation, StateManager.state_version),
+    which changes with every command even when undo+add reuses a command id. render()
+    fits them into a token budget, keeping every column the prompt mentions and reducing
+    the rest to names, then to a count.
+    """
+
+    @staticmethod
+    def profile(df: pd.DataFrame) -> List[dict]:
+        nulls = df.isna().mean().to_numpy() if len(df) else np.zeros(df.shape[1])
+        try:
+            unique = df.nunique(dropna=True).to_numpy()
+        except TypeError:  # Unhashable cells (lists, dicts): count their text instead
+            unique = df.astype(str).where(df.notna()).nunique(dropna=True).to_numpy()
+
+        ranged = [position for position, dtype in enumerate(df.dtypes)
+                  if (pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype))
+                  or pd.api.types.is_datetime64_any_dtype(dtype)]
+        bounds = {}
+        if ranged and len(df):
+            subset = df.iloc[:, ranged]
+            for position, low, high in zip(ranged, subset.min().to_numpy(), subset.max().to_numpy()):
+                bounds[position] = (low, high)
+
+        head = df.iloc[:PROFILE_SCAN_ROWS]
+        profile = []
+        for position, (name, dtype) in enumerate(zip(df.columns, df.dtypes)):
+            values = head.iloc[:, position].dropna()
+            try:
+                examples = values.drop_duplicates().iloc[:PROFILE_EXAMPLES].tolist()
+            except TypeError:
+                examples = values.iloc[:PROFILE_EXAMPLES].tolist()
+            low, high = bounds.get(position, (None, None))
+            profile.append({
+                "name": str(name),
+                "letter": FormulaOverlay.column_letter(position),
+                "dtype": str(dtype),
+                "nulls": float(nulls[position]),
+                "unique": int(unique[position]),
+                "min": None if pd.isna(low) else _short(low),
+                "max": None if pd.isna(high) else _short(high),
+                "examples": [_short(value) for value in examples],
+            })
+        return profile
+
+    @staticmethod
+    def get(conversation_id, version, df: pd.DataFrame) -> List[dict]:
+        """Profile of the conversation's state identified by version, computed once."""
+        key = (int(conversation_id), version)
+        with _lock:
+            _stats["requests"] += 1
+            profile = _profiles.get(key)
+            if profile is not None:
+                _profiles.move_to_end(key)
+                _stats["hits"] += 1
+                return profile
+
+        started = time.perf_counter()
+        profile = ColumnProfiler.profile(df)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with _lock:
+            _stats["total_profile_ms"] += elapsed_ms
+            _profiles[key] = profile
+            _profiles.move_to_end(key)
+            while len(_profiles) > COLUMN_PROFILE_CACHE_ENTRIES:
+                _profiles.popitem(last=False)
+        return profile
+
+    @staticmethod
+    def mentioned(profile: List[dict], prompt: str) -> set:
+        """Positions of the columns named in the prompt (case-insensitive, '_' matching a space)."""
+        text = ' '.join(prompt.lower().replace('_', ' ').split())
+        found = set()
+        for position, column in enumerate(profile):
+            name = ' '.join(column["name"].lower().replace('_', ' ').split())
+            if name and re.search(rf'(?<!\w){re.escape(name)}(?!\w)', text):
+                found.add(position)
+        return found
+
+    @staticmethod
+    def line(column: dict, rows: int) -> str:
+        parts = [column["dtype"]]
+        if column["nulls"]:
+            parts.append(f"{column['nulls']:.0%} null" if column["nulls"] >= 0.01 else "<1% null")
+        if rows and column["unique"] == rows:
+            parts.append("all distinct")
+        else:
+            parts.append(f"{column['unique']} distinct")
+        if column["min"] is not None:
+            parts.append(f"{column['min']}..{column['max']}")
+        if column["examples"]:
+            parts.append("e.g. " + ", ".join(column["examples"]))
+        return f"- {column['letter']} {column['name']!r}: " + " | ".join(parts)
+
+    @staticmethod
+    def render(profile: List[dict], prompt: str, rows: int, budget: int = LLM_CONTEXT_TOKEN_BUDGET) -> Tuple[str, int]:
+        """(schema text, number of columns described in full) within about `budget` tokens."""
+        header = f"The DataFrame 'df' has {rows} rows and {len(profile)} columns (Excel letter, name: profile):"
+        keep = ColumnProfiler.mentioned(profile, prompt)
+        used = estimate_tokens(header) + sum(estimate_tokens(ColumnProfiler.line(profile[p], rows)) for p in keep)
+
+        for position, column in enumerate(profile):
+            if position in keep:
+                continue
+            cost = estimate_tokens(ColumnProfiler.line(column, rows))
+            if used + cost > budget * _DETAIL_SHARE:
+                break
+            keep.add(position)
+            used += cost
+
+        lines = [header] + [ColumnProfiler.line(profile[p], rows) for p in sorted(keep)]
+        rest = [column for position, column in enumerate(profile) if position not in keep]
+        if rest:
+            names = []
+            for column in rest:
+                cost = estimate_tokens(f"{column['letter']} {column['name']!r}, ")
+                if used + cost > budget:
+                    break
+                names.append(f"{column['letter']} {column['name']!r}")
+                used += cost
+            if names:
+                lines.append("Other columns: " + ", ".join(names))
+            if len(names) < len(rest):
+                lines.append(f"... and {len(rest) - len(names)} more columns not shown.")
+        return "\n".join(lines), len(keep)
+
+    @staticmethod
+    def context(conversation_id, version, df: pd.DataFrame, prompt: str,
+                budget: int = LLM_CONTEXT_TOKEN_BUDGET) -> Tuple[str, int]:
+        """(schema text for the LLM, its estimated tokens) for the current state and prompt."""
+        profile = ColumnProfiler.get(conversation_id, version, df)
+        schema, detailed = ColumnProfiler.render(profile, prompt, len(df), budget)
+        tokens = estimate_tokens(schema)
+        with _lock:
+            _stats["total_tokens"] += tokens
+            _stats["columns"] += len(profile)
+            _stats["columns_detailed"] += detailed
+        return schema, tokens
+
+    @staticmethod
+    def clear() -> None:
+        with _lock:
+            _profiles.clear()
+
+    @staticmethod
+    def stats() -> dict:
+        with _lock:
+            requests = _stats["requests"]
+            misses = requests - _stats["hits"]
+            return {
+                "enabled": COLUMN_PROFILE_ENABLED,
+                "token_budget": LLM_CONTEXT_TOKEN_BUDGET,
+                "requests": requests,
+                "hits": _stats["hits"],
+                "hit_rate": round(_stats["hits"] / requests, 4) if requests else None,
+                "avg_profile_ms": round(_stats["total_profile_ms"] / misses, 3) if misses else None,
+                "avg_context_tokens": round(_stats["total_tokens"] / requests, 1) if requests else None,
+                "detailed_ratio": round(_stats["columns_detailed"] / _stats["columns"], 4) if _stats["columns"] else None,
+                "entries": len(_profiles),
+            }
@@ -0,0 +1,100 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+import pandas as pd
+
+DF_CACHE_MAX_BYTES = int(os.getenv('DF_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))  # 512 MB
+
+
+class DataFrameCache:
+    """
+    Thread-safe, in-process LRU of DataFrames keyed by (conversation_id, version).
+
+    version=None holds the conversation's initial_df; any other value is a
+    StateManager.state_version and holds that replayed state. Versions cover the whole
+    active history, so a command id reused after undo (SQLite reuses deleted ids) never
+    matches a state cached before it, in this worker or any other. Only one replayed
+    state is kept per conversation.
+    Eviction is driven by DataFrame.memory_usage(deep=True) against max_bytes.
+
+    Cached frames are shared, not copied: callers must treat them as read-only.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # (conversation_id, head) -> (df, nbytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(conversation_id, version):
+        return int(conversation_id), version
+
+    def get(self, conversation_id, version) -> Optional[pd.DataFrame]:
+        key = self._key(conversation_id, version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, conversation_id, version, df: pd.DataFrame) -> None:
+        key = self._key(conversation_id, version)
+        nbytes = int(df.memory_usage(deep=True).sum())
+        with self._lock:
+            if version is not None:
+                # A new head supersedes the previous replayed state of this conversation
+                for stale in [k for k in self._entries if k[0] == key[0] and k[1] is not None]:
+                    self._drop(stale)
+            elif key in self._entries:
+                self._drop(key)
+
+            if nbytes > self.max_bytes:
+                return
+
+            self._entries[key] = (df, nbytes)
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def invalidate(self, conversation_id, keep_initial: bool = False) -> None:
+        conversation_id = int(conversation_id)
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == conversation_id]:
+                if keep_initial and key[1] is None:
+                    continue
+                self._drop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+    def _drop(self, key) -> None:
+        _, nbytes = self._entries.pop(key)
+        self._bytes -= nbytes
+
+
+dataframe_cache = DataFrameCache(DF_CACHE_MAX_BYTES)
@@ -1,11 +1,22 @@
 import pandas as pd
 import numpy as np
 import os
+import json
 import uuid
+import pyarrow as pa
+import pyarrow.parquet as pq
 from werkzeug.utils import secure_filename
+from app.services.frame_serializer import FrameSerializer
 
 UPLOAD_FOLDER = os.path.join(os.getcwd(), 'uploads')
 ALLOWED_EXTENSIONS = {'xlsx', 'xls', 'csv'}
+COLUMNAR_EXTENSION = '.parquet'
+# Parquet key-value metadata: {column position: one type code per cell} for text-cast columns
+_MIXED_METADATA_KEY = b'datamind.mixed'
+_CELL_TYPES = [(bool, 'b'), (int, 'i'), (float, 'f'), (str, 's')]  # bool before its int base class
+_CELL_PARSERS = {'b': lambda v: v == 'True', 'i': int, 'f': float, 's': str}
+GRID_WINDOW_ROWS = int(os.getenv('GRID_WINDOW_ROWS', '1000'))  # Rows embedded in grid responses
+GRID_MAX_WINDOW_ROWS = int(os.getenv('GRID_MAX_WINDOW_ROWS', '10000'))  # Upper bound for /rows requests
 
 class ExcelService:
     @staticmethod
@@ -76,20 +87,167 @@ class ExcelService:
             raise Exception(f"Error leyendo el archivo: {str(e)}")
 
     @staticmethod
-    def format_dataframe_response(df: pd.DataFrame):
-        columns = df.columns.tolist()
-        # Convert Timestamps and other non-serializable types to strings
-        df = df.copy()
-        for col in df.columns:
-            if pd.api.types.is_datetime64_any_dtype(df[col]):
-                df[col] = df[col].dt.strftime('%Y-%m-%d %H:%M:%S').where(df[col].notna(), None)
-        result_data = df.replace({np.nan: None}).to_dict(orient='records')
-        # Catch any remaining non-serializable types (e.g. pd.Timestamp from mixed columns)
-        for row in result_data:
-            for k, v in row.items():
-                if hasattr(v, 'isoformat'):
-                    row[k] = v.isoformat()
-        return {
-            "columns": columns,
-            "rows": result_data
-        }
\ No newline at end of file
+    def slice_window(df: pd.DataFrame, offset: int = 0, limit: int = None, columns: list = None) -> pd.DataFrame:
+        if limit is None:
+            limit = GRID_WINDOW_ROWS
+        window = df.iloc[offset:offset + limit]
+        if columns is not None:
+            window = window[columns]
+        return window
+
+    @staticmethod
+    def format_dataframe_response(df: pd.DataFrame, offset: int = 0, limit: int = None,
+                                  columns: list = None, layout: str = 'rows'):
+        """
+        Serialize a window of df for the grid: schema and total row count for the whole
+        frame, values only for [offset, offset + limit) and the requested columns.
+        layout='rows' embeds row dicts; layout='columns' embeds one array per column.
+        """
+        if limit is None:
+            limit = GRID_WINDOW_ROWS
+        schema = [{"name": str(col), "dtype": str(dtype)} for col, dtype in df.dtypes.items()]
+        window = ExcelService.slice_window(df, offset, limit, columns)
+
+        data = {
+            "columns": window.columns.tolist(),
+            "schema": schema,
+            "total_rows": len(df),
+            "offset": offset,
+            "limit": limit
+        }
+        if layout == 'columns':
+            data["layout"] = "columns"
+            data.update(FrameSerializer.to_columns(window))
+        else:
+            data["rows"] = FrameSerializer.to_records(window)
+        return data
+
+    @staticmethod
+    def columnar_path(file_path: str) -> str:
+        """Location of the fast-load Parquet copy kept next to an uploaded file."""
+        return file_path + COLUMNAR_EXTENSION
+
+    @staticmethod
+    def read_original(file_path: str) -> pd.DataFrame:
+        if file_path.endswith('.csv'):
+            df = pd.read_csv(file_path)
+        else:
+            df = pd.read_excel(file_path, sheet_name=0)
+        df.columns = df.columns.astype(str)
+        return df
+
+    @staticmethod
+    def convert_to_columnar(file_path: str) -> pd.DataFrame:
+        """Parse the original upload once and store its Parquet copy. Returns the parsed frame."""
+        df = ExcelService.read_original(file_path)
+        ExcelService.write_columnar(df, ExcelService.columnar_path(file_path))
+        return df
+
+    @staticmethod
+    def remove_upload(file_path: str) -> None:
+        """Delete an upload and its columnar copy from disk."""
+        for path in (file_path, ExcelService.columnar_path(file_path)):
+            if path and os.path.exists(path):
+                os.remove(path)
+
+    @staticmethod
+    def load_dataframe(file_path: str) -> pd.DataFrame:
+        """
+        Load an upload, preferring its columnar copy. The copy is only trusted while it is
+        at least as new as the original (a re-uploaded or externally replaced file; formula
+        writes live in the FormulaOverlay and leave the .xlsx alone); otherwise the original
+        is parsed and the copy regenerated.
+        """
+        columnar = ExcelService.columnar_path(file_path)
+        if os.path.exists(columnar) and os.path.getmtime(columnar) >= os.path.getmtime(file_path):
+            try:
+                return ExcelService.read_columnar(columnar)
+            except Exception as e:
+                print(f"[COLUMNAR] Unreadable copy {columnar}, re-parsing original: {e}")
+        return ExcelService.convert_to_columnar(file_path)
+
+    @staticmethod
+    def _cell_codes(column: pd.Series):
+        """One type code per cell ('n' for missing), or None if a cell is not bool/int/float/str."""
+        codes = []
+        for value in column:
+            if value is None or (isinstance(value, float) and np.isnan(value)):
+                codes.append('n')
+                continue
+            code = next((code for kind, code in _CELL_TYPES if isinstance(value, kind)), None)
+            if code is None:
+                return None
+            codes.append(code)
+        return ''.join(codes)
+
+    @staticmethod
+    def write_columnar(df: pd.DataFrame, path: str) -> bool:
+        """
+        Persist df as Parquet at path (atomically, via a temp file). Object columns Arrow
+        cannot type (text and numbers in one spreadsheet column) are stored as text, with a
+        per-cell type sidecar in the file metadata that read_columnar uses to restore the
+        original values. Returns False when the frame still cannot be stored (duplicate or
+        non-text column names, cells other than bool/int/float/str in a mixed column);
+        callers then keep parsing the original instead.
+        """
+        if not all(isinstance(name, str) for name in df.columns):
+            print(f"[COLUMNAR] Non-text column names do not survive Parquet, skipping {path}")
+            return False
+        tmp_path = f"{path}.tmp"
+        try:
+            mixed = {}
+            try:
+                table = pa.Table.from_pandas(df)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                stored = df.copy(deep=False)
+                for position, dtype in enumerate(df.dtypes):
+                    if dtype != object:
+                        continue
+                    column = df.iloc[:, position]
+                    try:
+                        pa.array(column, from_pandas=True)
+                    except (pa.ArrowInvalid, pa.ArrowTypeError):
+                        codes = ExcelService._cell_codes(column)
+                        if codes is None:
+                            print(f"[COLUMNAR] Column {df.columns[position]!r} cannot be stored, skipping {path}")
+                            return False
+                        mixed[str(position)] = codes
+                        stored.isetitem(position, column.astype(str).where(column.notna(), None))
+                table = pa.Table.from_pandas(stored)
+            if mixed:
+                metadata = {**(table.schema.metadata or {}), _MIXED_METADATA_KEY: json.dumps(mixed).encode()}
+                table = table.replace_schema_metadata(metadata)
+            pq.write_table(table, tmp_path)
+            os.replace(tmp_path, path)
+            return True
+        except Exception as e:
+            print(f"[COLUMNAR] Could not write {path}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+
+    @staticmethod
+    def read_columnar(path: str) -> pd.DataFrame:
+        table = pq.read_table(path, memory_map=True)
+        df = table.to_pandas()
+        mixed = json.loads((table.schema.metadata or {}).get(_MIXED_METADATA_KEY, b'{}'))
+        for position, codes in mixed.items():
+            values = [np.nan if code == 'n' else _CELL_PARSERS[code](value)
+                      for value, code in zip(df.iloc[:, int(position)], codes)]
+            df.isetitem(int(position), pd.Series(values, index=df.index, dtype=object))
+        return ExcelService.normalize_nulls(df)
+
+    @staticmethod
+    def normalize_nulls(df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Missing cells of object columns as NaN, as the Excel/CSV parsers produce them:
+        Parquet hands them back as None, which would make a cold load differ from the
+        frame parsed at upload (isinstance checks, == comparisons, JSON output).
+        """
+        for position, dtype in enumerate(df.dtypes):
+            if dtype == object:
+                column = df.iloc[:, position]
+                missing = column.isna()
+                if missing.any():
+                    df.isetitem(position, column.mask(missing, np.nan))
+        return df
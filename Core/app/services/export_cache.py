@@ -0,0 +1,138 @@
+import os
+import uuid
+import shutil
+import hashlib
+import threading
+from typing import Iterable, Iterator, Optional
+
+EXPORT_CACHE_FOLDER = os.getenv('EXPORT_CACHE_FOLDER', os.path.join(os.getcwd(), 'export_cache'))
+EXPORT_CACHE_MAX_MB = float(os.getenv('EXPORT_CACHE_MAX_MB', '512'))  # Total size before LRU eviction
+EXPORT_CACHE_ENABLED = os.getenv('EXPORT_CACHE_ENABLED', '1') == '1'
+
+_evict_lock = threading.Lock()
+_usage = {"bytes": None}  # Folder size as of the last walk plus what this process wrote since; None until walked
+
+
+class ExportCache:
+    """
+    Rendered exports on disk, keyed by conversation, state version and format.
+
+    A version identifies an exact state (see StateManager.get_version), so entries never
+    go stale: undoing back to an earlier state hits its old entry again. The folder is
+    bounded by EXPORT_CACHE_MAX_MB, evicting least recently served files first, and
+    entries of expired or deleted conversations are discarded with the conversation.
+    Each process tracks the folder size it last measured plus what it has written since,
+    and only walks the folder once that estimate is over the budget; the periodic
+    cleanup job evicts too, which catches what other workers wrote.
+    """
+
+    @staticmethod
+    def version(file_hash: str, *state) -> str:
+        """sha256 over the uploaded file's hash and whatever identifies the command history."""
+        fingerprint = ':'.join([file_hash] + ['' if part is None else str(part) for part in state])
+        return hashlib.sha256(fingerprint.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def file_hash(path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @staticmethod
+    def _conversation_folder(conversation_id: int) -> str:
+        return os.path.join(EXPORT_CACHE_FOLDER, str(conversation_id))
+
+    @staticmethod
+    def _path(conversation_id: int, version: str, export_format: str) -> str:
+        return os.path.join(ExportCache._conversation_folder(conversation_id), f"{version}.{export_format}")
+
+    @staticmethod
+    def get(conversation_id: int, version: str, export_format: str) -> Optional[str]:
+        """Path of the cached export, or None. A hit refreshes the entry's LRU position."""
+        if not EXPORT_CACHE_ENABLED:
+            return None
+        path = ExportCache._path(conversation_id, version, export_format)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    @staticmethod
+    def read(path: str, block_size: int = 256 * 1024) -> Iterator[bytes]:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(block_size), b''):
+                yield block
+
+    @staticmethod
+    def tee(conversation_id: int, version: str, export_format: str, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """
+        Pass chunks through to the client while writing them to the cache. The entry only
+        becomes visible once the export completed; an aborted download leaves nothing behind.
+        """
+        if not EXPORT_CACHE_ENABLED:
+            yield from chunks
+            return
+        folder = ExportCache._conversation_folder(conversation_id)
+        os.makedirs(folder, exist_ok=True)
+        tmp_path = os.path.join(folder, f".{uuid.uuid4().hex}.tmp")
+        completed = False
+        written = 0
+        try:
+            with open(tmp_path, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    written += len(chunk)
+                    yield chunk
+            os.replace(tmp_path, ExportCache._path(conversation_id, version, export_format))
+            completed = True
+        finally:
+            if not completed and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        ExportCache._account(written)
+
+    @staticmethod
+    def _account(size: int) -> None:
+        """Add a new entry to the size estimate; evict only when it goes over the budget."""
+        with _evict_lock:
+            if _usage["bytes"] is not None:
+                _usage["bytes"] += size
+                if _usage["bytes"] <= EXPORT_CACHE_MAX_MB * 1024 * 1024:
+                    return
+        ExportCache.evict()
+
+    @staticmethod
+    def evict(max_bytes: float = None) -> int:
+        """Delete least recently served entries until the folder fits; returns files removed."""
+        limit = EXPORT_CACHE_MAX_MB * 1024 * 1024 if max_bytes is None else max_bytes
+        with _evict_lock:
+            entries = []
+            for root, _, files in os.walk(EXPORT_CACHE_FOLDER):
+                for name in files:
+                    if name.startswith('.'):
+                        continue  # In-flight renders
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+            total = sum(size for _, size, _ in entries)
+            removed = 0
+            for _, size, path in sorted(entries):
+                if total <= limit:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                removed += 1
+            _usage["bytes"] = total
+        return removed
+
+    @staticmethod
+    def discard(conversation_id: int) -> None:
+        shutil.rmtree(ExportCache._conversation_folder(conversation_id), ignore_errors=True)
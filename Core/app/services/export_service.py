@@ -0,0 +1,283 @@
+import os
+import re
+import zipfile
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from typing import Dict, Iterator, List, Tuple
+from xml.sax.saxutils import escape
+from app.services.formula_overlay import FormulaOverlay
+
+EXPORT_CHUNK_ROWS = int(os.getenv('EXPORT_CHUNK_ROWS', '20000'))  # Rows serialized per yielded chunk
+
+EXPORT_MIMETYPES = {
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'csv': 'text/csv; charset=utf-8',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+_ILLEGAL_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+_EXCEL_EPOCH = pd.Timestamp('1899-12-30')
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>'
+)
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="Sheet1" sheetId="1" r:id="rId1"/></sheets>'
+    '<calcPr fullCalcOnLoad="1"/>'  # Overlay formulas are stored without cached values
+    '</workbook>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+    'Target="styles.xml"/>'
+    '</Relationships>'
+)
+# Style 0 is the default, style 1 formats datetime columns
+_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<numFmts count="1"><numFmt numFmtId="164" formatCode="yyyy-mm-dd hh:mm:ss"/></numFmts>'
+    '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+_SHEET_OPEN = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_SHEET_CLOSE = '</sheetData></worksheet>'
+
+
+class _Sink:
+    """Write-only buffer the zip/parquet writers fill and the response generator drains."""
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    @property
+    def closed(self) -> bool:
+        return False
+
+    def drain(self) -> bytes:
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+def _entry(name: str) -> zipfile.ZipInfo:
+    # Fixed timestamps: the same state always renders to the same bytes
+    info = zipfile.ZipInfo(name, date_time=(1980, 1, 1, 0, 0, 0))
+    info.compress_type = zipfile.ZIP_DEFLATED
+    return info
+
+
+def _text_cell(ref: str, value) -> str:
+    text = escape(_ILLEGAL_XML.sub('', str(value)))
+    return f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _formula_cell(ref: str, formula: str) -> str:
+    body = formula[1:] if formula.startswith('=') else formula
+    return f'<c r="{ref}"><f>{escape(_ILLEGAL_XML.sub("", body))}</f></c>'
+
+
+def _scalar_cell(ref: str, value) -> str:
+    """Cell XML for one Python value (object columns, the header row); '' for blanks."""
+    if value is None or value is pd.NA or value is pd.NaT:
+        return ''
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, bool):
+        return f'<c r="{ref}" t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        if not np.isfinite(value):
+            return ''
+        return f'<c r="{ref}"><v>{value!r}</v></c>'
+    if isinstance(value, pd.Timestamp):
+        return f'<c r="{ref}" s="1"><v>{(value.tz_localize(None) - _EXCEL_EPOCH) / pd.Timedelta(days=1)!r}</v></c>'
+    return _text_cell(ref, value)
+
+
+def _column_cells(series: pd.Series, letter: str, rows: np.ndarray) -> np.ndarray:
+    """Cell XML for a column slice, built column-wise; blanks become ''."""
+    dtype = series.dtype
+    refs = letter + rows.astype(str).astype(object)
+    if pd.api.types.is_bool_dtype(dtype) and not isinstance(dtype, pd.CategoricalDtype):
+        values = series.to_numpy(dtype=object, na_value=None)
+        missing = pd.isna(values)
+        cells = '<c r="' + refs + '" t="b"><v>' + np.where(values == True, '1', '0').astype(object) + '</v></c>'  # noqa: E712
+    elif pd.api.types.is_numeric_dtype(dtype):
+        values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        missing = ~np.isfinite(values)
+        text = pd.Series(series.to_numpy()).astype(str).to_numpy(dtype=object) \
+            if pd.api.types.is_integer_dtype(dtype) else values.astype(str).astype(object)
+        cells = '<c r="' + refs + '"><v>' + text + '</v></c>'
+    elif pd.api.types.is_datetime64_any_dtype(dtype):
+        naive = series.dt.tz_localize(None) if getattr(series.dt, 'tz', None) is not None else series
+        serial = ((naive - _EXCEL_EPOCH) / pd.Timedelta(days=1)).to_numpy(dtype=np.float64, na_value=np.nan)
+        missing = np.isnan(serial)
+        cells = '<c r="' + refs + '" s="1"><v>' + serial.astype(str).astype(object) + '</v></c>'
+    else:
+        values = series.to_numpy(dtype=object)
+        cells = np.array([_scalar_cell(ref, value) for ref, value in zip(refs, values)], dtype=object)
+        return cells
+    cells[missing] = ''
+    return cells
+
+
+class ExportService:
+    """
+    Streaming exports of the current frame.
+
+    Every format is produced in EXPORT_CHUNK_ROWS slices and yielded as soon as a slice is
+    encoded, so peak memory is the frame plus one slice regardless of the row count.
+    XLSX is written directly as SpreadsheetML into a zip that is streamed while it is built
+    (no workbook object model); overlay formulas are written as real formulas there, while
+    CSV and Parquet receive the computed display values.
+    """
+
+    @staticmethod
+    def xlsx_chunks(df: pd.DataFrame, overlay: Dict[str, str] = None) -> Iterator[bytes]:
+        sink = _Sink()
+        formulas = {}
+        for cell, formula in (overlay or {}).items():
+            formulas[FormulaOverlay.cell_position(cell)] = formula
+        width = max([df.shape[1]] + [col + 1 for _, col in formulas])
+        letters = [FormulaOverlay.column_letter(col) for col in range(width)]
+        last_row = max([len(df) - 1] + [row for row, _ in formulas])
+
+        with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr(_entry('[Content_Types].xml'), _CONTENT_TYPES)
+            archive.writestr(_entry('_rels/.rels'), _ROOT_RELS)
+            archive.writestr(_entry('xl/workbook.xml'), _WORKBOOK)
+            archive.writestr(_entry('xl/_rels/workbook.xml.rels'), _WORKBOOK_RELS)
+            archive.writestr(_entry('xl/styles.xml'), _STYLES)
+            with archive.open(_entry('xl/worksheets/sheet1.xml'), 'w') as sheet:
+                sheet.write(_SHEET_OPEN.encode())
+                header = [df.columns[col] if col < df.shape[1] else None for col in range(width)]
+                sheet.write(ExportService._rows_xml([-1], [header], letters, formulas).encode())
+                for start in range(0, last_row + 1, EXPORT_CHUNK_ROWS):
+                    stop = min(start + EXPORT_CHUNK_ROWS, last_row + 1)
+                    sheet.write(ExportService._chunk_xml(df, start, stop, letters, formulas).encode())
+                    chunk = sink.drain()
+                    if chunk:
+                        yield chunk
+                sheet.write(_SHEET_CLOSE.encode())
+        yield sink.drain()
+
+    @staticmethod
+    def _chunk_xml(df: pd.DataFrame, start: int, stop: int, letters: List[str],
+                   formulas: Dict[Tuple[int, int], str]) -> str:
+        rows = np.arange(start, stop)
+        sheet_rows = rows + 2
+        data_stop = min(stop, len(df))
+        columns = []
+        for col, letter in enumerate(letters):
+            cells = np.full(len(rows), '', dtype=object)
+            if col < df.shape[1] and start < data_stop:
+                cells[:data_stop - start] = _column_cells(df.iloc[start:data_stop, col], letter, sheet_rows[:data_stop - start])
+            columns.append(cells)
+        for (row, col), formula in formulas.items():
+            if start <= row < stop:
+                columns[col][row - start] = _formula_cell(f'{letters[col]}{row + 2}', formula)
+
+        xml = '<row r="' + sheet_rows.astype(str).astype(object) + '">'
+        for cells in columns:
+            xml = xml + cells
+        return ''.join(xml + '</row>')
+
+    @staticmethod
+    def _rows_xml(rows: List[int], values: List[list], letters: List[str],
+                  formulas: Dict[Tuple[int, int], str]) -> str:
+        parts = []
+        for row, row_values in zip(rows, values):
+            cells = []
+            for col, value in enumerate(row_values):
+                ref = f'{letters[col]}{row + 2}'
+                formula = formulas.get((row, col))
+                cells.append(_formula_cell(ref, formula) if formula is not None else _scalar_cell(ref, value))
+            parts.append(f'<row r="{row + 2}">{"".join(cells)}</row>')
+        return ''.join(parts)
+
+    @staticmethod
+    def csv_chunks(df: pd.DataFrame) -> Iterator[bytes]:
+        # BOM so Excel opens UTF-8 CSVs with the right encoding
+        yield '\ufeff'.encode()
+        yield df.iloc[0:0].to_csv(index=False).encode()
+        for start in range(0, len(df), EXPORT_CHUNK_ROWS):
+            yield df.iloc[start:start + EXPORT_CHUNK_ROWS].to_csv(index=False, header=False).encode()
+
+    @staticmethod
+    def parquet_chunks(df: pd.DataFrame) -> Iterator[bytes]:
+        df = ExportService._arrow_safe(df)
+        schema = pa.Schema.from_pandas(df, preserve_index=False)
+        sink = _Sink()
+        with pq.ParquetWriter(sink, schema) as writer:
+            for start in range(0, len(df), EXPORT_CHUNK_ROWS):
+                writer.write_table(pa.Table.from_pandas(
+                    df.iloc[start:start + EXPORT_CHUNK_ROWS], schema=schema, preserve_index=False
+                ))
+                chunk = sink.drain()
+                if chunk:
+                    yield chunk
+            if not len(df):
+                writer.write_table(schema.empty_table())
+        yield sink.drain()
+
+    @staticmethod
+    def _arrow_safe(df: pd.DataFrame) -> pd.DataFrame:
+        """String column names; mixed-type object columns (numbers next to text) exported as text."""
+        mixed = [
+            position for position in range(df.shape[1])
+            if df.iloc[:, position].dtype == object
+            and pd.api.types.infer_dtype(df.iloc[:, position], skipna=True).startswith('mixed')
+        ]
+        if not mixed and all(isinstance(name, str) for name in df.columns):
+            return df
+        df = df.copy(deep=False)
+        df.columns = [str(name) for name in df.columns]
+        for position in mixed:
+            df.isetitem(position, df.iloc[:, position].map(lambda v: None if pd.isna(v) else str(v)))
+        return df
@@ -0,0 +1,710 @@
+import os
+import re
+import math
+import fnmatch
+import threading
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+from app.services.formula_overlay import FormulaOverlay
+
+FORMULA_ENGINE_CACHE = int(os.getenv('FORMULA_ENGINE_CACHE', '64'))  # Conversations with a live engine
+
+_TOKEN = re.compile(r'''
+    (?P<ws>\s+)
+  | (?P<string>"(?:[^"]|"")*")
+  | (?P<func>[A-Za-z_][A-Za-z0-9_.]*)(?=\s*\()
+  | (?P<colrange>\$?[A-Za-z]{1,3}:\$?[A-Za-z]{1,3}(?![A-Za-z0-9]))
+  | (?P<ref>\$?[A-Za-z]{1,3}\$?\d+(?::\$?[A-Za-z]{1,3}\$?\d+)?)
+  | (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<bool>TRUE|FALSE)(?![A-Za-z0-9_])
+  | (?P<op><>|<=|>=|[-+*/^&=<>(),%])
+''', re.VERBOSE | re.IGNORECASE)
+
+_COMPARISONS = ('=', '<>', '<', '>', '<=', '>=')
+_ERRORS = frozenset({'#DIV/0!', '#N/A', '#VALUE!', '#REF!', '#NAME?', '#NUM!'})
+
+
+class FormulaError(Exception):
+    """An Excel error value (#DIV/0!, #N/A, #VALUE!...) raised during evaluation."""
+
+    def __init__(self, code: str):
+        super().__init__(code)
+        self.code = code
+
+
+class _Range:
+    """A rectangular block of cell values, stored per column (float64 when numeric, object otherwise)."""
+
+    __slots__ = ('columns', 'height')
+
+    def __init__(self, columns: List[np.ndarray], height: int):
+        self.columns = columns
+        self.height = height
+
+    def numbers(self) -> np.ndarray:
+        """Numeric cells only, like SUM/AVERAGE: text, booleans and blanks are ignored."""
+        parts = []
+        for column in self.columns:
+            if column.dtype == np.float64:
+                parts.append(column[~np.isnan(column)])
+            else:
+                parts.append(np.array([v for v in column if _is_number(v)], dtype=np.float64))
+        return np.concatenate(parts) if parts else np.array([], dtype=np.float64)
+
+    def column(self, index: int) -> np.ndarray:
+        return self.columns[index]
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _as_objects(column: np.ndarray) -> np.ndarray:
+    if column.dtype != np.float64:
+        return column
+    values = column.astype(object)
+    values[np.isnan(column)] = None
+    return values
+
+
+def _normalize(value):
+    """Frame cell -> engine value: numpy scalars unwrapped, missing values as None (blank)."""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if value is None or (isinstance(value, float) and math.isnan(value)) or value is pd.NaT or value is pd.NA:
+        return None
+    return value
+
+
+def _to_number(value) -> float:
+    if isinstance(value, FormulaError):
+        raise value
+    if value is None:
+        return 0.0
+    if isinstance(value, bool):
+        return float(value)
+    if _is_number(value):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value.strip().replace(',', '')) if value.strip() else 0.0
+        except ValueError:
+            raise FormulaError('#VALUE!')
+    raise FormulaError('#VALUE!')
+
+
+def _to_text(value) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'TRUE' if value else 'FALSE'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _to_bool(value) -> bool:
+    if isinstance(value, str):
+        if value.upper() in ('TRUE', 'FALSE'):
+            return value.upper() == 'TRUE'
+        raise FormulaError('#VALUE!')
+    return bool(_to_number(value))
+
+
+def _compare(op: str, left, right) -> bool:
+    # Excel orders numbers < text < booleans; text compares case-insensitively
+    def rank(v):
+        if v is None:
+            return (0, 0.0)
+        if isinstance(v, bool):
+            return (3, float(v))
+        if _is_number(v):
+            return (1, float(v))
+        return (2, str(v).casefold())
+
+    if left is None and isinstance(right, str):
+        left = ''
+    if right is None and isinstance(left, str):
+        right = ''
+    if left is None and _is_number(right):
+        left = 0.0
+    if right is None and _is_number(left):
+        right = 0.0
+    a, b = rank(left), rank(right)
+    return {
+        '=': a == b, '<>': a != b, '<': a < b, '>': a > b, '<=': a <= b, '>=': a >= b,
+    }[op]
+
+
+def _criteria(criterion):
+    """COUNTIF-style criterion -> predicate over cell values."""
+    if _is_number(criterion) or isinstance(criterion, bool):
+        return lambda v: v is not None and not isinstance(v, str) and _compare('=', v, criterion)
+    text = _to_text(criterion)
+    match = re.match(r'^(<>|<=|>=|=|<|>)?(.*)$', text, re.S)
+    op, operand = match.group(1) or '=', match.group(2)
+    try:
+        number = float(operand)
+    except ValueError:
+        number = None
+    if number is not None:
+        return lambda v: _is_number(v) and _compare(op, float(v), number)
+    if op in ('=', '<>') and any(ch in operand for ch in '*?'):
+        pattern = operand.casefold()
+        matches = lambda v: isinstance(v, str) and fnmatch.fnmatchcase(v.casefold(), pattern)
+        return matches if op == '=' else (lambda v: not matches(v))
+    if op == '=' and operand == '':
+        return lambda v: v is None or v == ''
+    return lambda v: (isinstance(v, str) or v is None) and _compare(op, v if v is not None else '', operand)
+
+
+def _numeric_mask(column: np.ndarray, predicate, criterion) -> np.ndarray:
+    """Vectorized criterion for numeric columns when the criterion is a plain comparison."""
+    text = criterion if isinstance(criterion, str) else None
+    if column.dtype == np.float64:
+        if _is_number(criterion):
+            return column == float(criterion)
+        if text is not None:
+            match = re.match(r'^(<>|<=|>=|=|<|>)?\s*(-?\d+(?:\.\d+)?)$', text)
+            if match:
+                op, number = match.group(1) or '=', float(match.group(2))
+                with np.errstate(invalid='ignore'):
+                    result = {
+                        '=': column == number, '<>': column != number, '<': column < number,
+                        '>': column > number, '<=': column <= number, '>=': column >= number,
+                    }[op]
+                return result & ~np.isnan(column) if op != '<>' else result
+    return np.fromiter((predicate(v) for v in _as_objects(column)), dtype=bool, count=len(column))
+
+
+class _Parser:
+    def __init__(self, text: str):
+        self.tokens = []
+        position = 0
+        while position < len(text):
+            match = _TOKEN.match(text, position)
+            if not match:
+                raise FormulaError('#NAME?')
+            position = match.end()
+            if match.lastgroup != 'ws':
+                self.tokens.append((match.lastgroup, match.group()))
+        self.index = 0
+
+    def peek(self) -> Tuple[Optional[str], Optional[str]]:
+        return self.tokens[self.index] if self.index < len(self.tokens) else (None, None)
+
+    def take(self, value: str = None):
+        kind, text = self.peek()
+        if kind is None or (value is not None and text != value):
+            raise FormulaError('#NAME?')
+        self.index += 1
+        return kind, text
+
+    def parse(self):
+        node = self.comparison()
+        if self.index != len(self.tokens):
+            raise FormulaError('#NAME?')
+        return node
+
+    def comparison(self):
+        node = self.concat()
+        while self.peek()[1] in _COMPARISONS:
+            op = self.take()[1]
+            node = ('bin', op, node, self.concat())
+        return node
+
+    def concat(self):
+        node = self.additive()
+        while self.peek()[1] == '&':
+            self.take()
+            node = ('bin', '&', node, self.additive())
+        return node
+
+    def additive(self):
+        node = self.multiplicative()
+        while self.peek()[1] in ('+', '-'):
+            op = self.take()[1]
+            node = ('bin', op, node, self.multiplicative())
+        return node
+
+    def multiplicative(self):
+        node = self.power()
+        while self.peek()[1] in ('*', '/'):
+            op = self.take()[1]
+            node = ('bin', op, node, self.power())
+        return node
+
+    def power(self):
+        node = self.unary()
+        while self.peek()[1] == '^':
+            self.take()
+            node = ('bin', '^', node, self.unary())
+        return node
+
+    def unary(self):
+        if self.peek()[1] in ('-', '+'):
+            op = self.take()[1]
+            operand = self.unary()
+            return ('neg', operand) if op == '-' else operand
+        node = self.primary()
+        while self.peek()[1] == '%':
+            self.take()
+            node = ('bin', '/', node, ('num', 100.0))
+        return node
+
+    def primary(self):
+        kind, text = self.take()
+        if kind == 'number':
+            return ('num', float(text))
+        if kind == 'string':
+            return ('str', text[1:-1].replace('""', '"'))
+        if kind == 'bool':
+            return ('bool', text.upper() == 'TRUE')
+        if kind == 'ref':
+            parts = text.replace('$', '').split(':')
+            r0, c0 = FormulaOverlay.cell_position(parts[0])
+            if len(parts) == 1:
+                return ('ref', r0, c0)
+            r1, c1 = FormulaOverlay.cell_position(parts[1])
+            return ('range', min(r0, r1), min(c0, c1), max(r0, r1), max(c0, c1))
+        if kind == 'colrange':
+            first, last = text.replace('$', '').split(':')
+            c0 = FormulaOverlay.cell_position(first + '1')[1]
+            c1 = FormulaOverlay.cell_position(last + '1')[1]
+            return ('range', -1, min(c0, c1), None, max(c0, c1))  # Whole columns, header included
+        if kind == 'func':
+            name = text.upper()
+            self.take('(')
+            args = []
+            if self.peek()[1] != ')':
+                args.append(self.comparison())
+                while self.peek()[1] == ',':
+                    self.take()
+                    args.append(self.comparison())
+            self.take(')')
+            return ('call', name, args)
+        if text == '(':
+            node = self.comparison()
+            self.take(')')
+            return node
+        raise FormulaError('#NAME?')
+
+
+def _references(node, out: list) -> list:
+    """Rectangles (r0, c0, r1, c1) read by a parsed formula; r1=None means 'to the last row'."""
+    kind = node[0]
+    if kind == 'ref':
+        out.append((node[1], node[2], node[1], node[2]))
+    elif kind == 'range':
+        out.append(node[1:])
+    elif kind == 'bin':
+        _references(node[2], out)
+        _references(node[3], out)
+    elif kind == 'neg':
+        _references(node[1], out)
+    elif kind == 'call':
+        for arg in node[2]:
+            _references(arg, out)
+    return out
+
+
+def _covers(rect, row: int, col: int) -> bool:
+    r0, c0, r1, c1 = rect
+    return c0 <= col <= c1 and r0 <= row and (r1 is None or row <= r1)
+
+
+class FormulaEngine:
+    """
+    Evaluates overlay formulas against a DataFrame without Excel.
+
+    Cell coordinates follow the sheet: row 1 is the header (column names), data row i is
+    sheet row i + 2. Ranges are read column by column straight from the frame's arrays;
+    formula cells inside a range contribute their computed value. Each formula's
+    precedents are recorded and indexed by column, so writing or removing a formula
+    recomputes only the cells that depend on it. Errors evaluate to Excel error strings
+    ('#DIV/0!', '#N/A'...). An engine is shared by a conversation's concurrent requests:
+    sync and evaluation run under its lock, use compute() to do both at once.
+    """
+
+    def __init__(self, frame: pd.DataFrame, formulas: Dict[str, str] = None):
+        self.frame = frame
+        self._formulas = {}  # (row, col) -> (cell, text, ast | FormulaError, refs)
+        self._values = {}
+        self._evaluating = set()
+        self._dependents = {}  # col -> positions of the formulas reading a range in that column
+        self._lock = threading.RLock()
+        self.evaluations = 0
+        for cell, text in (formulas or {}).items():
+            self._parse_into(cell, text)
+
+    # --- overlay maintenance -------------------------------------------------------
+
+    def _parse_into(self, cell: str, text: str) -> Tuple[int, int]:
+        position = FormulaOverlay.cell_position(cell)
+        body = text[1:] if isinstance(text, str) and text.startswith('=') else None
+        try:
+            if body is None:
+                raise FormulaError('#VALUE!')
+            tree = _Parser(body).parse()
+            refs = _references(tree, [])
+        except FormulaError as e:
+            tree, refs = e, []
+        self._drop(position)
+        self._formulas[position] = (cell.upper(), text, tree, refs)
+        for _, c0, _, c1 in refs:
+            for col in range(c0, c1 + 1):
+                self._dependents.setdefault(col, set()).add(position)
+        return position
+
+    def _drop(self, position: Tuple[int, int]) -> None:
+        entry = self._formulas.pop(position, None)
+        if entry is None:
+            return
+        for _, c0, _, c1 in entry[3]:
+            for col in range(c0, c1 + 1):
+                readers = self._dependents.get(col)
+                if readers is not None:
+                    readers.discard(position)
+                    if not readers:
+                        del self._dependents[col]
+
+    def _invalidate(self, changed: Set[Tuple[int, int]]) -> None:
+        """Drop cached values of the changed cells and, transitively, of their dependents."""
+        stack = list(changed)
+        seen = set(changed)
+        while stack:
+            row, col = stack.pop()
+            self._values.pop((row, col), None)
+            for position in self._dependents.get(col, ()):
+                if position not in seen and any(_covers(rect, row, col) for rect in self._formulas[position][3]):
+                    seen.add(position)
+                    stack.append(position)
+
+    def sync(self, overlay: Dict[str, str]) -> Set[Tuple[int, int]]:
+        """Bring the formulas in line with overlay; returns the positions whose inputs changed."""
+        wanted = {FormulaOverlay.cell_position(cell): (cell, text) for cell, text in overlay.items()}
+        changed = set()
+        with self._lock:
+            for position in list(self._formulas):
+                if position not in wanted:
+                    self._drop(position)
+                    changed.add(position)
+            for position, (cell, text) in wanted.items():
+                current = self._formulas.get(position)
+                if current is None or current[1] != text:
+                    self._parse_into(cell, text)
+                    changed.add(position)
+            self._invalidate(changed)
+        return changed
+
+    def values(self) -> Dict[str, object]:
+        """Computed value of every formula cell, keyed by cell reference."""
+        with self._lock:
+            return {entry[0]: self._evaluate_cell(position) for position, entry in list(self._formulas.items())}
+
+    def compute(self, overlay: Dict[str, str]) -> Dict[str, object]:
+        """sync(overlay) then values(), atomically: another request cannot swap the overlay in between."""
+        with self._lock:
+            self.sync(overlay)
+            return self.values()
+
+    # --- evaluation ----------------------------------------------------------------
+
+    def _evaluate_cell(self, position: Tuple[int, int]):
+        if position in self._values:
+            return self._values[position]
+        if position in self._evaluating:
+            return '#REF!'  # Circular reference
+        _, _, tree, _ = self._formulas[position]
+        self._evaluating.add(position)
+        try:
+            self.evaluations += 1
+            if isinstance(tree, FormulaError):
+                raise tree
+            value = self._scalar(self._eval(tree))
+            if isinstance(value, float) and (math.isinf(value) or math.isnan(value)):
+                value = '#NUM!'
+        except FormulaError as e:
+            value = e.code
+        except (ZeroDivisionError, OverflowError):
+            value = '#DIV/0!'
+        finally:
+            self._evaluating.discard(position)
+        if isinstance(value, float) and value.is_integer() and abs(value) < 2 ** 53:
+            value = int(value)
+        self._values[position] = value
+        return value
+
+    def _cell(self, row: int, col: int):
+        if (row, col) in self._formulas:
+            value = self._evaluate_cell((row, col))
+            if value in _ERRORS:
+                raise FormulaError(value)  # Errors propagate to dependents, as in Excel
+            return value
+        if row == -1:
+            return str(self.frame.columns[col]) if col < self.frame.shape[1] else None
+        if 0 <= row < len(self.frame) and col < self.frame.shape[1]:
+            return _normalize(self.frame.iat[row, col])
+        return None
+
+    def _last_row(self) -> int:
+        formula_rows = [row for row, _ in self._formulas]
+        return max([len(self.frame) - 1] + formula_rows)
+
+    def _range(self, r0: int, c0: int, r1: Optional[int], c1: int) -> _Range:
+        if r1 is None:
+            r1 = self._last_row()
+        height = r1 - r0 + 1
+        columns = []
+        for col in range(c0, c1 + 1):
+            data_start, data_stop = max(r0, 0), min(r1 + 1, len(self.frame))
+            if col < self.frame.shape[1] and data_start < data_stop:
+                series = self.frame.iloc[data_start:data_stop, col]
+                if pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype):
+                    values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+                else:
+                    values = series.to_numpy(dtype=object, na_value=None)
+                    values = np.array([_normalize(v) for v in values], dtype=object) \
+                        if series.dtype != object else values
+            else:
+                values = np.array([], dtype=np.float64)
+            before = data_start - r0 if data_start < data_stop else height
+            after = height - before - len(values)
+            if before:
+                # Header or out-of-frame rows above the data: the column can no longer be purely numeric
+                values = np.concatenate([np.full(before, None, dtype=object), _as_objects(values)])
+            if after > 0:
+                pad = np.full(after, np.nan if values.dtype == np.float64 else None, dtype=values.dtype)
+                values = np.concatenate([values, pad])
+            if r0 == -1:
+                values[0] = self._cell(-1, col)
+            inside = [(row, col) for (row, fcol) in self._formulas if fcol == col and r0 <= row <= r1]
+            if inside:
+                values = _as_objects(values).copy()
+                for row, _ in inside:
+                    values[row - r0] = self._cell(row, col)
+            columns.append(values)
+        return _Range(columns, height)
+
+    @staticmethod
+    def _scalar(value):
+        if isinstance(value, _Range):
+            if value.height == 1 and len(value.columns) == 1:
+                cell = value.columns[0][0]
+                return None if isinstance(cell, float) and math.isnan(cell) else _normalize(cell)
+            raise FormulaError('#VALUE!')
+        return value
+
+    def _eval(self, node):
+        kind = node[0]
+        if kind in ('num', 'str', 'bool'):
+            return node[1]
+        if kind == 'ref':
+            return self._cell(node[1], node[2])
+        if kind == 'range':
+            return self._range(*node[1:])
+        if kind == 'neg':
+            return -_to_number(self._scalar(self._eval(node[1])))
+        if kind == 'bin':
+            op = node[1]
+            left = self._scalar(self._eval(node[2]))
+            right = self._scalar(self._eval(node[3]))
+            if op == '&':
+                return _to_text(left) + _to_text(right)
+            if op in _COMPARISONS:
+                return _compare(op, left, right)
+            a, b = _to_number(left), _to_number(right)
+            if op == '+':
+                return a + b
+            if op == '-':
+                return a - b
+            if op == '*':
+                return a * b
+            if op == '/':
+                if b == 0:
+                    raise FormulaError('#DIV/0!')
+                return a / b
+            return a ** b
+        if kind == 'call':
+            return self._call(node[1], node[2])
+        raise FormulaError('#NAME?')
+
+    def _numbers(self, args) -> np.ndarray:
+        parts = []
+        for arg in args:
+            value = self._eval(arg)
+            if isinstance(value, _Range):
+                parts.append(value.numbers())
+            elif value is not None:
+                parts.append(np.array([_to_number(value)]))
+        return np.concatenate(parts) if parts else np.array([], dtype=np.float64)
+
+    def _call(self, name: str, args: list):
+        # Lazy functions first: only the chosen branch is evaluated
+        if name == 'IF':
+            if not 2 <= len(args) <= 3:
+                raise FormulaError('#VALUE!')
+            if _to_bool(self._scalar(self._eval(args[0]))):
+                return self._scalar(self._eval(args[1]))
+            return self._scalar(self._eval(args[2])) if len(args) == 3 else False
+        if name == 'IFERROR':
+            try:
+                return self._scalar(self._eval(args[0]))
+            except (FormulaError, ZeroDivisionError):
+                return self._scalar(self._eval(args[1]))
+
+        if name == 'SUM':
+            return float(self._numbers(args).sum())
+        if name in ('AVERAGE', 'MIN', 'MAX'):
+            numbers = self._numbers(args)
+            if name == 'AVERAGE':
+                if not len(numbers):
+                    raise FormulaError('#DIV/0!')
+                return float(numbers.mean())
+            return float(numbers.min() if name == 'MIN' else numbers.max()) if len(numbers) else 0.0
+        if name == 'COUNT':
+            return float(len(self._numbers(args)))
+        if name == 'COUNTA':
+            count = 0
+            for arg in args:
+                value = self._eval(arg)
+                if isinstance(value, _Range):
+                    count += sum(int(np.count_nonzero(~np.isnan(c))) if c.dtype == np.float64
+                                 else sum(v is not None for v in c) for c in value.columns)
+                elif value is not None:
+                    count += 1
+            return float(count)
+        if name in ('COUNTIF', 'SUMIF', 'AVERAGEIF'):
+            return self._conditional(name, args)
+        if name == 'VLOOKUP':
+            return self._vlookup(args)
+
+        values = [self._scalar(self._eval(arg)) for arg in args]
+        if name == 'ROUND':
+            digits = int(_to_number(values[1])) if len(values) > 1 else 0
+            number = _to_number(values[0]) * 10 ** digits
+            return math.floor(abs(number) + 0.5) * math.copysign(1, number) / 10 ** digits
+        if name == 'ABS':
+            return abs(_to_number(values[0]))
+        if name == 'AND':
+            return all(_to_bool(v) for v in values)
+        if name == 'OR':
+            return any(_to_bool(v) for v in values)
+        if name == 'NOT':
+            return not _to_bool(values[0])
+        if name in ('CONCAT', 'CONCATENATE'):
+            return ''.join(_to_text(v) for v in values)
+        if name == 'LEN':
+            return float(len(_to_text(values[0])))
+        if name == 'UPPER':
+            return _to_text(values[0]).upper()
+        if name == 'LOWER':
+            return _to_text(values[0]).lower()
+        if name == 'TRIM':
+            return ' '.join(_to_text(values[0]).split())
+        raise FormulaError('#NAME?')
+
+    def _conditional(self, name: str, args: list):
+        if len(args) < 2:
+            raise FormulaError('#VALUE!')
+        criteria_range = self._eval(args[0])
+        criterion = self._scalar(self._eval(args[1]))
+        if not isinstance(criteria_range, _Range):
+            raise FormulaError('#VALUE!')
+        predicate = _criteria(criterion)
+        masks = [_numeric_mask(column, predicate, criterion) for column in criteria_range.columns]
+        if name == 'COUNTIF':
+            return float(sum(int(mask.sum()) for mask in masks))
+
+        sum_range = self._eval(args[2]) if len(args) > 2 else criteria_range
+        if not isinstance(sum_range, _Range):
+            raise FormulaError('#VALUE!')
+        picked = []
+        for index, mask in enumerate(masks):
+            if index >= len(sum_range.columns):
+                break
+            column = sum_range.columns[index][:len(mask)]
+            selected = column[mask[:len(column)]]
+            if selected.dtype == np.float64:
+                picked.append(selected[~np.isnan(selected)])
+            else:
+                picked.append(np.array([v for v in selected if _is_number(v)], dtype=np.float64))
+        numbers = np.concatenate(picked) if picked else np.array([], dtype=np.float64)
+        if name == 'SUMIF':
+            return float(numbers.sum())
+        if not len(numbers):
+            raise FormulaError('#DIV/0!')
+        return float(numbers.mean())
+
+    def _vlookup(self, args: list):
+        if not 3 <= len(args) <= 4:
+            raise FormulaError('#VALUE!')
+        needle = self._scalar(self._eval(args[0]))
+        table = self._eval(args[1])
+        index = int(_to_number(self._scalar(self._eval(args[2]))))
+        approximate = _to_bool(self._scalar(self._eval(args[3]))) if len(args) == 4 else True
+        if not isinstance(table, _Range):
+            raise FormulaError('#VALUE!')
+        if index < 1 or index > len(table.columns):
+            raise FormulaError('#REF!')
+
+        keys = table.column(0)
+        if approximate:
+            # Sorted first column: last row whose key is <= needle
+            found = None
+            for row, key in enumerate(_as_objects(keys)):
+                if key is None:
+                    continue
+                if _compare('<=', key, needle):
+                    found = row
+                else:
+                    break
+        else:
+            if keys.dtype == np.float64 and _is_number(needle):
+                hits = np.flatnonzero(keys == float(needle))
+            else:
+                target = _to_text(needle).casefold() if isinstance(needle, str) else needle
+                hits = [row for row, key in enumerate(_as_objects(keys))
+                        if key is not None and (key.casefold() if isinstance(key, str) else key) == target]
+            found = int(hits[0]) if len(hits) else None
+        if found is None:
+            raise FormulaError('#N/A')
+        value = table.column(index - 1)[found]
+        return None if isinstance(value, float) and math.isnan(value) else _normalize(value)
+
+    # --- per-conversation engines ----------------------------------------------------
+
+    @staticmethod
+    def _engine(conversation_id: int, frame: pd.DataFrame) -> 'FormulaEngine':
+        with _engines_lock:
+            engine = _engines.get(conversation_id)
+            if engine is None or engine.frame is not frame:
+                engine = FormulaEngine(frame)
+            _engines[conversation_id] = engine
+            _engines.move_to_end(conversation_id)
+            while len(_engines) > FORMULA_ENGINE_CACHE:
+                _engines.popitem(last=False)
+        return engine
+
+    @staticmethod
+    def for_conversation(conversation_id: int, frame: pd.DataFrame, overlay: Dict[str, str]) -> 'FormulaEngine':
+        """
+        Live engine for a conversation: reused (recomputing only what changed) while the
+        conversation's frame object is the same, rebuilt when the data itself changed.
+        Callers that read values should use values_for(), which holds the engine's lock
+        across the sync and the evaluation.
+        """
+        engine = FormulaEngine._engine(conversation_id, frame)
+        engine.sync(overlay)
+        return engine
+
+    @staticmethod
+    def values_for(conversation_id: int, frame: pd.DataFrame, overlay: Dict[str, str]) -> Dict[str, object]:
+        """Computed overlay values for the conversation's current frame."""
+        return FormulaEngine._engine(conversation_id, frame).compute(overlay)
+
+
+_engines = OrderedDict()
+_engines_lock = threading.Lock()
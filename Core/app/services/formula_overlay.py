@@ -0,0 +1,100 @@
+import re
+import json
+import pandas as pd
+from typing import Dict, Iterable, List, Optional, Tuple
+
+_CELL = re.compile(r'([A-Za-z]{1,3})(\d+)')
+
+
+class FormulaOverlay:
+    """
+    Cell -> formula layer kept on top of the replayed frame.
+
+    FORMULA_WRITE commands never touch the uploaded file: the overlay is folded from the
+    active commands (later writes win, undo simply drops the last one), shown in place of
+    the underlying values for display (computed by FormulaEngine when values are given),
+    and written into the workbook only on export (ExportService.xlsx_chunks).
+    Cells are sheet coordinates of the current frame: row 1 is the header row.
+    """
+
+    @staticmethod
+    def cell_position(cell: str) -> Tuple[int, int]:
+        """'B7' -> (data row 5, column 1)."""
+        match = _CELL.fullmatch(cell.strip())
+        if not match:
+            raise ValueError(f"Referencia de celda inválida: {cell!r}")
+        col = 0
+        for letter in match.group(1).upper():
+            col = col * 26 + (ord(letter) - ord('A') + 1)
+        return int(match.group(2)) - 2, col - 1
+
+    @staticmethod
+    def column_letter(index: int) -> str:
+        """0 -> 'A', 27 -> 'AB'."""
+        letters = ''
+        index += 1
+        while index:
+            index, remainder = divmod(index - 1, 26)
+            letters = chr(ord('A') + remainder) + letters
+        return letters
+
+    @staticmethod
+    def build(commands: Iterable) -> Dict[str, str]:
+        overlay = {}
+        for cmd in commands:
+            if getattr(cmd, 'intent_type', None) != 'FORMULA_WRITE':
+                continue
+            try:
+                FormulaOverlay.merge(overlay, json.loads(cmd.generated_code))
+            except (TypeError, ValueError, KeyError) as e:
+                print(f"[FORMULA OVERLAY] Skipping cmd {getattr(cmd, 'id', '?')}: {e}")
+        return overlay
+
+    @staticmethod
+    def merge(overlay: Dict[str, str], instructions: List[dict]) -> Dict[str, str]:
+        """Apply [{cell, formula}] on top of overlay (in place) and return it."""
+        for instruction in instructions:
+            overlay[instruction['cell'].strip().upper()] = instruction['formula']
+        return overlay
+
+    @staticmethod
+    def apply(df: pd.DataFrame, overlay: Dict[str, str], values: Optional[Dict[str, object]] = None) -> pd.DataFrame:
+        """
+        Display frame with each overlay cell in place: its computed value from values when
+        available, the formula text otherwise. df itself is returned when there is nothing to show.
+        """
+        values = values or {}
+        positions = []
+        for cell, formula in overlay.items():
+            row, col = FormulaOverlay.cell_position(cell)
+            if row >= 0:  # Header-row formulas have no place in the grid
+                positions.append((row, col, values.get(cell, formula)))
+        if not positions:
+            return df
+
+        display = df.copy(deep=not pd.options.mode.copy_on_write)
+
+        # Grow the grid for formulas written below or to the right of the data
+        extra_rows = max(row for row, _, _ in positions) + 1 - len(display)
+        if extra_rows > 0:
+            if not pd.api.types.is_integer_dtype(display.index) or not display.index.is_unique:
+                display = display.reset_index(drop=True)
+            start = int(display.index.max()) + 1 if len(display) else 0
+            display = display.reindex(display.index.append(pd.RangeIndex(start, start + extra_rows)))
+        for col in range(display.shape[1], max(col for _, col, _ in positions) + 1):
+            name = FormulaOverlay.column_letter(col)
+            while name in display.columns:
+                name += '_'
+            display[name] = None
+
+        for row, col, value in positions:
+            column = display.iloc[:, col]
+            numeric = pd.api.types.is_numeric_dtype(column.dtype) and not pd.api.types.is_bool_dtype(column.dtype)
+            if numeric and isinstance(value, (int, float)) and not isinstance(value, bool):
+                # Numbers keep numeric columns numeric (ints widen to float for the NaN rows)
+                if not pd.api.types.is_float_dtype(column.dtype):
+                    display[display.columns[col]] = column.astype('float64')
+            elif column.dtype != object:
+                display[display.columns[col]] = column.astype(object)
+            display.iat[row, col] = value
+        return display
@@ -0,0 +1,105 @@
+import os
+import numpy as np
+import pandas as pd
+from typing import Optional
+from app.services.excel_service import GRID_WINDOW_ROWS
+from app.services.frame_serializer import FrameSerializer
+
+DIFF_MAX_RATIO = float(os.getenv('DIFF_MAX_RATIO', '0.5'))  # Patch cells / window cells above this -> full payload
+
+
+class FrameDiff:
+    """
+    Grid patches between two states of a conversation.
+
+    A patch turns the window [0, limit) of `before` into the window [0, limit) of `after`,
+    which is what the client holds. Rows are matched by index label; the client applies,
+    in order: truncate to `limit`, drop `deleted_rows` (old positions), rename/remove
+    columns, splice `inserted_rows` (new positions, ascending), then set `cells` (new
+    positions). Reordered rows (sorts) and duplicate labels always fall back to a full payload.
+    """
+
+    @staticmethod
+    def _runs(positions: np.ndarray) -> list:
+        """[2, 3, 4, 9] -> [[2, 5], [9, 10]] (half-open ranges)."""
+        if len(positions) == 0:
+            return []
+        breaks = np.flatnonzero(np.diff(positions) != 1) + 1
+        return [[int(run[0]), int(run[-1]) + 1] for run in np.split(positions, breaks)]
+
+    @staticmethod
+    def _changed(old: pd.Series, new: pd.Series) -> np.ndarray:
+        """Vectorized per-row inequality of two aligned columns, treating null == null."""
+        try:
+            both_null = old.isna().to_numpy() & new.isna().to_numpy()
+            differs = old.ne(new).fillna(True).to_numpy(dtype=bool)
+            return differs & ~both_null
+        except (TypeError, ValueError):
+            # Incomparable dtypes (e.g. categoricals with different categories)
+            return np.ones(len(new), dtype=bool)
+
+    @staticmethod
+    def compute(before: pd.DataFrame, after: pd.DataFrame, limit: int = None) -> Optional[dict]:
+        """Return a patch, or None when a full payload is required or cheaper."""
+        if limit is None:
+            limit = GRID_WINDOW_ROWS
+        if not (before.columns.is_unique and after.columns.is_unique):
+            return None
+
+        old = before.iloc[:limit]
+        new = after.iloc[:limit]
+        if not (old.index.is_unique and new.index.is_unique):
+            return None
+
+        old_kept = old.index.isin(new.index)
+        new_shared = new.index.isin(old.index)
+        if not old.index[old_kept].equals(new.index[new_shared]):
+            return None  # Shared rows were reordered
+
+        shared_positions = np.flatnonzero(new_shared)
+        shared_new = new.iloc[shared_positions]
+        shared_old = old.loc[shared_new.index]
+
+        removed = [col for col in before.columns if col not in after.columns]
+        renamed = {}
+        cells = {}
+        for col in after.columns:
+            if col in before.columns:
+                changed = FrameDiff._changed(shared_old[col], shared_new[col])
+            else:
+                changed = np.ones(len(shared_positions), dtype=bool)
+                # A new column whose values match a dropped one is a rename
+                for candidate in removed:
+                    if candidate not in renamed and len(shared_positions) and \
+                            not FrameDiff._changed(shared_old[candidate], shared_new[col]).any():
+                        renamed[candidate] = col
+                        changed = np.zeros(len(shared_positions), dtype=bool)
+                        break
+            if changed.any():
+                cells[col] = {
+                    "rows": shared_positions[changed].tolist(),
+                    "values": FrameSerializer.column_values(shared_new[col][changed])
+                }
+
+        inserted_positions = np.flatnonzero(~new_shared)
+        inserted = [
+            {"at": start, "rows": FrameSerializer.to_records(new.iloc[start:stop])}
+            for start, stop in FrameDiff._runs(inserted_positions)
+        ]
+
+        patch_cells = sum(len(change["rows"]) for change in cells.values()) + len(inserted_positions) * new.shape[1]
+        window_cells = max(new.shape[0] * new.shape[1], 1)
+        if patch_cells > window_cells * DIFF_MAX_RATIO:
+            return None
+
+        return {
+            "columns": after.columns.tolist(),
+            "schema": [{"name": str(col), "dtype": str(dtype)} for col, dtype in after.dtypes.items()],
+            "total_rows": len(after),
+            "limit": limit,
+            "removed_columns": [col for col in removed if col not in renamed],
+            "renamed_columns": renamed,
+            "deleted_rows": FrameDiff._runs(np.flatnonzero(~old_kept)),
+            "inserted_rows": inserted,
+            "cells": cells
+        }
@@ -0,0 +1,98 @@
+import msgspec
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+ARROW_MIMETYPE = 'application/vnd.apache.arrow.stream'
+
+
+def _enc_hook(obj):
+    """Fallback for values msgspec cannot encode natively (only reached from object columns)."""
+    if obj is pd.NaT or obj is pd.NA:
+        return None
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if hasattr(obj, 'isoformat'):
+        return obj.isoformat()
+    return str(obj)
+
+
+_encoder = msgspec.json.Encoder(enc_hook=_enc_hook)
+
+
+class FrameSerializer:
+    """
+    Vectorized DataFrame -> JSON-ready conversion.
+
+    Values are converted one column at a time from the NumPy buffers; there is no
+    per-cell Python work except for genuinely mixed object columns, which msgspec
+    walks in C and only hands odd values (numpy scalars, Timestamps, NaT) to _enc_hook.
+    NaN/NaT/NA are emitted as null.
+    """
+
+    @staticmethod
+    def column_values(series: pd.Series) -> list:
+        dtype = series.dtype
+        if pd.api.types.is_datetime64_any_dtype(dtype):
+            if getattr(dtype, 'tz', None) is not None:
+                series = series.dt.tz_localize(None)  # Keep wall-clock time, like strftime did
+            values = series.to_numpy(dtype='datetime64[s]')
+            text = np.char.replace(np.datetime_as_string(values, unit='s'), 'T', ' ').astype(object)
+            text[np.isnat(values)] = None
+            return text.tolist()
+        if pd.api.types.is_timedelta64_dtype(dtype):
+            return series.astype(object).tolist()  # Timedelta objects -> isoformat in _enc_hook
+        if isinstance(dtype, np.dtype):
+            # int/uint/float/bool: native Python scalars; NaN encodes as null.
+            # object: left as-is for the encoder.
+            return series.to_numpy().tolist()
+        # Extension dtypes (nullable ints/bools, strings, categoricals...)
+        return series.to_numpy(dtype=object, na_value=None).tolist()
+
+    @staticmethod
+    def to_records(df: pd.DataFrame) -> list:
+        """Row-major list of dicts, same shape as to_dict(orient='records')."""
+        columns = df.columns.tolist()
+        values = [FrameSerializer.column_values(df.iloc[:, i]) for i in range(df.shape[1])]
+        return [dict(zip(columns, row)) for row in zip(*values)]
+
+    @staticmethod
+    def to_columns(df: pd.DataFrame) -> dict:
+        """
+        Column-major payload: one value array per column (nulls in place) plus a sparse
+        null mask (row indices) per column so clients can build typed arrays.
+        """
+        values = []
+        nulls = []
+        for i in range(df.shape[1]):
+            series = df.iloc[:, i]
+            values.append(FrameSerializer.column_values(series))
+            nulls.append(np.flatnonzero(series.isna().to_numpy()).tolist())
+        return {
+            "values": values,
+            "nulls": nulls
+        }
+
+    @staticmethod
+    def dumps(obj) -> str:
+        return _encoder.encode(obj).decode('utf-8')
+
+    @staticmethod
+    def _arrow_column(series: pd.Series) -> pa.Array:
+        try:
+            # Zero-copy for null-free numeric columns; pandas null handling otherwise
+            return pa.Array.from_pandas(series)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            # Mixed object column Arrow cannot type: ship it as text, keeping nulls
+            return pa.array([None if pd.isna(v) else str(v) for v in series.tolist()], type=pa.string())
+
+    @staticmethod
+    def to_arrow_ipc(df: pd.DataFrame) -> bytes:
+        """Encode df (index dropped) as an Arrow IPC stream."""
+        arrays = [FrameSerializer._arrow_column(df.iloc[:, i]) for i in range(df.shape[1])]
+        names = [str(col) for col in df.columns]
+        table = pa.Table.from_arrays(arrays, names=names)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
@@ -0,0 +1,208 @@
+import os
+import re
+import threading
+from typing import List, Optional
+from app.services.formula_overlay import FormulaOverlay
+
+FAST_PATH_ENABLED = os.getenv('FAST_PATH_ENABLED', '1') == '1'
+
+_NUMBER = r'-?\d+(?:[.,]\d+)?'
+# "1,000" / "1.000": thousands separator or decimal mark depends on the locale
+_AMBIGUOUS_NUMBER = r'-?\d+[.,]\d{3}'
+_VALUE = rf'(?P<value>{_NUMBER}|\'[^\']*\'|"[^"]*"|\S+)'
+
+# Comparison operators, longest phrases first so "mayor o igual que" beats "mayor que"
+_OPERATORS = [
+    (r'>=|greater than or equal to|at least|mayor o igual (?:que|a)', '>='),
+    (r'<=|less than or equal to|at most|menor o igual (?:que|a)', '<='),
+    (r'!=|<>|not equal to|is not|distinto de|diferente de', '!='),
+    (r'>|greater than|more than|over|above|mayor (?:que|a)|m[aá]s de', '>'),
+    (r'<|less than|under|below|menor (?:que|a)|menos de', '<'),
+    (r'==|=|equals|equal to|is|es igual a|igual a|es', '=='),
+]
+
+_stats_lock = threading.Lock()
+_stats = {"requests": 0, "hits": 0, "total_ms": 0.0, "rules": {}}
+
+
+class IntentParser:
+    """
+    Deterministic fast path for mechanical prompts (English and Spanish): sort, filter,
+    drop column, rename column, set a cell, remove duplicates. Column names must match
+    the actual columns; anything ambiguous returns None so the prompt goes to the LLM.
+    """
+
+    @staticmethod
+    def _column_pattern(columns: List[str], name: str) -> str:
+        # Longest names first so "Sales Total" wins over "Sales"
+        names = sorted((str(c) for c in columns), key=len, reverse=True)
+        alternation = '|'.join(re.escape(n) for n in names if n)
+        return rf'[\'"`]?(?P<{name}>{alternation})[\'"`]?'
+
+    @staticmethod
+    def _resolve_column(matched: str, columns: List[str]) -> Optional[str]:
+        exact = [c for c in columns if str(c) == matched]
+        if exact:
+            return exact[0]
+        folded = [c for c in columns if str(c).casefold() == matched.casefold()]
+        return folded[0] if len(folded) == 1 else None
+
+    @staticmethod
+    def _parse_value(raw: str):
+        """Literal value from the prompt; None when the number is ambiguous."""
+        if raw[:1] in ('"', "'") and raw[-1:] == raw[:1]:
+            return raw[1:-1]
+        if re.fullmatch(_AMBIGUOUS_NUMBER, raw):
+            return None
+        if re.fullmatch(_NUMBER, raw):
+            number = float(raw.replace(',', '.'))
+            return int(number) if number.is_integer() and '.' not in raw and ',' not in raw else number
+        return raw
+
+    @staticmethod
+    def _explain(language: str, en: str, es: str) -> str:
+        return es if language == 'es' else en
+
+    @staticmethod
+    def parse(prompt: str, columns: List[str], dtypes: List[str] = None, row_count: int = None) -> Optional[dict]:
+        """Return {code, explanation, intent, rule} for a confident match, else None."""
+        if not FAST_PATH_ENABLED or not columns:
+            return None
+        text = re.sub(r'\s+', ' ', prompt).strip().rstrip('.!?')
+        col = IntentParser._column_pattern(columns, 'col')
+        flags = re.IGNORECASE
+
+        # Remove duplicates
+        if re.fullmatch(r'(?:remove|drop|delete) (?:all )?(?:the )?duplicates?(?: rows)?|(?:remove|drop|delete) duplicate rows|dedupe', text, flags):
+            return IntentParser._result('remove_duplicates', "df = df.drop_duplicates()", "Removed duplicate rows.")
+        if re.fullmatch(r'(?:elimina|eliminar|quita|quitar|borra|borrar) (?:los |las )?(?:filas )?duplicad[oa]s', text, flags):
+            return IntentParser._result('remove_duplicates', "df = df.drop_duplicates()", "Se eliminaron las filas duplicadas.")
+
+        # Drop column
+        for pattern, language in (
+            (rf'(?:drop|remove|delete) (?:the )?column {col}', 'en'),
+            (rf'(?:elimina|eliminar|quita|quitar|borra|borrar) (?:la )?columna {col}', 'es'),
+        ):
+            match = re.fullmatch(pattern, text, flags)
+            if match:
+                name = IntentParser._resolve_column(match.group('col'), columns)
+                if name is None:
+                    return None
+                return IntentParser._result(
+                    'drop_column', f"df = df.drop(columns=[{name!r}])",
+                    IntentParser._explain(language, f"Dropped column '{name}'.", f"Se eliminó la columna '{name}'.")
+                )
+
+        # Rename column
+        for pattern, language in (
+            (rf'rename (?:the )?(?:column )?{col} (?:to|as) (?P<new>.+)', 'en'),
+            (rf'(?:renombra|renombrar|cambia el nombre de) (?:la )?(?:columna )?{col} (?:a|como|por) (?P<new>.+)', 'es'),
+        ):
+            match = re.fullmatch(pattern, text, flags)
+            if match:
+                name = IntentParser._resolve_column(match.group('col'), columns)
+                new_name = match.group('new').strip().strip('\'"`')
+                if name is None or not new_name or new_name in columns:
+                    return None
+                return IntentParser._result(
+                    'rename_column', f"df = df.rename(columns={{{name!r}: {new_name!r}}})",
+                    IntentParser._explain(language, f"Renamed column '{name}' to '{new_name}'.",
+                                          f"Se renombró la columna '{name}' a '{new_name}'.")
+                )
+
+        # Sort
+        for pattern, language in (
+            (rf'(?:sort|order) (?:the data |the rows |rows |data )?by {col}(?: (?:in )?(?P<dir>ascending|descending|asc|desc)(?: order)?)?', 'en'),
+            (rf'(?:ordena|ordenar) (?:los datos |las filas )?(?:por|seg[uú]n) {col}(?: (?:de forma |en orden )?(?P<dir>ascendente|descendente|asc|desc))?', 'es'),
+        ):
+            match = re.fullmatch(pattern, text, flags)
+            if match:
+                name = IntentParser._resolve_column(match.group('col'), columns)
+                if name is None:
+                    return None
+                ascending = (match.group('dir') or 'asc').lower() not in ('desc', 'descending', 'descendente')
+                order_en = 'ascending' if ascending else 'descending'
+                order_es = 'ascendente' if ascending else 'descendente'
+                return IntentParser._result(
+                    'sort', f"df = df.sort_values(by={name!r}, ascending={ascending})",
+                    IntentParser._explain(language, f"Sorted rows by '{name}' in {order_en} order.",
+                                          f"Se ordenaron las filas por '{name}' en orden {order_es}.")
+                )
+
+        # Filter
+        operator_alternation = '|'.join(phrase for phrase, _ in _OPERATORS)
+        for pattern, language in (
+            (rf'(?:filter|keep|show)(?: only)?(?: the)?(?: rows)? (?:where|with|whose) {col} (?P<op>{operator_alternation}) {_VALUE}', 'en'),
+            (rf'(?:filtra|filtrar|deja|dejar|muestra|mostrar)(?: solo)?(?: las filas)? (?:donde|con|en las que|cuyo|cuya) {col} (?P<op>{operator_alternation}) {_VALUE}', 'es'),
+        ):
+            match = re.fullmatch(pattern, text, flags)
+            if match:
+                name = IntentParser._resolve_column(match.group('col'), columns)
+                if name is None:
+                    return None
+                phrase = match.group('op').lower()
+                operator = next(op for alternatives, op in _OPERATORS if re.fullmatch(alternatives, phrase, flags))
+                value = IntentParser._parse_value(match.group('value'))
+                if value is None:
+                    return None
+                is_number = isinstance(value, (int, float))
+                dtype = dtypes[list(columns).index(name)] if dtypes else None
+                numeric_column = dtype is not None and re.match(r'(u?int|float|Int|UInt|Float)', dtype)
+                if operator not in ('==', '!=') and not (is_number and numeric_column):
+                    return None  # Ordering comparisons only on numeric columns
+                if dtype is not None and is_number != bool(numeric_column):
+                    return None  # A text value never matches a numeric column (and vice versa)
+                return IntentParser._result(
+                    'filter', f"df = df[df[{name!r}] {operator} {value!r}]",
+                    IntentParser._explain(language, f"Kept rows where '{name}' {operator} {value!r}.",
+                                          f"Se conservaron las filas donde '{name}' {operator} {value!r}.")
+                )
+
+        # Set a single cell (plain value — formulas go to the LLM as FORMULA_WRITE)
+        for pattern, language in (
+            (rf'set (?:the value of )?(?:cell )?(?P<cell>[A-Za-z]{{1,3}}\d+) (?:to|=) {_VALUE}', 'en'),
+            (rf'(?:pon|poner|cambia|cambiar|establece|establecer|asigna|asignar) (?:el valor de )?(?:la celda )?(?P<cell>[A-Za-z]{{1,3}}\d+) (?:a|en|=|con|como) {_VALUE}', 'es'),
+        ):
+            match = re.fullmatch(pattern, text, flags)
+            if match:
+                if match.group('value').startswith('='):
+                    return None
+                row, column = FormulaOverlay.cell_position(match.group('cell'))
+                if row < 0 or column >= len(columns) or (row_count is not None and row >= row_count):
+                    return None
+                value = IntentParser._parse_value(match.group('value'))
+                if value is None:
+                    return None
+                cell = match.group('cell').upper()
+                return IntentParser._result(
+                    'set_cell', f"df.iloc[{row}, {column}] = {value!r}",
+                    IntentParser._explain(language, f"Set cell {cell} to {value!r}.",
+                                          f"Se asignó {value!r} a la celda {cell}.")
+                )
+
+        return None
+
+    @staticmethod
+    def _result(rule: str, code: str, explanation: str) -> dict:
+        return {"code": code, "explanation": explanation, "intent": "DATA_MUTATION", "rule": rule}
+
+    @staticmethod
+    def record(result: Optional[dict], elapsed_ms: float) -> None:
+        with _stats_lock:
+            _stats["requests"] += 1
+            _stats["total_ms"] += elapsed_ms
+            if result is not None:
+                _stats["hits"] += 1
+                _stats["rules"][result["rule"]] = _stats["rules"].get(result["rule"], 0) + 1
+
+    @staticmethod
+    def stats() -> dict:
+        with _stats_lock:
+            requests = _stats["requests"]
+            return {
+                "requests": requests,
+                "hits": _stats["hits"],
+                "hit_rate": round(_stats["hits"] / requests, 4) if requests else None,
+                "avg_parse_ms": round(_stats["total_ms"] / requests, 3) if requests else None,
+                "rules": dict(_stats["rules"]),
+            }
@@ -0,0 +1,123 @@
+import os
+import re
+import json
+import hashlib
+import unicodedata
+from datetime import datetime, timedelta
+from typing import List, Optional
+from sqlalchemy import func
+from config.database import db_session
+from app.models.llm_cache import LLMCacheEntry
+
+LLM_CACHE_TTL_HOURS = int(os.getenv('LLM_CACHE_TTL_HOURS', str(7 * 24)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', '10000'))
+
+
+class LLMCacheService:
+    """
+    Persistent cache of LLM results keyed by normalized prompt + schema fingerprint + model.
+
+    The cache is an optimization only: every database error is logged and treated as a
+    miss, so generation never fails because of it. Inside a request it shares the
+    request's session (see db_session) instead of checking out a second connection.
+    """
+
+    @staticmethod
+    def normalize_prompt(prompt: str) -> str:
+        text = unicodedata.normalize('NFKC', prompt).casefold()
+        text = re.sub(r'\s+', ' ', text).strip()
+        return text.rstrip('.!?¡¿ ')
+
+    @staticmethod
+    def make_key(prompt: str, columns: List[str], dtypes: Optional[List[str]], model: str) -> str:
+        fingerprint = json.dumps({
+            "prompt": LLMCacheService.normalize_prompt(prompt),
+            "columns": [str(c) for c in columns],
+            "dtypes": [str(d) for d in (dtypes or [])],
+            "model": model,
+        }, ensure_ascii=False)
+        return hashlib.sha256(fingerprint.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def get(cache_key: str) -> Optional[dict]:
+        try:
+            with db_session() as session:
+                entry = session.query(LLMCacheEntry).filter_by(cache_key=cache_key).first()
+                if not entry:
+                    return None
+                if entry.created_at <= datetime.utcnow() - timedelta(hours=LLM_CACHE_TTL_HOURS):
+                    session.delete(entry)
+                    session.commit()
+                    return None
+                entry.hit_count += 1
+                entry.last_hit_at = datetime.utcnow()
+                session.commit()
+                code = entry.code
+                if entry.intent == 'FORMULA_WRITE':
+                    code = json.loads(code)
+                return {"code": code, "explanation": entry.explanation, "intent": entry.intent}
+        except Exception as e:
+            print(f"[LLM CACHE] Lookup failed: {e}")
+            return None
+
+    @staticmethod
+    def put(cache_key: str, model: str, prompt: str, result: dict) -> None:
+        try:
+            with db_session() as session:
+                code = result['code']
+                entry = LLMCacheEntry(
+                    cache_key=cache_key,
+                    model=model,
+                    prompt=prompt,
+                    code=code if isinstance(code, str) else json.dumps(code),
+                    explanation=result.get('explanation'),
+                    intent=result.get('intent', 'DATA_MUTATION'),
+                )
+                session.add(entry)
+                session.commit()
+
+                # Size cap: drop the least recently used entries beyond LLM_CACHE_MAX_ENTRIES
+                overflow = session.query(LLMCacheEntry).count() - LLM_CACHE_MAX_ENTRIES
+                if overflow > 0:
+                    stale = session.query(LLMCacheEntry.id).order_by(
+                        func.coalesce(LLMCacheEntry.last_hit_at, LLMCacheEntry.created_at)
+                    ).limit(overflow).all()
+                    session.query(LLMCacheEntry).filter(
+                        LLMCacheEntry.id.in_([row.id for row in stale])
+                    ).delete(synchronize_session=False)
+                    session.commit()
+        except Exception as e:
+            # Includes the unique-key race when two workers store the same answer
+            print(f"[LLM CACHE] Store failed: {e}")
+
+    @staticmethod
+    def discard(cache_key: str) -> None:
+        """Forget a cached answer, e.g. after its code failed to execute."""
+        try:
+            with db_session() as session:
+                session.query(LLMCacheEntry).filter_by(cache_key=cache_key).delete()
+                session.commit()
+        except Exception as e:
+            print(f"[LLM CACHE] Discard failed: {e}")
+
+    @staticmethod
+    def purge_expired() -> int:
+        try:
+            with db_session() as session:
+                cutoff = datetime.utcnow() - timedelta(hours=LLM_CACHE_TTL_HOURS)
+                removed = session.query(LLMCacheEntry).filter(LLMCacheEntry.created_at <= cutoff).delete()
+                session.commit()
+                return removed
+        except Exception as e:
+            print(f"[LLM CACHE] Purge failed: {e}")
+            return 0
+
+    @staticmethod
+    def stats() -> dict:
+        try:
+            with db_session() as session:
+                entries, hits = session.query(func.count(LLMCacheEntry.id), func.coalesce(func.sum(LLMCacheEntry.hit_count), 0)).one()
+                return {"entries": entries, "hits": int(hits), "max_entries": LLM_CACHE_MAX_ENTRIES, "ttl_hours": LLM_CACHE_TTL_HOURS}
+        except Exception as e:
+            print(f"[LLM CACHE] Stats failed: {e}")
+            return {}
@@ -0,0 +1,250 @@
+import os
+import time
+import random
+import threading
+from collections import OrderedDict, deque
+
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '8'))  # Model calls in flight per process
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv('LLM_QUEUE_TIMEOUT_SECONDS', '120'))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '3'))
+LLM_RETRY_BASE_SECONDS = float(os.getenv('LLM_RETRY_BASE_SECONDS', '0.5'))
+LLM_RETRY_MAX_SECONDS = float(os.getenv('LLM_RETRY_MAX_SECONDS', '8'))
+LLM_BREAKER_THRESHOLD = int(os.getenv('LLM_BREAKER_THRESHOLD', '5'))  # Consecutive provider failures
+LLM_BREAKER_COOLDOWN_SECONDS = float(os.getenv('LLM_BREAKER_COOLDOWN_SECONDS', '30'))
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class LLMUnavailable(Exception):
+    """The provider is failing (circuit open) or the queue for a model call did not move in time."""
+
+
+class Ticket:
+    """One caller's place in the governor: queued until granted, then holding a slot until left."""
+
+    def __init__(self, user):
+        self.user = user
+        self.enqueued_at = time.monotonic()
+        self.granted = threading.Event()
+        self.probe = False
+        self.released = False
+
+
+class LLMGovernor:
+    """
+    Process-wide limiter for outbound model calls.
+
+    At most max_concurrency calls run at once. Callers beyond that wait in one queue per
+    user, served round-robin, so a user firing many prompts delays their own requests
+    rather than everyone else's. Provider failures (5xx, timeouts) feed a circuit breaker:
+    after `threshold` in a row new calls fail fast with LLMUnavailable for `cooldown`
+    seconds, then a single probe call decides whether it closes again. Rate limits (429)
+    are retried with backoff but do not open the circuit.
+    """
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY, threshold: int = LLM_BREAKER_THRESHOLD,
+                 cooldown: float = LLM_BREAKER_COOLDOWN_SECONDS):
+        self.max_concurrency = max(max_concurrency, 1)
+        self.threshold = max(threshold, 1)
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._queues = OrderedDict()  # user -> deque of waiting tickets, in serving order
+        self._in_flight = 0
+        self._failures = 0  # Consecutive provider failures
+        self._opened_at = None
+        self._probing = False
+        self._stats = {
+            "granted": 0,
+            "cancelled": 0,
+            "rejected": 0,
+            "retries": 0,
+            "failures": 0,
+            "breaker_opened": 0,
+            "max_queue_depth": 0,
+            "total_wait_ms": 0.0,
+            "max_wait_ms": 0.0,
+        }
+
+    # --- Queue -------------------------------------------------------------
+
+    def enqueue(self, user=None) -> Ticket:
+        """Take a slot or a place in the queue; raises LLMUnavailable while the circuit is open."""
+        ticket = Ticket(str(user) if user is not None else None)
+        with self._lock:
+            self._admit(ticket)
+            self._queues.setdefault(ticket.user, deque()).append(ticket)
+            self._grant_next()
+            depth = self._depth()
+            if depth > self._stats["max_queue_depth"]:
+                self._stats["max_queue_depth"] = depth
+        return ticket
+
+    def position(self, ticket: Ticket) -> int:
+        """1-based place in the serving order; 0 once granted."""
+        with self._lock:
+            if ticket.granted.is_set():
+                return 0
+            users = list(self._queues)
+            waiting = self._queues.get(ticket.user)
+            if not waiting or ticket not in waiting:
+                return 0
+            mine, rank = users.index(ticket.user), waiting.index(ticket)
+            # Round-robin: each user ahead in the rotation gets one more turn than rank
+            ahead = rank + sum(min(len(self._queues[user]), rank + (1 if index < mine else 0))
+                               for index, user in enumerate(users) if index != mine)
+            return ahead + 1
+
+    def wait(self, ticket: Ticket, timeout: float = None) -> bool:
+        return ticket.granted.wait(timeout)
+
+    def acquire(self, user=None, timeout: float = LLM_QUEUE_TIMEOUT_SECONDS) -> Ticket:
+        """Blocking enqueue + wait; raises LLMUnavailable if no slot frees up within timeout."""
+        ticket = self.enqueue(user)
+        if not self.wait(ticket, timeout):
+            self.leave(ticket)
+            raise LLMUnavailable(f"Sin turno para el modelo tras {timeout:g} s en cola")
+        return ticket
+
+    def leave(self, ticket: Ticket) -> None:
+        """Free the slot of a granted ticket, or drop a waiting one from its queue."""
+        with self._lock:
+            if ticket.probe:
+                self._probing = False
+                ticket.probe = False
+            if ticket.granted.is_set():
+                if ticket.released:
+                    return
+                ticket.released = True
+                self._in_flight -= 1
+                self._grant_next()
+                return
+            waiting = self._queues.get(ticket.user)
+            if waiting and ticket in waiting:
+                waiting.remove(ticket)
+                if not waiting:
+                    del self._queues[ticket.user]
+                self._stats["cancelled"] += 1
+
+    def _depth(self) -> int:
+        return sum(len(waiting) for waiting in self._queues.values())
+
+    def _grant_next(self) -> None:
+        while self._in_flight < self.max_concurrency and self._queues:
+            user, waiting = next(iter(self._queues.items()))
+            ticket = waiting.popleft()
+            if waiting:
+                self._queues.move_to_end(user)  # Next turn goes to the next user
+            else:
+                del self._queues[user]
+            self._in_flight += 1
+            waited_ms = (time.monotonic() - ticket.enqueued_at) * 1000
+            self._stats["granted"] += 1
+            self._stats["total_wait_ms"] += waited_ms
+            self._stats["max_wait_ms"] = max(self._stats["max_wait_ms"], waited_ms)
+            ticket.granted.set()
+
+    # --- Circuit breaker ---------------------------------------------------
+
+    def _admit(self, ticket: Ticket) -> None:
+        if self._opened_at is None:
+            return
+        if time.monotonic() - self._opened_at < self.cooldown or self._probing:
+            self._stats["rejected"] += 1
+            raise LLMUnavailable("El proveedor del modelo está fallando; se reintentará en breve")
+        self._probing = True  # Half-open: this call decides
+        ticket.probe = True
+
+    def check(self) -> None:
+        """Raise LLMUnavailable if the circuit opened meanwhile (checked before each retry)."""
+        with self._lock:
+            if self._opened_at is not None and time.monotonic() - self._opened_at < self.cooldown:
+                self._stats["rejected"] += 1
+                raise LLMUnavailable("El proveedor del modelo está fallando; se reintentará en breve")
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self, exc: Exception) -> None:
+        """Count a failed attempt; only provider-side failures move the breaker."""
+        if not self.is_outage(exc):
+            return
+        with self._lock:
+            self._stats["failures"] += 1
+            self._failures += 1
+            if self._failures >= self.threshold or self._opened_at is not None:
+                if self._opened_at is None or time.monotonic() - self._opened_at >= self.cooldown:
+                    self._stats["breaker_opened"] += 1
+                self._opened_at = time.monotonic()
+
+    # --- Retries -----------------------------------------------------------
+
+    @staticmethod
+    def status(exc: Exception):
+        return getattr(exc, 'status_code', None)
+
+    @staticmethod
+    def is_retryable(exc: Exception) -> bool:
+        return LLMGovernor.status(exc) in RETRYABLE_STATUS
+
+    @staticmethod
+    def is_outage(exc: Exception) -> bool:
+        return LLMGovernor.status(exc) in RETRYABLE_STATUS - {429}
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff for the given retry (1-based)."""
+        with self._lock:
+            self._stats["retries"] += 1
+        return random.uniform(0, min(LLM_RETRY_MAX_SECONDS, LLM_RETRY_BASE_SECONDS * 2 ** (attempt - 1)))
+
+    def call(self, fn, user=None):
+        """Run fn() under a slot, retrying retryable failures; for non-streaming callers."""
+        ticket = self.acquire(user)
+        try:
+            attempt = 0
+            while True:
+                try:
+                    result = fn()
+                except Exception as e:
+                    self.record_failure(e)
+                    if not self.is_retryable(e) or attempt >= LLM_MAX_RETRIES:
+                        raise
+                    attempt += 1
+                    delay = self.backoff(attempt)
+                    print(f"[LLM GOVERNOR] {type(e).__name__}, retry {attempt}/{LLM_MAX_RETRIES} in {delay:.2f}s")
+                    time.sleep(delay)
+                    self.check()
+                    continue
+                self.record_success()
+                return result
+        finally:
+            self.leave(ticket)
+
+    # --- Metrics -----------------------------------------------------------
+
+    def breaker_state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at < self.cooldown:
+            return "open"
+        return "half_open"
+
+    def stats(self) -> dict:
+        with self._lock:
+            granted = self._stats["granted"]
+            return {
+                **{key: value for key, value in self._stats.items() if key != "total_wait_ms"},
+                "max_wait_ms": round(self._stats["max_wait_ms"], 2),
+                "avg_wait_ms": round(self._stats["total_wait_ms"] / granted, 2) if granted else None,
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self._in_flight,
+                "queue_depth": self._depth(),
+                "queued_users": len(self._queues),
+                "breaker": self.breaker_state(),
+                "consecutive_failures": self._failures,
+            }
+
+
+# Process-wide singleton shared by request handlers
+llm_governor = LLMGovernor()
@@ -1,22 +1,114 @@
 import os
+import re
 import json
+import time
+import queue
+import asyncio
+import threading
 import litellm
-from typing import List
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterator, List, Tuple
+from app.services.llm_cache_service import LLMCacheService
+from app.services.llm_governor import llm_governor, LLMUnavailable, LLM_MAX_RETRIES, LLM_QUEUE_TIMEOUT_SECONDS
+
+LLM_TIMEOUT_SECONDS = float(os.getenv('LLM_TIMEOUT_SECONDS', '60'))  # Hard limit per model call
+LLM_HEARTBEAT_SECONDS = float(os.getenv('LLM_HEARTBEAT_SECONDS', '2'))  # Silence before a ("waiting", None) event
+LLM_ASYNC_ENABLED = os.getenv('LLM_ASYNC_ENABLED', '1') == '1'  # 0: stream from an I/O thread pool instead
+LLM_IO_WORKERS = int(os.getenv('LLM_IO_WORKERS', '16'))
+
+_EXPLANATION_START = re.compile(r'"explanation"\s*:\s*"')
+
+
+class LLMTimeout(Exception):
+    """The model did not answer within LLM_TIMEOUT_SECONDS."""
+    status_code = 408  # Counts as a provider failure for the circuit breaker
+
+
+class _LLMEventLoop:
+    """
+    One daemon thread running an asyncio loop for every outbound model call: a call that
+    is waiting on the provider holds no thread, and cancelling its task aborts the HTTP
+    request (no more tokens are generated or billed). Started on first use, so each
+    forked worker gets its own.
+    """
+
+    def __init__(self):
+        self._loop = None
+        self._lock = threading.Lock()
+
+    def submit(self, coroutine) -> Future:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='llm-loop', daemon=True).start()
+                self._loop = loop
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+
+_event_loop = _LLMEventLoop()
+_io_pool = ThreadPoolExecutor(max_workers=LLM_IO_WORKERS, thread_name_prefix='llm-io')
+
+
+def _delta(chunk) -> str:
+    return chunk.choices[0].delta.content if chunk.choices else None
+
+
+class _ExplanationStream:
+    """
+    Incrementally extracts the "explanation" string value from a JSON document that is
+    still being generated, decoding escapes as soon as they are complete.
+    """
+
+    def __init__(self):
+        self.raw = ''
+        self.position = None  # Index of the next unread explanation character
+        self.finished = False
+
+    def feed(self, chunk: str) -> str:
+        self.raw += chunk
+        if self.finished:
+            return ''
+        if self.position is None:
+            match = _EXPLANATION_START.search(self.raw)
+            if not match:
+                return ''
+            self.position = match.end()
+
+        text = []
+        i = self.position
+        while i < len(self.raw):
+            char = self.raw[i]
+            if char == '"':
+                self.finished = True
+                i += 1
+                break
+            if char == '\\':
+                width = 6 if self.raw[i + 1:i + 2] == 'u' else 2
+                if i + width > len(self.raw):
+                    break  # Escape split across chunks: wait for the rest
+                text.append(json.loads(f'"{self.raw[i:i + width]}"'))
+                i += width
+                continue
+            text.append(char)
+            i += 1
+        self.position = i
+        return ''.join(text)
 
 
 class LLMService:
     @staticmethod
-    def generate_transformation_code(prompt: str, columns: List[str], sample_data: dict = None) -> dict:
-        model = os.getenv('LLM_MODEL', 'gemini/gemini-2.5-flash')
+    def _system_content(columns: List[str], sample_data: dict = None, schema: str = None) -> str:
+        if schema:
+            # Column profile from ColumnProfiler.context, already fitted to the token budget
+            data_info = f"{schema}\n"
+        else:
+            data_info = f"The DataFrame 'df' has the following columns: {columns}\n"
+            if sample_data:
+                data_info += f"\nSample data (first row): {sample_data}\n"
 
-        sample_info = ""
-        if sample_data:
-            sample_info = f"\nSample data (first row): {sample_data}\n"
+        return f"""Act as the DataMind Intent Classifier. Your task is to analyze the user request and generate a valid JSON response to either modify a pandas DataFrame named 'df', generate a Plotly chart, or write Excel cell formulas.
 
-        system_content = f"""Act as the DataMind Intent Classifier. Your task is to analyze the user request and generate a valid JSON response to either modify a pandas DataFrame named 'df', generate a Plotly chart, or write Excel cell formulas.
-
-The DataFrame 'df' has the following columns: {columns}
-{sample_info}
+{data_info}
 Classification rules (apply before choosing intent):
 - Use "DATA_MUTATION" for: setting/changing cell values, filtering rows, renaming columns, sorting, math on data, any change to data content. Setting a cell to a plain number (e.g. 999) is DATA_MUTATION.
 - Use "FORMULA_WRITE" ONLY when the user explicitly asks to INSERT an Excel formula function that starts with = (e.g. =SUM, =AVERAGE, =IF). A plain value like 999 is NOT a formula.
@@ -25,15 +117,16 @@ Classification rules (apply before choosing intent):
 Rules:
 1. Classify the action as one of: 'DATA_MUTATION', 'VISUAL_UPDATE', or 'FORMULA_WRITE'.
 2. Output strictly valid JSON format.
-3. The JSON must have the following keys:
+3. The JSON must have the following keys, in this order:
     - "intent": one of "DATA_MUTATION", "VISUAL_UPDATE", or "FORMULA_WRITE".
-    - "code": the operation payload (see intent-specific rules below).
     - "explanation": a brief summary of what the operation does.
+    - "code": the operation payload (see intent-specific rules below).
 
 Specifics for "intent": "DATA_MUTATION":
 - Output Python code to modify the DataFrame 'df'.
 - Assume 'df' is loaded. pd is pandas. No imports.
 - Modify 'df' in place or reassign it.
+- Assign through df.loc / df.at / df.iloc rather than chained indexing such as df['a'][0] = x.
 - No markdown.
 
 Specifics for "intent": "VISUAL_UPDATE":
@@ -49,41 +142,244 @@ Specifics for "intent": "FORMULA_WRITE":
 - Example: [{{"cell": "B2", "formula": "=SUM(A1:A10)"}}, {{"cell": "C2", "formula": "=AVERAGE(A1:A10)"}}]
 """
 
+    @staticmethod
+    def _parse_payload(raw_text: str) -> dict:
+        raw_text = raw_text.strip()
+
+        # Fallback: strip markdown code blocks if present
+        if raw_text.startswith("```json"):
+            raw_text = raw_text.replace("```json", "").replace("```", "").strip()
+        elif raw_text.startswith("```"):
+            raw_text = raw_text.replace("```", "").strip()
+
+        result = json.loads(raw_text)
+
+        code = result.get('code', '')
+        if isinstance(code, str):
+            code = code.strip()
+            if code.startswith("```python"):
+                code = code.replace("```python", "").replace("```", "").strip()
+
+        explanation = result.get('explanation', '').strip()
+        intent = result.get('intent', 'DATA_MUTATION').strip().upper()
+
+        return {
+            "code": code,
+            "explanation": explanation,
+            "intent": intent,
+        }
+
+    @staticmethod
+    def _store(cache_key: str, model: str, prompt: str, result: dict, use_cache: bool) -> dict:
+        if not use_cache:
+            LLMCacheService.discard(cache_key)
+        LLMCacheService.put(cache_key, model, prompt, result)
+        return {**result, "cached": False, "cache_key": cache_key}
+
+    @staticmethod
+    def generate_transformation_code(prompt: str, columns: List[str], sample_data: dict = None,
+                                     dtypes: List[str] = None, use_cache: bool = True, stream: bool = False,
+                                     user_id=None, schema: str = None):
+        """
+        Returns {code, explanation, intent, cached, cache_key}. Results are cached by
+        normalized prompt + columns + dtypes + model; use_cache=False bypasses the lookup
+        (the fresh answer still replaces the cached one). schema, when given, replaces the
+        column list and sample row in the prompt (see ColumnProfiler.context).
+
+        With stream=True returns a generator of ("token", text) events carrying the
+        explanation as it is generated, followed by a single ("result", dict) event. The
+        call runs in the background; while it is silent for LLM_HEARTBEAT_SECONDS the
+        generator yields ("waiting", None) so the caller can probe its client, and
+        closing the generator cancels the call. Either way it raises LLMTimeout after
+        LLM_TIMEOUT_SECONDS.
+
+        Model calls go through llm_governor, queued fairly per user_id: a streamed call
+        waiting for a slot yields ("queued", position) whenever its place changes, and
+        either kind raises LLMUnavailable while the provider's circuit is open.
+        """
+        if stream:
+            return LLMService._stream_transformation_code(prompt, columns, sample_data, dtypes, use_cache, user_id, schema)
+
+        model = os.getenv('LLM_MODEL', 'gemini/gemini-2.5-flash')
+
+        cache_key = LLMCacheService.make_key(prompt, columns, dtypes, model)
+        if use_cache:
+            cached = LLMCacheService.get(cache_key)
+            if cached:
+                return {**cached, "cached": True, "cache_key": cache_key}
+
         try:
-            response = litellm.completion(
+            response = llm_governor.call(lambda: litellm.completion(
                 model=model,
                 messages=[
-                    {"role": "system", "content": system_content},
+                    {"role": "system", "content": LLMService._system_content(columns, sample_data, schema)},
                     {"role": "user", "content": prompt},
                 ],
                 response_format={"type": "json_object"},
-            )
+                timeout=LLM_TIMEOUT_SECONDS,
+            ), user_id)
+
+            result = LLMService._parse_payload(response.choices[0].message.content)
+            return LLMService._store(cache_key, model, prompt, result, use_cache)
+
+        except LLMUnavailable:
+            raise
+        except Exception as e:
+            print(f"LLM Error: {e}")
+            raise Exception(f"No se pudo generar el codigo. Error: {type(e).__name__}")
+
+    @staticmethod
+    def _request(model: str, prompt: str, columns: List[str], sample_data: dict, schema: str = None) -> dict:
+        return dict(
+            model=model,
+            messages=[
+                {"role": "system", "content": LLMService._system_content(columns, sample_data, schema)},
+                {"role": "user", "content": prompt},
+            ],
+            response_format={"type": "json_object"},
+            stream=True,
+            timeout=LLM_TIMEOUT_SECONDS,
+        )
+
+    @staticmethod
+    async def _produce_async(request: dict, events: queue.Queue) -> None:
+        """Feed ("delta", text) then ("end", None) or ("failed", exc) into events; cancellable."""
+        try:
+            response = await litellm.acompletion(**request)
+            async for chunk in response:
+                events.put(("delta", _delta(chunk)))
+            events.put(("end", None))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            events.put(("failed", e))
 
-            raw_text = response.choices[0].message.content.strip()
+    @staticmethod
+    def _produce_sync(request: dict, events: queue.Queue, cancelled: threading.Event) -> None:
+        """Thread-pool variant of _produce_async; stops at the next chunk once cancelled."""
+        try:
+            for chunk in litellm.completion(**request):
+                if cancelled.is_set():
+                    return
+                events.put(("delta", _delta(chunk)))
+            events.put(("end", None))
+        except Exception as e:
+            events.put(("failed", e))
 
-            # Fallback: strip markdown code blocks if present
-            if raw_text.startswith("```json"):
-                raw_text = raw_text.replace("```json", "").replace("```", "").strip()
-            elif raw_text.startswith("```"):
-                raw_text = raw_text.replace("```", "").strip()
+    @staticmethod
+    def _queue(ticket) -> Iterator[Tuple[str, object]]:
+        """Wait for the governor to grant ticket, yielding ("queued", position) as it moves."""
+        deadline = time.monotonic() + LLM_QUEUE_TIMEOUT_SECONDS
+        reported = None
+        while True:
+            position = llm_governor.position(ticket)
+            if position != reported and position:
+                reported = position
+                yield "queued", position
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise LLMUnavailable(f"Sin turno para el modelo tras {LLM_QUEUE_TIMEOUT_SECONDS:g} s en cola")
+            if llm_governor.wait(ticket, min(LLM_HEARTBEAT_SECONDS, remaining)):
+                return
+            if llm_governor.position(ticket) == reported:
+                yield "waiting", None
 
-            result = json.loads(raw_text)
+    @staticmethod
+    def _pause(seconds: float) -> Iterator[Tuple[str, object]]:
+        """Sleep between retries, still yielding heartbeats so a disconnect is noticed."""
+        until = time.monotonic() + seconds
+        while time.monotonic() < until:
+            time.sleep(max(min(LLM_HEARTBEAT_SECONDS, until - time.monotonic()), 0))
+            if time.monotonic() < until:
+                yield "waiting", None
 
-            code = result.get('code', '')
-            if isinstance(code, str):
-                code = code.strip()
-                if code.startswith("```python"):
-                    code = code.replace("```python", "").replace("```", "").strip()
+    @staticmethod
+    def _attempt(request: dict, deadline: float, explanation: _ExplanationStream) -> Iterator[Tuple[str, object]]:
+        """One model call: yields token/waiting events and returns the parsed payload."""
+        events = queue.Queue()
+        if LLM_ASYNC_ENABLED:
+            cancel = _event_loop.submit(LLMService._produce_async(request, events)).cancel
+        else:
+            cancelled = threading.Event()
+            _io_pool.submit(LLMService._produce_sync, request, events, cancelled)
+            cancel = cancelled.set
 
-            explanation = result.get('explanation', '').strip()
-            intent = result.get('intent', 'DATA_MUTATION').strip().upper()
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise LLMTimeout(f"Sin respuesta del modelo tras {LLM_TIMEOUT_SECONDS:g} s")
+                try:
+                    kind, delta = events.get(timeout=min(LLM_HEARTBEAT_SECONDS, remaining))
+                except queue.Empty:
+                    yield "waiting", None
+                    continue
+                if kind == "failed":
+                    raise delta
+                if kind == "end":
+                    return LLMService._parse_payload(explanation.raw)
+                if not delta:
+                    continue
+                text = explanation.feed(delta)
+                if text:
+                    yield "token", text
+                # Hand over as soon as the payload is complete instead of waiting for the stream to close
+                if delta.rstrip().endswith(('}', '```')):
+                    try:
+                        return LLMService._parse_payload(explanation.raw)
+                    except ValueError:
+                        pass
+        finally:
+            # Early finish, timeout, error or the client went away (GeneratorExit): stop the call
+            cancel()
+
+    @staticmethod
+    def _stream_transformation_code(prompt: str, columns: List[str], sample_data: dict = None,
+                                    dtypes: List[str] = None, use_cache: bool = True,
+                                    user_id=None, schema: str = None) -> Iterator[Tuple[str, object]]:
+        model = os.getenv('LLM_MODEL', 'gemini/gemini-2.5-flash')
 
-            return {
-                "code": code,
-                "explanation": explanation,
-                "intent": intent,
-            }
+        cache_key = LLMCacheService.make_key(prompt, columns, dtypes, model)
+        if use_cache:
+            cached = LLMCacheService.get(cache_key)
+            if cached:
+                if cached.get('explanation'):
+                    yield "token", cached['explanation']
+                yield "result", {**cached, "cached": True, "cache_key": cache_key}
+                return
 
+        request = LLMService._request(model, prompt, columns, sample_data, schema)
+        ticket = llm_governor.enqueue(user_id)
+        try:
+            yield from LLMService._queue(ticket)
+
+            deadline = time.monotonic() + LLM_TIMEOUT_SECONDS
+            attempt = 0
+            while True:
+                explanation = _ExplanationStream()
+                try:
+                    result = yield from LLMService._attempt(request, deadline, explanation)
+                except Exception as e:
+                    llm_governor.record_failure(e)
+                    # Only a call that failed before streaming anything can be retried unnoticed
+                    if isinstance(e, LLMTimeout) or not llm_governor.is_retryable(e) \
+                            or explanation.raw or attempt >= LLM_MAX_RETRIES:
+                        raise
+                    attempt += 1
+                    delay = min(llm_governor.backoff(attempt), max(deadline - time.monotonic(), 0))
+                    print(f"[LLM GOVERNOR] {type(e).__name__}, retry {attempt}/{LLM_MAX_RETRIES} in {delay:.2f}s")
+                    yield from LLMService._pause(delay)
+                    llm_governor.check()
+                    continue
+                llm_governor.record_success()
+                break
+        except (LLMTimeout, LLMUnavailable) as e:
+            print(f"LLM {type(e).__name__}: {model}: {e}")
+            raise
         except Exception as e:
             print(f"LLM Error: {e}")
             raise Exception(f"No se pudo generar el codigo. Error: {type(e).__name__}")
+        finally:
+            llm_governor.leave(ticket)
+
+        yield "result", LLMService._store(cache_key, model, prompt, result, use_cache)
@@ -0,0 +1,276 @@
+import os
+import time
+import uuid
+import queue
+import resource
+import atexit
+import marshal
+import tempfile
+import threading
+import multiprocessing
+from types import CodeType
+import pandas as pd
+import pyarrow as pa
+
+SANDBOX_ENABLED = os.getenv('SANDBOX_ENABLED', '1') == '1'
+SANDBOX_WORKERS = int(os.getenv('SANDBOX_WORKERS', str(os.cpu_count() or 2)))
+SANDBOX_TIMEOUT_SECONDS = float(os.getenv('SANDBOX_TIMEOUT_SECONDS', '30'))
+SANDBOX_MEMORY_MB = int(os.getenv('SANDBOX_MEMORY_MB', '2048'))  # Per-worker memory ceiling, 0 disables
+SANDBOX_QUEUE_SECONDS = float(os.getenv('SANDBOX_QUEUE_SECONDS', '30'))  # Wait for an idle worker
+SANDBOX_TRANSFER_DIR = os.getenv(
+    'SANDBOX_TRANSFER_DIR', '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+)
+
+# Imported once by the fork server so every worker starts warm
+_PRELOAD = ['numpy', 'pandas', 'pyarrow', 'plotly.express', 'plotly.graph_objects', 'app.services.code_execution_service']
+_POLL_SECONDS = 0.05
+
+
+class SandboxError(Exception):
+    """A task was killed (timeout, memory ceiling) or its worker died."""
+
+
+_ARROW_ERRORS = (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError, TypeError, ValueError)
+
+
+def _as_text(column: pd.Series) -> pd.Series:
+    return column.astype(str).where(column.notna(), None)
+
+
+def _write_frame(df: pd.DataFrame, path: str) -> None:
+    """
+    Arrow IPC file, memory-mapped by the reader. Object columns Arrow cannot type (mixed
+    int/str cells from a spreadsheet) travel as text; nothing is ever pickled, so the
+    parent never unpickles bytes a worker wrote.
+    """
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=True)
+    except _ARROW_ERRORS:
+        df = df.copy(deep=False)
+        for position, dtype in enumerate(df.dtypes):
+            if dtype == object:
+                try:
+                    pa.array(df.iloc[:, position], from_pandas=True)
+                except _ARROW_ERRORS:
+                    df.isetitem(position, _as_text(df.iloc[:, position]))
+        if df.index.dtype == object:
+            df.index = pd.Index(_as_text(df.index.to_series()), name=df.index.name)
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=True)
+        except _ARROW_ERRORS as e:
+            raise SandboxError(f"Code execution error: the data cannot be sent to the sandbox ({e})")
+    with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+
+
+def _read_frame(path: str) -> pd.DataFrame:
+    with pa.memory_map(path, 'r') as source:
+        return pa.ipc.open_file(source).read_all().to_pandas()
+
+
+def _proc_status_mb(pid, field: str) -> float:
+    try:
+        with open(f'/proc/{pid}/status') as status:
+            for line in status:
+                if line.startswith(f'{field}:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0  # No procfs (non-Linux)
+
+
+def _limit_address_space(memory_mb: int) -> None:
+    """
+    Hard ceiling: an allocation past it fails with MemoryError inside the worker, however
+    large the single request. The warm imports already map a few hundred MB, so the limit
+    is memory_mb on top of what the worker has mapped at start.
+    """
+    if not memory_mb:
+        return
+    baseline_mb = _proc_status_mb('self', 'VmSize')
+    limit = int((baseline_mb + memory_mb) * 1024 * 1024)
+    try:
+        resource.setrlimit(resource.RLIMIT_AS, (limit, resource.getrlimit(resource.RLIMIT_AS)[1]))
+    except (ValueError, OSError):
+        pass  # Hard limit already lower: keep it
+
+
+def _worker_main(conn, memory_mb: int = 0) -> None:
+    """Worker loop: one task at a time, replies ('ok' | 'value_error' | 'memory_error' | 'error', payload)."""
+    from app.services.code_execution_service import CodeExecutionService
+
+    _limit_address_space(memory_mb)
+
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, OSError):
+            return
+        try:
+            df = _read_frame(task['input'])
+            if task['kind'] == 'transform':
+                # The frame was just read from the transfer file: nobody else holds it
+                result = CodeExecutionService.run_transformation(df, marshal.loads(task['code']), owned=True)
+                _write_frame(result, task['output'])
+                reply = ('ok', None)
+            else:
+                reply = ('ok', CodeExecutionService.run_chart_generation(df, task['code']))
+        except ValueError as e:
+            reply = ('value_error', str(e))
+        except Exception as e:
+            # run_transformation wraps errors, so look at the one it was raised from too
+            out_of_memory = isinstance(e, MemoryError) or isinstance(e.__context__, MemoryError)
+            reply = ('memory_error' if out_of_memory else 'error', str(e))
+        conn.send(reply)
+
+
+class _Worker:
+    def __init__(self, context, memory_mb: int):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, memory_mb), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def rss_mb(self) -> float:
+        return _proc_status_mb(self.process.pid, 'VmRSS')
+
+    def kill(self) -> None:
+        self.process.kill()
+        self.process.join(timeout=1)
+        self.conn.close()
+
+
+class SandboxPool:
+    """
+    Pre-started worker processes that execute generated code off the Flask worker.
+
+    Workers are forked from a fork server that has pandas/numpy/plotly imported. Frames
+    travel as Arrow IPC files in SANDBOX_TRANSFER_DIR (tmpfs on Linux) and are memory-mapped
+    on read; only code bytes and file names go through the pipe. Each worker runs under an
+    RLIMIT_AS of memory_mb above its warm baseline, and RSS is polled as a backstop; a task
+    that exceeds the wall-clock timeout or the memory ceiling gets its worker replaced.
+    """
+
+    def __init__(self, workers: int, timeout: float, memory_mb: int, enabled: bool = True,
+                 queue_timeout: float = SANDBOX_QUEUE_SECONDS):
+        self.enabled = enabled
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.memory_mb = memory_mb
+        self.queue_timeout = queue_timeout
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._context = None
+        self._stats = {"tasks": 0, "timeouts": 0, "memory_kills": 0, "crashes": 0, "queue_timeouts": 0}
+
+    def _ensure_started(self) -> None:
+        if self._context is not None:
+            return
+        with self._lock:
+            if self._context is not None:
+                return
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+            if 'forkserver' in methods:
+                context.set_forkserver_preload(_PRELOAD)
+            for _ in range(self.workers):
+                self._idle.put(_Worker(context, self.memory_mb))
+            self._context = context
+            atexit.register(self.shutdown)
+
+    def _run(self, task: dict, timeout: float = None):
+        self._ensure_started()
+        timeout = timeout or self.timeout
+        try:
+            worker = self._idle.get(timeout=self.queue_timeout)
+        except queue.Empty:
+            self._count('queue_timeouts')
+            raise SandboxError(f"Code execution error: no sandbox worker became free within {self.queue_timeout:g}s")
+        healthy = False
+        try:
+            worker.conn.send(task)
+            deadline = time.monotonic() + timeout
+            while not worker.conn.poll(_POLL_SECONDS):
+                if not worker.process.is_alive():
+                    self._count('crashes')
+                    raise SandboxError("Code execution error: the sandbox worker exited unexpectedly")
+                if time.monotonic() > deadline:
+                    self._count('timeouts')
+                    raise SandboxError(f"Code execution error: timed out after {timeout:g}s")
+                if self.memory_mb and worker.rss_mb() > self.memory_mb:  # Backstop for RLIMIT_AS
+                    self._count('memory_kills')
+                    raise SandboxError(f"Code execution error: exceeded the {self.memory_mb} MB memory limit")
+            status, payload = worker.conn.recv()
+            if status == 'memory_error':
+                self._count('memory_kills')
+                raise SandboxError(f"Code execution error: exceeded the {self.memory_mb} MB memory limit")
+            healthy = True
+        except (EOFError, OSError):
+            self._count('crashes')
+            raise SandboxError("Code execution error: the sandbox worker exited unexpectedly")
+        finally:
+            self._count('tasks')
+            if healthy:
+                self._idle.put(worker)
+            else:
+                worker.kill()
+                self._idle.put(_Worker(self._context, self.memory_mb))
+
+        if status == 'value_error':
+            raise ValueError(payload)
+        if status == 'error':
+            raise Exception(payload)
+        return payload
+
+    def _transfer_path(self, suffix: str) -> str:
+        return os.path.join(SANDBOX_TRANSFER_DIR, f"datamind-{uuid.uuid4().hex}.{suffix}")
+
+    def run_transformation(self, df: pd.DataFrame, compiled: CodeType, timeout: float = None) -> pd.DataFrame:
+        input_path = self._transfer_path('in')
+        output_path = self._transfer_path('out')
+        try:
+            _write_frame(df, input_path)
+            task = {"kind": "transform", "code": marshal.dumps(compiled), "input": input_path, "output": output_path}
+            self._run(task, timeout)
+            return _read_frame(output_path)
+        finally:
+            for path in (input_path, output_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def run_chart_generation(self, df: pd.DataFrame, code: str, timeout: float = None) -> str:
+        input_path = self._transfer_path('in')
+        try:
+            _write_frame(df, input_path)
+            return self._run({"kind": "chart", "code": code, "input": input_path}, timeout)
+        finally:
+            if os.path.exists(input_path):
+                os.remove(input_path)
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._stats,
+                "enabled": self.enabled,
+                "workers": self.workers,
+                "idle": self._idle.qsize() if self._context is not None else None,
+                "timeout_seconds": self.timeout,
+                "memory_mb": self.memory_mb,
+                "queue_timeout_seconds": self.queue_timeout,
+            }
+
+    def shutdown(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().kill()
+            except queue.Empty:
+                break
+        self._context = None
+
+
+# Process-wide singleton shared by request handlers and replay
+sandbox_pool = SandboxPool(SANDBOX_WORKERS, SANDBOX_TIMEOUT_SECONDS, SANDBOX_MEMORY_MB, enabled=SANDBOX_ENABLED)
@@ -0,0 +1,75 @@
+import os
+import shutil
+import pandas as pd
+from typing import List, Optional, Tuple
+from app.services.excel_service import ExcelService, COLUMNAR_EXTENSION
+
+SNAPSHOT_FOLDER = os.getenv('SNAPSHOT_FOLDER', os.path.join(os.getcwd(), 'snapshots'))
+SNAPSHOT_INTERVAL = int(os.getenv('SNAPSHOT_INTERVAL', '10'))  # Checkpoint every N commands
+SNAPSHOT_MIN_SECONDS = float(os.getenv('SNAPSHOT_MIN_SECONDS', '0.5'))  # ...and after any step slower than this
+
+
+class SnapshotService:
+    """
+    Disk checkpoints of the materialized DataFrame, keyed by conversation and command id.
+
+    A snapshot for command X holds the state after replaying every active command up to
+    and including X. History is linear, so it stays valid for as long as X is active;
+    StateManager discards snapshots whenever it deactivates or deletes commands.
+    """
+
+    @staticmethod
+    def _conversation_folder(conversation_id: int) -> str:
+        return os.path.join(SNAPSHOT_FOLDER, str(conversation_id))
+
+    @staticmethod
+    def _path(conversation_id: int, command_id: int) -> str:
+        return os.path.join(
+            SnapshotService._conversation_folder(conversation_id),
+            f"{command_id}{COLUMNAR_EXTENSION}"
+        )
+
+    @staticmethod
+    def should_checkpoint(position: int, elapsed: float) -> bool:
+        """position is the 0-based index of the command in the active history."""
+        return (position + 1) % SNAPSHOT_INTERVAL == 0 or elapsed >= SNAPSHOT_MIN_SECONDS
+
+    @staticmethod
+    def save(conversation_id: int, command_id: int, df: pd.DataFrame) -> bool:
+        folder = SnapshotService._conversation_folder(conversation_id)
+        if not os.path.exists(folder):
+            os.makedirs(folder, exist_ok=True)
+        return ExcelService.write_columnar(df, SnapshotService._path(conversation_id, command_id))
+
+    @staticmethod
+    def load_latest(conversation_id: int, command_ids: List[int]) -> Tuple[int, Optional[pd.DataFrame]]:
+        """
+        Find the most recent checkpoint among command_ids (ordered oldest first).
+        Returns (number of commands already applied, DataFrame) or (0, None) when
+        there is no usable checkpoint.
+        """
+        for index in range(len(command_ids) - 1, -1, -1):
+            command_id = command_ids[index]
+            if command_id is None:
+                continue
+            path = SnapshotService._path(conversation_id, command_id)
+            if not os.path.exists(path):
+                continue
+            try:
+                return index + 1, ExcelService.read_columnar(path)
+            except Exception as e:
+                # Corrupt or partially written file — drop it and keep looking
+                print(f"[SNAPSHOT] Discarding unreadable checkpoint {path}: {e}")
+                os.remove(path)
+        return 0, None
+
+    @staticmethod
+    def discard(conversation_id: int, command_ids: List[int] = None) -> None:
+        """Remove the checkpoints for command_ids, or every checkpoint of the conversation."""
+        if command_ids is None:
+            shutil.rmtree(SnapshotService._conversation_folder(conversation_id), ignore_errors=True)
+            return
+        for command_id in command_ids:
+            path = SnapshotService._path(conversation_id, command_id)
+            if os.path.exists(path):
+                os.remove(path)
@@ -1,14 +1,33 @@
-import pandas as pd
 from datetime import datetime, timedelta
-from config.database import SessionLocal
+from typing import Optional, Tuple
+from sqlalchemy.orm import joinedload
+from config.database import db_session
 from app.models.conversation import Conversation
 from app.models.command import Command
 from app.services.excel_service import ExcelService
 from app.services.code_execution_service import CodeExecutionService
+from app.services.snapshot_service import SnapshotService
+from app.services.dataframe_cache import dataframe_cache
+from app.services.export_cache import ExportCache
 
 TTL_DAYS = 7  # File retention period; increase to make configurable via env
 
+
+def _chart_code(commands):
+    """Code of the most recent active chart command, from an already loaded history."""
+    for cmd in reversed(commands):
+        if cmd.chart_generated_code is not None:
+            return cmd.chart_generated_code
+    return None
+
+
 class StateManager:
+    """
+    Conversation state in the database. Every method runs in the request's unit of work
+    (config.database.db_session): a request reuses one session and connection however
+    many of these it calls, and objects loaded by get_session stay usable for writes.
+    """
+
     @staticmethod
     def create_session(user_id: int, file, filename: str) -> int:
         """
@@ -16,74 +35,137 @@ class StateManager:
         Saves file to disk.
         Returns conversation_id.
         """
-        session = SessionLocal()
+        # 1. Save File, plus its columnar fast-load copy, parsed once and before any
+        # database work so no connection is held while the workbook is read
+        file_path, secure_name = ExcelService.save_file_to_disk(file, user_id)
         try:
-            # 1. Check Limits (Max 2 active sessions)
+            initial_df = ExcelService.convert_to_columnar(file_path)
+            file_hash = ExportCache.file_hash(file_path)
+        except Exception:
+            ExcelService.remove_upload(file_path)
+            raise
+
+        with db_session() as session:
+            # 2. Check Limits (Max 2 active sessions)
             count = session.query(Conversation).filter_by(user_id=user_id, is_active=True).count()
             if count >= 2:
+                ExcelService.remove_upload(file_path)
                 raise ValueError("Límite de 2 sesiones alcanzado. Elimine una anterior.")
 
-            # 2. Save File
-            file_path, secure_name = ExcelService.save_file_to_disk(file, user_id)
-
             # 3. Create Record
             new_conv = Conversation(
                 user_id=user_id,
                 file_path=file_path,
+                file_hash=file_hash,
                 filename=filename,
                 expires_at=datetime.utcnow() + timedelta(days=TTL_DAYS)
             )
             session.add(new_conv)
             session.commit()
+            dataframe_cache.put(new_conv.id, None, initial_df)
             return new_conv.id
-        except Exception as e:
-            session.rollback()
-            raise e
-        finally:
-            session.close()
 
     @staticmethod
     def get_session(conversation_id: int, user_id: int):
         """
-        Loads Conversation from DB
-        Reads File from Disk -> initial_df
-        Loads Commands from DB
-        Returns dict similar to previous in-memory structure
+        Loads the conversation with its active commands in a single query (joined eager
+        load), plus initial_df from the frame cache or disk.
+        Returns {'initial_df', 'commands', 'conversation', 'chart_code'}.
         """
-        session = SessionLocal()
-        try:
-            conv = session.query(Conversation).filter_by(id=conversation_id, user_id=user_id).first()
+        with db_session() as session:
+            conv = session.query(Conversation).options(
+                joinedload(Conversation.active_commands)
+            ).populate_existing().filter_by(id=conversation_id, user_id=user_id).first()
             if not conv:
                 raise ValueError("Conversación no encontrada o acceso denegado.")
+            commands = list(conv.active_commands)
+            # End the read transaction: the connection goes back to the pool while the
+            # request replays or waits on the LLM, and the loaded objects stay usable
+            session.commit()
 
-            if conv.file_path.endswith('.csv'):
-                initial_df = pd.read_csv(conv.file_path)
-            else:
-                initial_df = pd.read_excel(conv.file_path, sheet_name=0)
+        initial_df = dataframe_cache.get(conv.id, None)
+        if initial_df is None:
+            initial_df = ExcelService.load_dataframe(conv.file_path)
+            dataframe_cache.put(conv.id, None, initial_df)
 
+        return {
+            'initial_df': initial_df,
+            'commands': commands,
+            'conversation': conv,
+            'chart_code': _chart_code(commands)
+        }
 
-            initial_df.columns = initial_df.columns.astype(str)
+    @staticmethod
+    def get_version(conversation_id: int, user_id: int) -> str:
+        """
+        Version hash of the conversation's current state (uploaded file + head command),
+        without loading any data. Used as the ETag of everything rendered from that state.
+        History is linear, so the head command identifies every command before it.
+        """
+        return StateManager.get_version_info(conversation_id, user_id)[0]
 
-            # Load Commands (Ordered by ID/Created_at) - ONLY ACTIVE ONES
-            commands_db = session.query(Command).filter_by(conversation_id=conversation_id, is_active=True).order_by(Command.id).all()
-            
-            return {
-                'initial_df': initial_df,
-                'commands': commands_db,
-                'conversation': conv
-            }
-        finally:
-            session.close()
+    @staticmethod
+    def get_version_info(conversation_id: int, user_id: int) -> Tuple[str, str]:
+        """(version, original filename) in the same single query; also the ownership check."""
+        with db_session() as session:
+            row = session.query(
+                Conversation.file_hash, Conversation.file_path, Conversation.head_command_id, Command.created_at,
+                Conversation.filename
+            ).outerjoin(
+                Command, Command.id == Conversation.head_command_id
+            ).filter(
+                Conversation.id == conversation_id, Conversation.user_id == user_id
+            ).first()
+            if not row:
+                raise ValueError("Conversación no encontrada o acceso denegado.")
+            file_hash, file_path, head_command_id, head_created_at, filename = row
+            if file_hash is None:
+                # Conversations created before file hashes were stored
+                file_hash = ExportCache.file_hash(file_path)
+                session.query(Conversation).filter_by(id=conversation_id).update({Conversation.file_hash: file_hash})
+            session.commit()
+            return ExportCache.version(file_hash, head_command_id, head_created_at), filename
+
+    @staticmethod
+    def extend_version(version: Optional[str], command_id: int, code: str = None, chart_code: str = None) -> str:
+        """State version after appending a command to the state identified by version."""
+        return ExportCache.version(version or '', command_id, code, chart_code)
+
+    @staticmethod
+    def state_version(commands) -> Optional[str]:
+        """
+        Identity of the state an active history produces, for the in-process caches: folds
+        each command's id and code, so it needs no query and, unlike a head id, cannot be
+        confused with an undone state whose id was reused. None for the initial state (or
+        commands without ids, which are never cached).
+        """
+        version = None
+        for cmd in commands:
+            command_id = getattr(cmd, 'id', None)
+            if command_id is None:
+                return None
+            version = StateManager.extend_version(
+                version, command_id, getattr(cmd, 'generated_code', None), getattr(cmd, 'chart_generated_code', None)
+            )
+        return version
+
+    @staticmethod
+    def _set_heads(session, conversation_id: int, **heads) -> None:
+        """Update the denormalized head_command_id / active_chart_command_id in the current transaction."""
+        session.query(Conversation).filter_by(id=conversation_id).update(
+            {getattr(Conversation, name): value for name, value in heads.items()}
+        )
 
     @staticmethod
     def add_command(conversation_id: int, prompt: str, code: str, explanation: str = None, chart_code: str = None, intent_type: str = 'DATA_MUTATION'):
-        session = SessionLocal()
-        try:
+        with db_session() as session:
             # Clean up "future" (inactive) commands to maintain linear history
             # If we are adding a new command, any command that was "undone" (is_active=False)
             # and is chronologically "after" the current state should be removed.
             # Simplified approach: Delete ALL inactive commands for this conversation.
-            session.query(Command).filter_by(conversation_id=conversation_id, is_active=False).delete()
+            stale_ids = [row.id for row in session.query(Command.id).filter_by(conversation_id=conversation_id, is_active=False)]
+            if stale_ids:
+                session.query(Command).filter(Command.id.in_(stale_ids)).delete(synchronize_session=False)
 
             cmd = Command(
                 conversation_id=conversation_id,
@@ -94,42 +176,45 @@ class StateManager:
                 intent_type=intent_type,
                 is_active=True
             )
+            if intent_type == 'DATA_MUTATION' and code and code != 'pass':
+                # Persist the validated bytecode so replays never re-parse the source
+                try:
+                    cmd.code_hash, cmd.compiled_code = CodeExecutionService.dump_compiled(code)
+                except ValueError as e:
+                    print(f"[STATE] Command code not precompiled: {e}")
             session.add(cmd)
+            session.flush()
+            heads = {'head_command_id': cmd.id}
+            if chart_code is not None:
+                heads['active_chart_command_id'] = cmd.id
+            StateManager._set_heads(session, conversation_id, **heads)
+            session.commit()
+            SnapshotService.discard(conversation_id, stale_ids)
+            dataframe_cache.invalidate(conversation_id, keep_initial=True)
+            return cmd.id
+
+    @staticmethod
+    def record_metrics(command_id: int, **metrics) -> None:
+        """Store a request's measurements (llm_ms, exec_ms, rows_in, rows_out, payload_bytes) on its command."""
+        with db_session() as session:
+            session.query(Command).filter_by(id=command_id).update(metrics, synchronize_session=False)
             session.commit()
-        except:
-            session.rollback()
-            raise
-        finally:
-            session.close()
 
     @staticmethod
     def get_active_chart_code(conversation_id: int):
         """
         Returns the code of the most recent active chart generation.
+        Prefer session['chart_code'] when the session is already loaded.
         """
-        session = SessionLocal()
-        try:
-            cmd = session.query(Command).filter_by(
-                conversation_id=conversation_id, 
-                is_active=True
-            ).filter(
-                Command.chart_generated_code.isnot(None)
-            ).order_by(Command.id.desc()).first()
-            
-            return cmd.chart_generated_code if cmd else None
-        finally:
-            session.close()
+        with db_session() as session:
+            row = session.query(Command.chart_generated_code).join(
+                Conversation, Conversation.active_chart_command_id == Command.id
+            ).filter(Conversation.id == conversation_id).first()
+            return row.chart_generated_code if row else None
 
     @staticmethod
     def add_chart_command(conversation_id: int, prompt: str, code: str, explanation: str = None):
-        session = SessionLocal()
-        try:
-            # Clean up "future" (inactive) commands to maintain linear history
-            # If we are adding a new command, any command that was "undone" (is_active=False) 
-            # and is chronologically "after" the current state should be removed.
-            # Simplified approach: Delete ALL inactive commands for this conversation.
-            ##session.query(Command).filter_by(conversation_id=conversation_id, is_active=False).delete()##
-            
+        with db_session() as session:
             cmd = Command(
                 conversation_id=conversation_id,
                 prompt=prompt,
@@ -138,79 +223,80 @@ class StateManager:
                 is_active=True
             )
             session.add(cmd)
+            session.flush()
+            StateManager._set_heads(session, conversation_id, head_command_id=cmd.id, active_chart_command_id=cmd.id)
             session.commit()
-        except:
-            session.rollback()
-            raise
-        finally:
-            session.close()
-
+            dataframe_cache.invalidate(conversation_id, keep_initial=True)
 
     @staticmethod
-    def undo_last_command(conversation_id: int):
-        session = SessionLocal()
-        try:
-            # Find last ACTIVE command
-            last_cmd = session.query(Command).filter_by(conversation_id=conversation_id, is_active=True).order_by(Command.id.desc()).first()
+    def undo_last_command(conversation_id: int, session_data: dict = None):
+        """
+        Soft-deletes the last active command. Given the already loaded session_data, the
+        command is known and the post-undo session is returned without another load.
+        """
+        with db_session() as session:
+            if session_data is not None:
+                commands = session_data['commands']
+            else:
+                commands = session.query(Command).filter_by(
+                    conversation_id=conversation_id, is_active=True
+                ).order_by(Command.id).all()
+            last_cmd = commands[-1] if commands else None
+            remaining = commands[:-1]
             if last_cmd:
-                # Soft Delete
-                last_cmd.is_active = False
+                # Soft Delete, moving the denormalized heads back in the same transaction
+                session.query(Command).filter_by(id=last_cmd.id).update({Command.is_active: False})
+                chart_cmd = next((cmd for cmd in reversed(remaining) if cmd.chart_generated_code is not None), None)
+                StateManager._set_heads(
+                    session, conversation_id,
+                    head_command_id=remaining[-1].id if remaining else None,
+                    active_chart_command_id=chart_cmd.id if chart_cmd else None
+                )
                 session.commit()
-        except:
-            session.rollback()
-            raise
-        finally:
-            session.close()
-            
+                last_cmd.is_active = False
+                SnapshotService.discard(conversation_id, [last_cmd.id])
+                dataframe_cache.invalidate(conversation_id, keep_initial=True)
+
+        if session_data is None:
+            return None
+        return {**session_data, 'commands': remaining, 'chart_code': _chart_code(remaining)}
+
     @staticmethod
     def clear_commands(conversation_id: int):
-        session = SessionLocal()
-        try:
+        with db_session() as session:
             # Soft delete ALL
             session.query(Command).filter_by(conversation_id=conversation_id).update({Command.is_active: False})
+            StateManager._set_heads(session, conversation_id, head_command_id=None, active_chart_command_id=None)
             session.commit()
-        except:
-            session.rollback()
-            raise
-        finally:
-            session.close()
+            SnapshotService.discard(conversation_id)
+            dataframe_cache.invalidate(conversation_id, keep_initial=True)
 
     @staticmethod
     def get_user_conversations(user_id: int):
-        session = SessionLocal()
-        try:
+        with db_session() as session:
             convs = session.query(Conversation).filter_by(user_id=user_id, is_active=True).order_by(Conversation.created_at.desc()).all()
             return [c.serialize() for c in convs]
-        finally:
-            session.close()
 
     @staticmethod
     def get_conversation_messages(conversation_id: int, user_id: int):
-        session = SessionLocal()
-        try:
-            # Verify ownership
-            conv = session.query(Conversation).filter_by(id=conversation_id, user_id=user_id).first()
+        with db_session() as session:
+            # Verify ownership and load the active messages in one query
+            conv = session.query(Conversation).options(
+                joinedload(Conversation.active_commands)
+            ).populate_existing().filter_by(id=conversation_id, user_id=user_id).first()
             if not conv:
                 raise ValueError("Conversación no encontrada.")
-            
-            # Return only ACTIVE messages
-            commands = session.query(Command).filter_by(conversation_id=conversation_id, is_active=True).order_by(Command.id).all()
-            return [c.serialize() for c in commands]
-        finally:
-            session.close()
+            return [c.serialize() for c in conv.active_commands]
 
     @staticmethod
     def delete_conversation(conversation_id: int, user_id: int):
-        session = SessionLocal()
-        try:
+        with db_session() as session:
             conv = session.query(Conversation).filter_by(id=conversation_id, user_id=user_id).first()
             if not conv:
                 raise ValueError("Conversación no encontrada.")
-            
+
             conv.is_active = False
             session.commit()
-        except:
-            session.rollback()
-            raise
-        finally:
-            session.close()
+            SnapshotService.discard(conversation_id)
+            ExportCache.discard(conversation_id)
+            dataframe_cache.invalidate(conversation_id)
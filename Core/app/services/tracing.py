@@ -0,0 +1,54 @@
+import os
+import json
+import time
+from contextlib import contextmanager
+
+TRACE_ENABLED = os.getenv('TRACE_ENABLED', '1') == '1'  # [TRACE] log line per request
+TRACE_DEBUG = os.getenv('TRACE_DEBUG', '0') == '1'  # Stage timings in the done event
+
+
+class Trace:
+    """
+    Per-request stage timer. Each `with trace.stage(name)` block adds its wall time in
+    milliseconds to timings[name] (a stage entered twice accumulates); counters hold
+    sizes such as rows and payload bytes. One trace covers one request, so it is not
+    shared between threads.
+    """
+
+    def __init__(self, name: str, **fields):
+        self.name = name
+        self.fields = dict(fields)
+        self.timings = {}
+        self.counters = {}
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - started) * 1000)
+
+    def add(self, name: str, elapsed_ms: float) -> None:
+        self.timings[name] = self.timings.get(name, 0.0) + elapsed_ms
+
+    def count(self, **counters) -> None:
+        self.counters.update(counters)
+
+    def ms(self, name: str):
+        """Rounded time of a stage, or None if it never ran."""
+        return round(self.timings[name], 2) if name in self.timings else None
+
+    def breakdown(self) -> dict:
+        """Stage timings in the order they first ran, plus the total since the trace began."""
+        timings = {name: round(value, 2) for name, value in self.timings.items()}
+        timings['total'] = round((time.perf_counter() - self._started) * 1000, 2)
+        return timings
+
+    def log(self, **fields) -> None:
+        """Emit the trace as one JSON log line, so slow requests can be grepped and aggregated."""
+        if not TRACE_ENABLED:
+            return
+        record = {"trace": self.name, **self.fields, **fields, "ms": self.breakdown(), **self.counters}
+        print("[TRACE] " + json.dumps(record, default=str))
@@ -0,0 +1,39 @@
+"""
+Backfill the columnar fast-load copies for uploads stored before ingestion-time conversion.
+
+Usage (from Core/):
+    python backfill_columnar.py            # convert every upload missing a fresh copy
+    python backfill_columnar.py --force    # re-convert everything
+"""
+import os
+import sys
+from app.services.excel_service import ExcelService, UPLOAD_FOLDER, COLUMNAR_EXTENSION
+
+
+def backfill(folder: str = UPLOAD_FOLDER, force: bool = False) -> dict:
+    counts = {"converted": 0, "skipped": 0, "failed": 0}
+    for root, _, files in os.walk(folder):
+        for name in files:
+            if name.endswith(COLUMNAR_EXTENSION) or not ExcelService.allowed_file(name):
+                continue
+            file_path = os.path.join(root, name)
+            columnar = ExcelService.columnar_path(file_path)
+            if not force and os.path.exists(columnar) and os.path.getmtime(columnar) >= os.path.getmtime(file_path):
+                counts["skipped"] += 1
+                continue
+            try:
+                ExcelService.convert_to_columnar(file_path)
+            except Exception as e:
+                print(f"[BACKFILL] {file_path}: {e}")
+                counts["failed"] += 1
+                continue
+            if os.path.exists(columnar):
+                counts["converted"] += 1
+            else:
+                counts["failed"] += 1  # No copy could be stored; it keeps loading from the original
+    return counts
+
+
+if __name__ == "__main__":
+    result = backfill(force='--force' in sys.argv)
+    print(f"Converted: {result['converted']}  Skipped: {result['skipped']}  Failed: {result['failed']}")
@@ -0,0 +1,184 @@
+"""
+Peak RSS per endpoint for a synthetic workbook, with the cache cold before every call
+so each request pays for its own replay.
+
+Usage (from Core/):
+    python -m benchmarks.bench_memory                          # 100k rows
+    python -m benchmarks.bench_memory --rows 500000 --output mem.json
+    python -m benchmarks.bench_memory --baseline mem.json      # exit 1 on a >20% regression
+
+Peaks come from VmHWM, reset before each request through /proc/self/clear_refs (Linux);
+elsewhere the lifetime ru_maxrss is reported instead and per-endpoint numbers are upper bounds.
+Generated code runs in-process (SANDBOX_ENABLED=0) so its allocations are counted.
+"""
+import gc
+import io
+import os
+import ctypes
+import sys
+import json
+import argparse
+import tempfile
+from unittest.mock import patch
+
+_CORE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Steps applied by the fake LLM, one command each
+COMMANDS = [
+    "df['amount'] = df['amount'] * 1.21",
+    "df = df[df['units'] > 10]",
+    "df['label'] = df['region'].fillna('Unknown') + '-' + df['id'].astype('string')",
+    "df = df.sort_values('amount', ascending=False)",
+]
+
+
+def _status_mb(field: str) -> float:
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith(field + ':'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def _release_free_memory() -> None:
+    """Return freed heap pages to the OS so the next peak is not hidden by allocator reuse."""
+    gc.collect()
+    try:
+        ctypes.CDLL('libc.so.6').malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+def _reset_peak() -> bool:
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _peak_mb(resettable: bool) -> float:
+    if resettable:
+        return _status_mb('VmHWM')
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def make_workbook(rows: int) -> bytes:
+    import openpyxl
+    from benchmarks.bench_serializer import make_frame
+
+    df = make_frame(rows)
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(df.columns.tolist())
+    for row in df.astype(object).where(df.notna(), None).itertuples(index=False):
+        ws.append(list(row))
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def run(rows: int) -> dict:
+    from app import create_app
+    from config.database import engine, Base
+    from app.services.dataframe_cache import dataframe_cache
+
+    app = create_app()
+    app.config.update({'TESTING': True, 'JWT_SECRET_KEY': 'bench-secret'})
+    Base.metadata.create_all(bind=engine)
+    client = app.test_client()
+
+    client.post('/auth/register', json={'email': 'bench@example.com', 'password': 'Password1!'})
+    token = client.post('/auth/login', json={'email': 'bench@example.com', 'password': 'Password1!'}).get_json()['token']
+    auth = {'Authorization': f'Bearer {token}'}
+    workbook = make_workbook(rows)
+    resettable = _reset_peak()
+    results = {}
+
+    def measure(name, call):
+        dataframe_cache.clear()
+        _release_free_memory()
+        baseline = _status_mb('VmRSS')
+        _reset_peak()
+        response = call()
+        body = response.data  # Drains streamed responses inside the measurement
+        peak = _peak_mb(resettable)
+        results[name] = {
+            "status": response.status_code,
+            "rss_before_mb": round(baseline, 1),
+            "peak_mb": round(peak, 1),
+            "peak_delta_mb": round(peak - baseline, 1),
+            "response_bytes": len(body),
+        }
+        print(f"{name:<14} peak {peak:>9.1f} MB   delta {peak - baseline:>8.1f} MB   status {response.status_code}")
+        return response
+
+    upload = measure('upload', lambda: client.post(
+        '/excel/upload', data={'file': (io.BytesIO(workbook), 'bench.xlsx')},
+        headers=auth, content_type='multipart/form-data'
+    ))
+    session_id = upload.get_json()['session_id']
+
+    for position, code in enumerate(COMMANDS):
+        reply = {"code": code, "explanation": "bench", "intent": "DATA_MUTATION"}
+        with patch('app.routes.excel.LLMService.generate_transformation_code', return_value=reply):
+            measure(f'transform_{position + 1}', lambda: client.post(
+                '/excel/transform', data={'session_id': str(session_id), 'prompt': f'bench step {position}'}, headers=auth
+            ))
+
+    measure('conversation', lambda: client.get(f'/excel/conversation/{session_id}', headers=auth))
+    measure('rows', lambda: client.get(f'/excel/conversation/{session_id}/rows?offset=1000&limit=1000', headers=auth))
+    measure('undo', lambda: client.post('/excel/undo', data={'session_id': str(session_id)}, headers=auth))
+    measure('download', lambda: client.get(f'/excel/download/{session_id}', headers=auth))
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Endpoints whose peak delta grew by more than `tolerance` (and at least 16 MB) over the baseline."""
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get('endpoints', {}).get(name)
+        if not before:
+            continue
+        allowed = max(before['peak_delta_mb'] * (1 + tolerance), before['peak_delta_mb'] + 16)
+        if result['peak_delta_mb'] > allowed:
+            regressions.append(f"{name}: {result['peak_delta_mb']} MB (baseline {before['peak_delta_mb']} MB)")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--output', help='write results as JSON')
+    parser.add_argument('--baseline', help='JSON from a previous --output run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    # Isolated database, uploads and snapshots; must be set before the app is imported
+    workdir = tempfile.mkdtemp(prefix='datamind-bench-')
+    os.chdir(workdir)
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ['SANDBOX_ENABLED'] = '0'
+    if _CORE_DIR not in sys.path:
+        sys.path.insert(0, _CORE_DIR)
+
+    results = run(args.rows)
+    report = {"rows": args.rows, "endpoints": results}
+    if args.output:
+        with open(os.path.join(_CORE_DIR, args.output) if not os.path.isabs(args.output) else args.output, 'w') as out:
+            json.dump(report, out, indent=2)
+
+    if args.baseline:
+        path = args.baseline if os.path.isabs(args.baseline) else os.path.join(_CORE_DIR, args.baseline)
+        with open(path) as previous:
+            regressions = compare(results, json.load(previous), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
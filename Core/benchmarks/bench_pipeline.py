@@ -0,0 +1,265 @@
+"""
+End-to-end pipeline benchmark: time and peak memory of every stage a request goes
+through, against histories of growing length built with the deterministic FakeLLM.
+
+For each history length the workbook's conversation is extended to that many commands
+through /excel/transform, then each stage is measured --repeat times with the frame
+cache cold:
+
+    get_session           conversation + history query and the Parquet fast-load copy
+    get_session_original  the same with the Parquet copy gone (parses the .xlsx)
+    replay                _replay_session from the newest snapshot checkpoint
+    replay_full           _replay_session of the whole history from the upload
+    format_rows/columns   ExcelService.format_dataframe_response of the first window
+    chart                 CodeExecutionService.execute_chart_generation
+    download              GET /excel/download/<id>, drained (export cache disabled)
+    transform             one more /excel/transform on top of the history
+
+Usage (from Core/):
+    python -m benchmarks.bench_pipeline                                   # 20k rows, 1/10/50/200 steps
+    python -m benchmarks.bench_pipeline --rows 100000 --columns 24 --formulas 2 --output pipeline.json
+    python -m benchmarks.bench_pipeline --steps 1 50 --llm-latency-ms 800 --repeat 5
+    python -m benchmarks.bench_pipeline --kinds float text datetime                   # no mixed-type column
+    python -m benchmarks.bench_pipeline --baseline pipeline.json          # exit 1 on a >20% slowdown
+
+Timings are medians over the repeats; peaks use bench_memory's VmHWM reset (Linux).
+Results carry the commit they were measured on, so two JSON files compare two commits.
+"""
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+from unittest.mock import patch
+
+from benchmarks.bench_memory import _CORE_DIR, _peak_mb, _release_free_memory, _reset_peak, _status_mb
+
+
+def _commit() -> dict:
+    def git(*args):
+        try:
+            return subprocess.run(['git', *args], cwd=_CORE_DIR, capture_output=True, text=True, timeout=10).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return ''
+    return {"commit": git('rev-parse', '--short', 'HEAD') or None, "dirty": bool(git('status', '--porcelain', '--untracked-files=no'))}
+
+
+def _environment() -> dict:
+    import numpy as np
+    import pandas as pd
+    import pyarrow as pa
+    return {
+        **_commit(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "pyarrow": pa.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+class Stage:
+    """Runs one stage repeatedly and summarizes time and peak memory."""
+
+    def __init__(self, repeat: int, resettable: bool):
+        self.repeat = repeat
+        self.resettable = resettable
+
+    def measure(self, call, rows: int, prepare=None, cold: bool = True) -> dict:
+        from app.services.dataframe_cache import dataframe_cache
+        seconds, deltas, size = [], [], None
+        for _ in range(self.repeat):
+            if prepare:
+                prepare()
+            if cold:
+                dataframe_cache.clear()
+            _release_free_memory()
+            baseline = _status_mb('VmRSS')
+            _reset_peak()
+            started = time.perf_counter()
+            result = call()
+            seconds.append(time.perf_counter() - started)
+            deltas.append(_peak_mb(self.resettable) - baseline)
+            if isinstance(result, (bytes, str)):
+                size = len(result)
+        median = statistics.median(seconds)
+        summary = {
+            "seconds": round(median, 5),
+            "min_seconds": round(min(seconds), 5),
+            "rows_per_sec": int(rows / median) if median > 0 else None,
+            "peak_delta_mb": round(max(deltas), 1),
+        }
+        if size is not None:
+            summary["bytes"] = size
+        return summary
+
+
+def run(rows: int, columns: int, formulas: int, kinds: list, steps: list, repeat: int, llm_latency_ms: float) -> dict:
+    from flask_jwt_extended import decode_token
+    from app import create_app
+    from config.database import engine, Base
+    from app.routes.excel import _replay_session
+    from app.services.excel_service import ExcelService
+    from app.services.code_execution_service import CodeExecutionService
+    from app.services.snapshot_service import SnapshotService
+    from app.services.state_manager import StateManager
+    from benchmarks.fake_llm import FakeLLM, CHART_CODE
+    from benchmarks.workbook import make_shape, make_workbook
+
+    app = create_app()
+    app.config.update({'TESTING': True, 'JWT_SECRET_KEY': 'bench-secret'})
+    Base.metadata.create_all(bind=engine)
+    client = app.test_client()
+
+    client.post('/auth/register', json={'email': 'bench@example.com', 'password': 'Password1!'})
+    token = client.post('/auth/login', json={'email': 'bench@example.com', 'password': 'Password1!'}).get_json()['token']
+    auth = {'Authorization': f'Bearer {token}'}
+    with app.app_context():
+        user_id = decode_token(token)['sub']
+
+    workbook = make_workbook(rows, columns, formulas, kinds=kinds)
+    started = time.perf_counter()
+    upload = client.post('/excel/upload', data={'file': (io.BytesIO(workbook), 'bench.xlsx')},
+                         headers=auth, content_type='multipart/form-data')
+    upload_seconds = time.perf_counter() - started
+    session_id = upload.get_json()['session_id']
+
+    fake = FakeLLM(latency_ms=llm_latency_ms, first_token_ms=llm_latency_ms / 3)
+    # Imports and first-call setup (plotly, the sandbox) are not part of any stage
+    CodeExecutionService.execute_chart_generation(make_shape(10)[0], CHART_CODE)
+    stage = Stage(repeat, _reset_peak())
+
+    def transform(step: int) -> bytes:
+        with patch('app.routes.excel.LLMService.generate_transformation_code', fake.generate_transformation_code):
+            return client.post('/excel/transform', data={'session_id': str(session_id), 'prompt': f'bench step {step}'},
+                               headers=auth).get_data()
+
+    def drop_columnar_copy():
+        path = ExcelService.columnar_path(StateManager.get_session(session_id, user_id)['conversation'].file_path)
+        if os.path.exists(path):
+            os.remove(path)
+
+    histories = {}
+    history = 0
+    for target in sorted(set(steps)):
+        while history < target:
+            transform(history)
+            history += 1
+
+        with app.app_context():
+            session = StateManager.get_session(session_id, user_id)
+            df = _replay_session(session)
+            current_rows = len(df)
+            results = {
+                "get_session": stage.measure(lambda: StateManager.get_session(session_id, user_id), rows),
+                "get_session_original": stage.measure(lambda: StateManager.get_session(session_id, user_id), rows,
+                                                      prepare=drop_columnar_copy),
+                "replay": stage.measure(lambda: _replay_session(session), current_rows),
+            }
+            with patch.object(SnapshotService, 'load_latest', return_value=(0, None)), \
+                    patch.object(SnapshotService, 'should_checkpoint', return_value=False):
+                results["replay_full"] = stage.measure(lambda: _replay_session(session), current_rows)
+            for layout in ('rows', 'columns'):
+                results[f"format_{layout}"] = stage.measure(
+                    lambda: app.json.dumps(ExcelService.format_dataframe_response(df, layout=layout)), current_rows)
+            results["chart"] = stage.measure(lambda: CodeExecutionService.execute_chart_generation(df, CHART_CODE), current_rows)
+        results["download"] = stage.measure(
+            lambda: client.get(f'/excel/download/{session_id}', headers=auth).get_data(), current_rows)
+
+        # One more step on top of this history with the cache warm, as between two prompts;
+        # each repeat first undoes the previous one so all start from the same state
+        extended = []
+
+        def undo_previous():
+            while extended:
+                client.post('/excel/undo', data={'session_id': str(session_id)}, headers=auth).get_data()
+                extended.pop()
+            transform_session = StateManager.get_session(session_id, user_id)
+            _replay_session(transform_session)
+
+        def extend():
+            extended.append(history)
+            return transform(history)
+
+        with app.app_context():
+            results["transform"] = stage.measure(extend, current_rows, prepare=undo_previous, cold=False)
+            undo_previous()
+
+        histories[str(target)] = {"rows": current_rows, "stages": results}
+        print(f"--- {target} steps ({current_rows} rows)")
+        for name, result in results.items():
+            print(f"{name:<22} {result['seconds'] * 1000:>10.1f} ms   {result['rows_per_sec'] or 0:>12,} rows/s   "
+                  f"peak +{result['peak_delta_mb']:>7.1f} MB")
+
+    return {"upload_seconds": round(upload_seconds, 4), "workbook_bytes": len(workbook), "histories": histories}
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list:
+    """Stages slower (by `tolerance` and at least 5 ms) or hungrier (and at least 16 MB) than the baseline."""
+    regressions = []
+    for steps, history in report['histories'].items():
+        before_stages = baseline.get('histories', {}).get(steps, {}).get('stages', {})
+        for name, result in history['stages'].items():
+            before = before_stages.get(name)
+            if not before:
+                continue
+            if result['seconds'] > max(before['seconds'] * (1 + tolerance), before['seconds'] + 0.005):
+                regressions.append(f"{steps} steps / {name}: {result['seconds']}s (baseline {before['seconds']}s)")
+            if result['peak_delta_mb'] > max(before['peak_delta_mb'] * (1 + tolerance), before['peak_delta_mb'] + 16):
+                regressions.append(f"{steps} steps / {name}: +{result['peak_delta_mb']} MB "
+                                   f"(baseline +{before['peak_delta_mb']} MB)")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=20_000)
+    parser.add_argument('--columns', type=int, default=12)
+    parser.add_argument('--formulas', type=int, default=0, help='formula columns in the uploaded workbook')
+    parser.add_argument('--kinds', nargs='+', help='column kinds after the first six (see benchmarks.workbook)')
+    parser.add_argument('--steps', type=int, nargs='+', default=[1, 10, 50, 200], help='history lengths to measure')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--llm-latency-ms', type=float, default=0.0, help='FakeLLM latency per transform')
+    parser.add_argument('--output', help='write results as JSON')
+    parser.add_argument('--baseline', help='JSON from a previous --output run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    # Isolated database, uploads and snapshots; must be set before the app is imported
+    workdir = tempfile.mkdtemp(prefix='datamind-bench-')
+    os.chdir(workdir)
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ['SANDBOX_ENABLED'] = '0'
+    os.environ['EXPORT_CACHE_ENABLED'] = '0'  # Every download renders
+    os.environ['TRACE_ENABLED'] = '0'
+    if _CORE_DIR not in sys.path:
+        sys.path.insert(0, _CORE_DIR)
+
+    report = {
+        "environment": _environment(),
+        "parameters": {"rows": args.rows, "columns": args.columns, "formulas": args.formulas, "kinds": args.kinds,
+                       "repeat": args.repeat, "llm_latency_ms": args.llm_latency_ms},
+        **run(args.rows, args.columns, args.formulas, args.kinds, args.steps, args.repeat, args.llm_latency_ms),
+    }
+    if args.output:
+        with open(os.path.join(_CORE_DIR, args.output) if not os.path.isabs(args.output) else args.output, 'w') as out:
+            json.dump(report, out, indent=2)
+
+    if args.baseline:
+        path = args.baseline if os.path.isabs(args.baseline) else os.path.join(_CORE_DIR, args.baseline)
+        with open(path) as previous:
+            regressions = compare(report, json.load(previous), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+"""
+Size of the LLM system prompt before and after column profiles: the column list plus
+first row (COLUMN_PROFILE_ENABLED=0) against ColumnProfiler.context, for sheets of
+growing width. Tokens are counted with litellm's tokenizer for --model, so the numbers
+match what the provider bills; profile time is the cold (uncached) computation.
+
+Usage (from Core/):
+    python -m benchmarks.bench_prompt                                  # 6/50/300 columns, 20k rows
+    python -m benchmarks.bench_prompt --columns 12 300 1000 --budget 800 --output prompt.json
+    python -m benchmarks.bench_prompt --prompt "sum amount by region"
+"""
+import sys
+import json
+import time
+import argparse
+import pandas as pd
+
+
+def measure(rows: int, columns: int, prompt: str, budget: int, model: str) -> dict:
+    import litellm
+    from app.services.column_profile import ColumnProfiler
+    from app.services.llm_service import LLMService
+    from benchmarks.workbook import make_shape
+
+    df, _ = make_shape(rows, columns)
+    sample_data = df.iloc[0].where(pd.notnull(df.iloc[0]), None).to_dict()
+    legacy = LLMService._system_content(df.columns.tolist(), sample_data)
+
+    started = time.perf_counter()
+    profile = ColumnProfiler.profile(df)
+    profile_ms = (time.perf_counter() - started) * 1000
+    schema, detailed = ColumnProfiler.render(profile, prompt, len(df), budget)
+    profiled = LLMService._system_content(df.columns.tolist(), schema=schema)
+
+    before = litellm.token_counter(model=model, text=legacy + prompt)
+    after = litellm.token_counter(model=model, text=profiled + prompt)
+    return {
+        "columns": columns,
+        "rows": rows,
+        "tokens_before": before,
+        "tokens_after": after,
+        "reduction": round(1 - after / before, 4),
+        "columns_detailed": detailed,
+        "profile_ms": round(profile_ms, 2),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=20_000)
+    parser.add_argument('--columns', type=int, nargs='+', default=[6, 50, 300])
+    parser.add_argument('--prompt', default='multiply amount by 1.21 where region is North')
+    parser.add_argument('--budget', type=int, help='token budget (default LLM_CONTEXT_TOKEN_BUDGET)')
+    parser.add_argument('--model', default='gpt-4o', help='tokenizer to count with')
+    parser.add_argument('--output', help='write results as JSON')
+    args = parser.parse_args(argv)
+
+    from app.services.column_profile import LLM_CONTEXT_TOKEN_BUDGET
+    budget = args.budget or LLM_CONTEXT_TOKEN_BUDGET
+    results = [measure(args.rows, width, args.prompt, budget, args.model) for width in args.columns]
+    for result in results:
+        print(f"{result['columns']:>6} columns   {result['tokens_before']:>8,} -> {result['tokens_after']:>6,} tokens "
+              f"({-result['reduction']:+.0%})   {result['columns_detailed']:>4} in full   "
+              f"profile {result['profile_ms']:.1f} ms")
+    if args.output:
+        with open(args.output, 'w') as out:
+            json.dump({"budget": budget, "prompt": args.prompt, "results": results}, out, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
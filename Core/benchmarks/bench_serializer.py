@@ -0,0 +1,76 @@
+"""
+Grid serialization throughput: legacy format_dataframe_response vs FrameSerializer.
+
+Usage (from Core/):
+    python -m benchmarks.bench_serializer              # 10k, 100k and 1M rows
+    python -m benchmarks.bench_serializer 50000        # custom sizes
+"""
+import sys
+import time
+import json
+import numpy as np
+import pandas as pd
+from app.services.frame_serializer import FrameSerializer
+
+
+def make_frame(rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    values = rng.normal(100, 25, rows)
+    values[rng.random(rows) < 0.05] = np.nan
+    when = pd.Series(pd.date_range('2020-01-01', periods=rows, freq='min'))
+    when[rng.random(rows) < 0.02] = pd.NaT
+    return pd.DataFrame({
+        'id': np.arange(rows),
+        'region': rng.choice(['North', 'South', 'East', 'West', None], rows),
+        'amount': values,
+        'units': rng.integers(0, 500, rows),
+        'active': rng.random(rows) < 0.5,
+        'created': when,
+    })
+
+
+def legacy_encode(df: pd.DataFrame) -> bytes:
+    """format_dataframe_response + jsonify as they were before the vectorized serializer."""
+    columns = df.columns.tolist()
+    df = df.copy()
+    for col in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = df[col].dt.strftime('%Y-%m-%d %H:%M:%S').where(df[col].notna(), None)
+    result_data = df.replace({np.nan: None}).to_dict(orient='records')
+    for row in result_data:
+        for k, v in row.items():
+            if hasattr(v, 'isoformat'):
+                row[k] = v.isoformat()
+    return json.dumps({"columns": columns, "rows": result_data}).encode('utf-8')
+
+
+def records_encode(df: pd.DataFrame) -> bytes:
+    return FrameSerializer.dumps({"columns": df.columns.tolist(), "rows": FrameSerializer.to_records(df)}).encode('utf-8')
+
+
+def columns_encode(df: pd.DataFrame) -> bytes:
+    return FrameSerializer.dumps({"columns": df.columns.tolist(), **FrameSerializer.to_columns(df)}).encode('utf-8')
+
+
+def measure(encode, df: pd.DataFrame) -> dict:
+    started = time.perf_counter()
+    body = encode(df)
+    elapsed = time.perf_counter() - started
+    return {"seconds": round(elapsed, 4), "rows_per_sec": int(len(df) / elapsed), "bytes": len(body)}
+
+
+def run(sizes) -> list:
+    results = []
+    for rows in sizes:
+        df = make_frame(rows)
+        for name, encode in (("legacy", legacy_encode), ("records", records_encode), ("columns", columns_encode)):
+            result = {"rows": rows, "encoder": name, **measure(encode, df)}
+            results.append(result)
+            print(f"{rows:>9} rows  {name:<8} {result['rows_per_sec']:>12,} rows/s  "
+                  f"{result['seconds']:>8.3f} s  {result['bytes'] / 1e6:>8.1f} MB")
+    return results
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    run(sizes)
@@ -0,0 +1,99 @@
+"""
+Deterministic local stand-in for LLMService.generate_transformation_code.
+
+Replies come from a script, so a run replays the same history every time: a prompt
+ending in a number ("bench step 17") gets script[17 % len(script)], any other prompt
+a stable hash of its text. Latency is configurable (time to first token plus the rest
+spread over the streamed explanation), with optional seeded jitter.
+
+    fake = FakeLLM(latency_ms=800, first_token_ms=300)
+    with patch('app.routes.excel.LLMService.generate_transformation_code', fake.generate_transformation_code):
+        ...
+"""
+import re
+import time
+import zlib
+import random
+import threading
+from typing import Iterator, List, Tuple
+
+# Commands that can be applied over and over to a make_shape() frame without emptying it
+# or breaking the next one, so histories of any length can be built by cycling them
+HISTORY_SCRIPT = [
+    {"intent": "DATA_MUTATION", "code": "df['amount'] = df['amount'] * 1.01",
+     "explanation": "Aumenté el importe un 1%."},
+    {"intent": "DATA_MUTATION", "code": "df['score'] = df['units'] * 2 + df['amount'].fillna(0)",
+     "explanation": "Calculé una columna de puntuación a partir de unidades e importe."},
+    {"intent": "DATA_MUTATION", "code": "df = df.sort_values('amount', ascending=False)",
+     "explanation": "Ordené las filas por importe de mayor a menor."},
+    {"intent": "DATA_MUTATION", "code": "df['region'] = df['region'].fillna('Unknown')",
+     "explanation": "Rellené las regiones vacías con 'Unknown'."},
+    {"intent": "DATA_MUTATION", "code": "df = df.drop(columns=['score'])",
+     "explanation": "Eliminé la columna de puntuación."},
+    {"intent": "DATA_MUTATION", "code": "df['amount'] = df['amount'].round(2)",
+     "explanation": "Redondeé el importe a dos decimales."},
+]
+
+CHART_CODE = "fig = px.bar(df.groupby('region', as_index=False)['amount'].sum(), x='region', y='amount')"
+
+_STEP = re.compile(r'(\d+)\s*$')
+
+
+class FakeLLM:
+
+    def __init__(self, script: List[dict] = None, latency_ms: float = 0.0, first_token_ms: float = None,
+                 tokens: int = 8, jitter: float = 0.0, seed: int = 0):
+        self.script = script or HISTORY_SCRIPT
+        self.latency_ms = latency_ms
+        self.first_token_ms = latency_ms if first_token_ms is None else min(first_token_ms, latency_ms)
+        self.tokens = max(tokens, 1)
+        self.jitter = jitter
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def reply(self, prompt: str) -> dict:
+        match = _STEP.search(prompt)
+        index = int(match.group(1)) if match else zlib.crc32(prompt.encode('utf-8'))
+        return dict(self.script[index % len(self.script)])
+
+    def answer(self, prompt: str) -> dict:
+        """reply() for one served request (counted in calls)."""
+        with self._lock:
+            self.calls += 1
+        return self.reply(prompt)
+
+    def seconds(self, ms: float) -> float:
+        """Seconds to sleep for ms, with this call's jitter (drawn under a lock: the generator is seeded)."""
+        if not self.jitter:
+            return ms / 1000
+        with self._lock:
+            factor = 1 + self._random.uniform(-self.jitter, self.jitter)
+        return max(ms * factor, 0.0) / 1000
+
+    def generate_transformation_code(self, prompt: str, columns: List[str], sample_data: dict = None,
+                                     dtypes: List[str] = None, use_cache: bool = True, stream: bool = False,
+                                     user_id=None, schema: str = None):
+        """Same contract as LLMService.generate_transformation_code, never cached."""
+        result = {**self.answer(prompt), "cached": False, "cache_key": None}
+        if stream:
+            return self._stream(result)
+        time.sleep(self.seconds(self.latency_ms))
+        return result
+
+    def timed_pieces(self, text: str) -> Iterator[str]:
+        """text in about `tokens` pieces paced like a model: the first after first_token_ms, the last at latency_ms."""
+        size = max(len(text) // self.tokens, 1)
+        pieces = [text[i:i + size] for i in range(0, len(text), size)] or ['']
+        time.sleep(self.seconds(self.first_token_ms))
+        gap = (self.latency_ms - self.first_token_ms) / max(len(pieces) - 1, 1)
+        for position, piece in enumerate(pieces):
+            if position:
+                time.sleep(self.seconds(gap))
+            yield piece
+
+    def _stream(self, result: dict) -> Iterator[Tuple[str, object]]:
+        for piece in self.timed_pieces(result.get('explanation') or ''):
+            if piece:
+                yield "token", piece
+        yield "result", result
@@ -0,0 +1,128 @@
+"""
+OpenAI-compatible chat completions server backed by FakeLLM, so the real LLMService
+(litellm, streaming parser, LLM cache) runs end to end without a provider.
+
+Point the app at it with:
+    LLM_MODEL=openai/datamind-stub
+    OPENAI_API_BASE=http://127.0.0.1:8999/v1
+    OPENAI_API_KEY=stub
+
+Usage (from Core/):
+    python -m benchmarks.llm_stub --port 8999 --latency-ms 1500 --first-token-ms 400 --jitter 0.3
+
+Serves POST /v1/chat/completions (plain and stream=true) and GET /v1/models. The reply
+is chosen from the last user message exactly as FakeLLM.reply does.
+"""
+import sys
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from benchmarks.fake_llm import FakeLLM
+
+MODEL = 'datamind-stub'
+
+
+def _handler(fake: FakeLLM):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass  # One line per completion would drown the load test output
+
+        def _json(self, status: int, body: dict) -> None:
+            payload = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            if self.path.rstrip('/').endswith('/models'):
+                self._json(200, {"object": "list", "data": [{"id": MODEL, "object": "model", "owned_by": "datamind"}]})
+            else:
+                self._json(404, {"error": {"message": "not found"}})
+
+        def do_POST(self):
+            if not self.path.rstrip('/').endswith('/chat/completions'):
+                self._json(404, {"error": {"message": "not found"}})
+                return
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+            prompt = next((m.get('content') or '' for m in reversed(request.get('messages', [])) if m.get('role') == 'user'), '')
+            reply = fake.answer(prompt)
+            content = json.dumps({key: reply[key] for key in ('intent', 'code', 'explanation')}, ensure_ascii=False)
+            completion_id = f"chatcmpl-stub-{fake.calls}"
+            created = int(time.time())
+            model = request.get('model', MODEL)
+
+            if not request.get('stream'):
+                time.sleep(fake.seconds(fake.latency_ms))
+                self._json(200, {
+                    "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                    "usage": {"prompt_tokens": len(prompt.split()), "completion_tokens": fake.tokens,
+                              "total_tokens": len(prompt.split()) + fake.tokens},
+                })
+                return
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+
+            def send(delta: dict, finish_reason=None):
+                chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                         "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+                self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode('utf-8'))
+                self.wfile.flush()
+
+            try:
+                for position, piece in enumerate(fake.timed_pieces(content)):
+                    send({"role": "assistant", "content": piece} if position == 0 else {"content": piece})
+                send({}, finish_reason='stop')
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # The client stops reading once the JSON is complete
+            self.close_connection = True
+
+    return Handler
+
+
+def start(port: int = 0, fake: FakeLLM = None, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+    """Serve in a daemon thread; the bound port is server.server_address[1]."""
+    server = ThreadingHTTPServer((host, port), _handler(fake or FakeLLM()))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='llm-stub', daemon=True).start()
+    return server
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8999)
+    parser.add_argument('--latency-ms', type=float, default=1000.0, help='total time per completion')
+    parser.add_argument('--first-token-ms', type=float, default=300.0)
+    parser.add_argument('--tokens', type=int, default=24, help='streamed chunks per completion')
+    parser.add_argument('--jitter', type=float, default=0.0, help='latency varies by up to this fraction')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    fake = FakeLLM(latency_ms=args.latency_ms, first_token_ms=args.first_token_ms, tokens=args.tokens,
+                   jitter=args.jitter, seed=args.seed)
+    server = ThreadingHTTPServer((args.host, args.port), _handler(fake))
+    server.daemon_threads = True
+    print(f"[LLM STUB] http://{args.host}:{server.server_address[1]}/v1 model=openai/{MODEL}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,399 @@
+"""
+End-to-end load test: how many concurrent analysts one backend instance serves before
+SSE latency collapses.
+
+Starts the app as a real HTTP server (SQLite in a scratch folder, migrations applied)
+with litellm pointed at benchmarks.llm_stub, then for each concurrency step runs that
+many virtual analysts for --duration seconds. Each one registers (/auth/register),
+uploads a synthetic workbook (/excel/upload) and then loops over a weighted mix of
+/excel/transform, /excel/undo, /excel/conversation/<id> and /excel/download/<id> with
+a think time between requests.
+
+Reported per step and endpoint: request count, error rate and p50/p95/p99 latency;
+for /transform also the time to the first SSE event and to the done event. A step
+breaks the SLO when the p95 time to first event exceeds --slo-ms or more than 1% of
+transforms fail; the run stops at the first such step unless --keep-going.
+
+Usage (from Core/):
+    python -m benchmarks.loadtest                                          # 1, 2, 4, 8, 16 analysts
+    python -m benchmarks.loadtest --concurrency 4 8 16 32 --duration 60 --llm-latency-ms 2500 --output load.json
+    python -m benchmarks.loadtest --server gunicorn --workers 4 --worker-class gthread --threads 8
+    python -m benchmarks.loadtest --base-url http://127.0.0.1:5000          # an app you started (and its LLM)
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import shutil
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List
+
+import requests
+
+from benchmarks.bench_memory import _CORE_DIR
+
+DEFAULT_MIX = 'transform=40,conversation=30,undo=10,download=20'
+
+
+def percentile(values: List[float], q: float):
+    """Nearest-rank percentile (q in 0..100); None for no values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(int(-(-q * len(ordered) // 100)), 1)  # ceil(q/100 * n)
+    return round(ordered[rank - 1], 1)
+
+
+def _latency(values: List[float]) -> dict:
+    return {"p50": percentile(values, 50), "p95": percentile(values, 95), "p99": percentile(values, 99),
+            "max": round(max(values), 1) if values else None}
+
+
+def parse_mix(text: str) -> Dict[str, int]:
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in ('transform', 'conversation', 'undo', 'download'):
+            raise argparse.ArgumentTypeError(f"unknown endpoint in mix: {name}")
+        mix[name.strip()] = int(weight)
+    return mix
+
+
+class Recorder:
+    """Samples from every virtual analyst, one dict per request."""
+
+    def __init__(self):
+        self.samples = []
+        self._lock = threading.Lock()
+
+    def add(self, endpoint: str, started: float, ok: bool, status: int = None, first_event_ms: float = None, error: str = None):
+        sample = {"endpoint": endpoint, "ms": (time.perf_counter() - started) * 1000, "ok": ok, "status": status}
+        if first_event_ms is not None:
+            sample["first_event_ms"] = first_event_ms
+        if error:
+            sample["error"] = error[:200]
+        with self._lock:
+            self.samples.append(sample)
+
+    def summary(self, duration: float) -> dict:
+        endpoints = {}
+        for name in sorted({s['endpoint'] for s in self.samples}):
+            samples = [s for s in self.samples if s['endpoint'] == name]
+            errors = [s for s in samples if not s['ok']]
+            endpoints[name] = {
+                "requests": len(samples),
+                "errors": len(errors),
+                "error_rate": round(len(errors) / len(samples), 4),
+                "latency_ms": _latency([s['ms'] for s in samples if s['ok']]),
+                "sample_errors": sorted({s.get('error') or f"HTTP {s['status']}" for s in errors})[:5],
+            }
+            if name == 'transform':
+                endpoints[name]["first_event_ms"] = _latency([s['first_event_ms'] for s in samples if 'first_event_ms' in s])
+        looped = [s for s in self.samples if s['endpoint'] not in ('register', 'upload')]
+        return {"requests": len(looped), "throughput_rps": round(len(looped) / duration, 2) if duration else None,
+                "endpoints": endpoints}
+
+
+class Analyst:
+    """One virtual user: its own account and conversation, driving the mix until the deadline."""
+
+    def __init__(self, base_url: str, workbook: bytes, mix: Dict[str, int], think_ms: float,
+                 recorder: Recorder, number: int, timeout: float, llm_cache: bool):
+        self.base_url = base_url.rstrip('/')
+        self.workbook = workbook
+        self.mix = mix
+        self.think_ms = think_ms
+        self.recorder = recorder
+        self.number = number
+        self.random = random.Random(number)
+        self.timeout = timeout
+        self.llm_cache = llm_cache
+        self.http = requests.Session()
+        self.session_id = None
+        # Commands applied so far. Undo steps back and the next transform re-sends the undone
+        # prompt, so the history is always a prefix of the FakeLLM script and every step applies
+        self.applied = 0
+
+    def _call(self, endpoint: str, method: str, path: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = self.http.request(method, self.base_url + path, timeout=self.timeout, **kwargs)
+            body = response.content  # Drained inside the measurement (downloads stream)
+        except requests.RequestException as e:
+            self.recorder.add(endpoint, started, False, error=type(e).__name__)
+            return None, None
+        ok = response.status_code < 400
+        self.recorder.add(endpoint, started, ok, response.status_code, error=None if ok else body[:200].decode('utf-8', 'replace'))
+        return response, body
+
+    def setup(self) -> bool:
+        email = f"load_{uuid.uuid4().hex[:12]}@example.com"
+        response, _ = self._call('register', 'POST', '/auth/register', json={'email': email, 'password': 'Password1!'})
+        if response is None or response.status_code >= 400:
+            return False
+        self.http.headers['Authorization'] = f"Bearer {response.json()['token']}"
+        response, _ = self._call('upload', 'POST', '/excel/upload',
+                                 files={'file': ('load.xlsx', self.workbook)})
+        if response is None or response.status_code >= 400:
+            return False
+        self.session_id = response.json()['session_id']
+        return True
+
+    def transform(self) -> None:
+        started = time.perf_counter()
+        first_event_ms = None
+        outcome = None
+        try:
+            # The analyst number keeps prompts (and LLM cache entries) apart between analysts
+            data = {'session_id': str(self.session_id), 'prompt': f'load analyst {self.number} step {self.applied}'}
+            if not self.llm_cache:
+                data['no_cache'] = '1'
+            with self.http.post(self.base_url + '/excel/transform', data=data, stream=True, timeout=self.timeout) as response:
+                if response.status_code >= 400:
+                    self.recorder.add('transform', started, False, response.status_code, error=response.text[:200])
+                    return
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line:
+                        continue
+                    if first_event_ms is None:
+                        first_event_ms = (time.perf_counter() - started) * 1000
+                    if line.startswith('event: '):
+                        outcome = line[len('event: '):]
+                    elif outcome in ('done', 'error'):
+                        break  # Its data line arrived: the request is over for the analyst
+        except requests.RequestException as e:
+            self.recorder.add('transform', started, False, first_event_ms=first_event_ms, error=type(e).__name__)
+            return
+        ok = outcome == 'done'
+        self.recorder.add('transform', started, ok, 200, first_event_ms=first_event_ms,
+                          error=None if ok else f"SSE {outcome or 'incomplete'}")
+        if ok:
+            self.applied += 1
+
+    def undo(self) -> None:
+        if not self.applied:
+            return self.transform()  # Nothing to undo yet: an analyst would try something first
+        response, _ = self._call('undo', 'POST', '/excel/undo', data={'session_id': str(self.session_id)})
+        if response is not None and response.status_code < 400:
+            self.applied -= 1
+
+    def conversation(self) -> None:
+        self._call('conversation', 'GET', f'/excel/conversation/{self.session_id}')
+
+    def download(self) -> None:
+        self._call('download', 'GET', f'/excel/download/{self.session_id}')
+
+    def run(self, deadline: float) -> None:
+        names, weights = zip(*self.mix.items())
+        while time.perf_counter() < deadline:
+            getattr(self, self.random.choices(names, weights)[0])()
+            if self.think_ms:
+                time.sleep(self.random.uniform(0.5, 1.5) * self.think_ms / 1000)
+
+
+def _parallel(calls) -> list:
+    results = [None] * len(calls)
+
+    def target(position, call):
+        results[position] = call()
+
+    threads = [threading.Thread(target=target, args=(position, call), daemon=True) for position, call in enumerate(calls)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def run_step(base_url: str, concurrency: int, first_number: int, workbook: bytes, args) -> dict:
+    recorder = Recorder()
+    analysts = [Analyst(base_url, workbook, args.mix, args.think_ms, recorder, first_number + position,
+                        args.timeout, not args.no_llm_cache) for position in range(concurrency)]
+    # Everyone signs up and uploads at once (measured, outside the timed window)
+    ready = [analyst for analyst, ok in zip(analysts, _parallel([a.setup for a in analysts])) if ok]
+
+    started = time.perf_counter()
+    deadline = started + args.duration
+    _parallel([lambda analyst=analyst: analyst.run(deadline) for analyst in ready])
+    elapsed = time.perf_counter() - started
+
+    step = {"concurrency": concurrency, "analysts_ready": len(ready), "duration_s": round(elapsed, 2),
+            **recorder.summary(elapsed)}
+    if ready:
+        try:
+            step["server_metrics"] = ready[0].http.get(f"{base_url.rstrip('/')}/excel/metrics", timeout=args.timeout).json().get('metrics')
+        except (requests.RequestException, ValueError):
+            pass
+
+    transform = step['endpoints'].get('transform')
+    first_event_p95 = transform['first_event_ms']['p95'] if transform else None
+    step["within_slo"] = bool(
+        len(ready) == concurrency and first_event_p95 is not None
+        and first_event_p95 <= args.slo_ms and transform['error_rate'] <= 0.01
+    )
+    return step
+
+
+def print_step(step: dict) -> None:
+    verdict = 'within SLO' if step['within_slo'] else 'SLO BROKEN'
+    print(f"=== {step['concurrency']} analysts ({step['analysts_ready']} ready): {step['requests']} requests in "
+          f"{step['duration_s']} s ({step['throughput_rps']} req/s), {verdict}")
+    print(f"{'endpoint':<14}{'requests':>9}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, endpoint in step['endpoints'].items():
+        latency = endpoint['latency_ms']
+        print(f"{name:<14}{endpoint['requests']:>9}{endpoint['errors']:>8}"
+              f"{latency['p50'] or 0:>10.1f}{latency['p95'] or 0:>10.1f}{latency['p99'] or 0:>10.1f}")
+        if 'first_event_ms' in endpoint:
+            first = endpoint['first_event_ms']
+            print(f"{'  first event':<31}{first['p50'] or 0:>10.1f}{first['p95'] or 0:>10.1f}{first['p99'] or 0:>10.1f}")
+        for error in endpoint['sample_errors']:
+            print(f"    error: {error}")
+
+
+def _free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def _wait_for(port: int, process: subprocess.Popen, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"App server exited with code {process.returncode}")
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("App server did not start listening in time")
+
+
+@contextmanager
+def local_stack(args):
+    """LLM stub + migrated SQLite database + app server in a scratch folder; yields the app URL."""
+    from benchmarks import llm_stub
+    from benchmarks.fake_llm import FakeLLM
+
+    workdir = tempfile.mkdtemp(prefix='datamind-load-')
+    stub = llm_stub.start(0, FakeLLM(latency_ms=args.llm_latency_ms, first_token_ms=args.llm_first_token_ms,
+                                     tokens=24, jitter=args.llm_jitter, seed=args.seed))
+    env = {
+        **os.environ,
+        'PYTHONPATH': os.pathsep.join(filter(None, [_CORE_DIR, os.environ.get('PYTHONPATH')])),
+        'DATABASE_URL': f"sqlite:///{os.path.join(workdir, 'load.db')}",
+        'LLM_MODEL': f'openai/{llm_stub.MODEL}',
+        'OPENAI_API_BASE': f"http://127.0.0.1:{stub.server_address[1]}/v1",
+        'OPENAI_API_KEY': 'stub',
+        'JWT_SECRET_KEY': 'load-test-secret',
+        'LITELLM_LOCAL_MODEL_COST_MAP': 'True',  # No network fetch at import
+    }
+    port = _free_port()
+    if args.server == 'gunicorn':
+        command = [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}', '--workers', str(args.workers),
+                   '--worker-class', args.worker_class, '--threads', str(args.threads), '--timeout', '300',
+                   '--pythonpath', _CORE_DIR, 'run:app']
+    else:
+        command = [sys.executable, '-m', 'benchmarks.loadtest', '--serve-port', str(port)]
+
+    log_path = os.path.join(workdir, 'server.log')
+    process = None
+    with open(log_path, 'w') as log:
+        try:
+            subprocess.run([sys.executable, os.path.join(_CORE_DIR, 'migrate.py')], cwd=workdir, env=env,
+                           stdout=log, stderr=subprocess.STDOUT, check=True)
+            process = subprocess.Popen(command, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+            _wait_for(port, process)
+            print(f"[LOAD] {args.server} app on :{port}, LLM stub on :{stub.server_address[1]}, logs in {log_path}")
+            yield f"http://127.0.0.1:{port}"
+        finally:
+            if process is not None:
+                process.terminate()
+                try:
+                    process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+            stub.shutdown()
+            if not args.keep_workdir:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+
+def serve(port: int) -> int:
+    """The app on Werkzeug's threaded server (one process, a thread per request)."""
+    from app import create_app
+    create_app().run(host='127.0.0.1', port=port, threaded=True, use_reloader=False)
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds per concurrency step')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX), help=f'default: {DEFAULT_MIX}')
+    parser.add_argument('--think-ms', type=float, default=500.0, help='mean pause between an analyst\'s requests')
+    parser.add_argument('--slo-ms', type=float, default=2000.0, help='p95 time to first SSE event')
+    parser.add_argument('--keep-going', action='store_true', help='run every step even after the SLO breaks')
+    parser.add_argument('--timeout', type=float, default=120.0)
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--columns', type=int, default=12)
+    parser.add_argument('--no-llm-cache', action='store_true', help='send no_cache=1 with every transform')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write results as JSON')
+    parser.add_argument('--base-url', help='target a running app instead of starting one (no stub either)')
+    parser.add_argument('--server', choices=['werkzeug', 'gunicorn'], default='werkzeug')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--worker-class', default='gthread', help='gunicorn worker class (production uses gevent)')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--llm-latency-ms', type=float, default=1500.0)
+    parser.add_argument('--llm-first-token-ms', type=float, default=400.0)
+    parser.add_argument('--llm-jitter', type=float, default=0.3)
+    parser.add_argument('--keep-workdir', action='store_true', help='keep the scratch database and server log')
+    parser.add_argument('--serve-port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.serve_port:
+        return serve(args.serve_port)
+
+    from benchmarks.bench_pipeline import _environment
+    from benchmarks.workbook import make_workbook
+
+    workbook = make_workbook(args.rows, args.columns, seed=args.seed)
+    report = {
+        "environment": _environment(),
+        "parameters": {key: value for key, value in vars(args).items() if key not in ('serve_port', 'output')},
+        "steps": [],
+    }
+
+    stack = local_stack(args) if not args.base_url else nullcontext(args.base_url)
+    number = args.seed * 100_000
+    with stack as base_url:
+        # Unrecorded first transform: the server's first LLM call pays litellm's client setup
+        warmup = Analyst(base_url, workbook, args.mix, 0, Recorder(), number - 1, args.timeout, True)
+        if warmup.setup():
+            warmup.transform()
+        for concurrency in args.concurrency:
+            step = run_step(base_url, concurrency, number, workbook, args)
+            number += concurrency
+            report["steps"].append(step)
+            print_step(step)
+            if not step['within_slo'] and not args.keep_going:
+                break
+
+    within = [step['concurrency'] for step in report['steps'] if step['within_slo']]
+    report["max_concurrency_within_slo"] = max(within) if within else None
+    print(f"Max concurrency within SLO (p95 first event <= {args.slo_ms:.0f} ms): {report['max_concurrency_within_slo']}")
+    if args.output:
+        with open(os.path.join(_CORE_DIR, args.output) if not os.path.isabs(args.output) else args.output, 'w') as out:
+            json.dump(report, out, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
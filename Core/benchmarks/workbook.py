@@ -0,0 +1,91 @@
+"""
+Synthetic workbooks of configurable shape for the benchmarks and the load test.
+
+The first columns always follow bench_serializer.make_frame (id, region, amount, units,
+active, created) so scripted commands can rely on them; --columns beyond that cycles
+through --kinds (default: float, int, text, datetime, bool, mixed). A mixed column holds
+numbers, text and blanks in one column, the way hand-edited sheets do. --formulas adds
+that many formula columns (=C2*2, ...) at the right; they have no cached values, as
+in a workbook saved by a script.
+
+Usage (from Core/):
+    python -m benchmarks.workbook --rows 100000 --columns 20 --formulas 2 --output big.xlsx
+    python -m benchmarks.workbook --rows 5000 --columns 12 --kinds datetime mixed --output messy.xlsx
+"""
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Tuple
+from app.services.export_service import ExportService
+from app.services.formula_overlay import FormulaOverlay
+from benchmarks.bench_serializer import make_frame
+
+EXTRA_KINDS = ['float', 'int', 'text', 'datetime', 'bool', 'mixed']
+
+
+def _column(kind: str, rows: int, rng: np.random.Generator) -> pd.Series:
+    if kind == 'float':
+        values = rng.normal(0, 1000, rows).round(2)
+        values[rng.random(rows) < 0.05] = np.nan
+        return pd.Series(values)
+    if kind == 'int':
+        return pd.Series(rng.integers(-1000, 1000, rows))
+    if kind == 'text':
+        return pd.Series(rng.choice(['alpha', 'beta', 'gamma', 'delta', 'epsilon', None], rows))
+    if kind == 'datetime':
+        when = pd.Series(pd.Timestamp('2021-06-01') + pd.to_timedelta(rng.integers(0, 86400 * 365, rows), unit='s'))
+        when[rng.random(rows) < 0.02] = pd.NaT
+        return when
+    if kind == 'bool':
+        return pd.Series(rng.random(rows) < 0.3)
+    if kind == 'mixed':
+        numbers = rng.integers(0, 100, rows).astype(object)
+        words = rng.choice(['n/a', 'pending', 'TBD'], rows).astype(object)
+        pick = rng.random(rows)
+        return pd.Series(np.where(pick < 0.7, numbers, np.where(pick < 0.9, words, None)), dtype=object)
+    raise ValueError(f"Unknown column kind: {kind}")
+
+
+def make_shape(rows: int, columns: int = 6, formulas: int = 0, seed: int = 0,
+               kinds: List[str] = None) -> Tuple[pd.DataFrame, Dict[str, str]]:
+    """(frame, overlay) for a workbook of the given shape; overlay holds the formula cells."""
+    df = make_frame(rows, seed)
+    rng = np.random.default_rng(seed + 1)
+    kinds = kinds or EXTRA_KINDS
+    for position in range(max(columns - df.shape[1], 0)):
+        kind = kinds[position % len(kinds)]
+        df[f'{kind}_{position + 1}'] = _column(kind, rows, rng)
+    df = df.iloc[:, :max(columns, 1)]
+
+    overlay = {}
+    amount = FormulaOverlay.column_letter(df.columns.get_loc('amount')) if 'amount' in df.columns else 'A'
+    for position in range(formulas):
+        letter = FormulaOverlay.column_letter(df.shape[1])
+        df[f'formula_{position + 1}'] = pd.Series([None] * rows, dtype=object)  # Header only
+        for row in range(2, rows + 2):
+            overlay[f'{letter}{row}'] = f'={amount}{row}*{position + 2}'
+    return df, overlay
+
+
+def make_workbook(rows: int, columns: int = 6, formulas: int = 0, seed: int = 0, kinds: List[str] = None) -> bytes:
+    """The same shape as an .xlsx file, written with the streaming exporter (fast at any size)."""
+    return b''.join(ExportService.xlsx_chunks(*make_shape(rows, columns, formulas, seed, kinds)))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10_000)
+    parser.add_argument('--columns', type=int, default=6)
+    parser.add_argument('--formulas', type=int, default=0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--kinds', nargs='+', choices=EXTRA_KINDS, help='kinds of the columns after the first six')
+    parser.add_argument('--output', required=True)
+    args = parser.parse_args(argv)
+    with open(args.output, 'wb') as out:
+        out.write(make_workbook(args.rows, args.columns, args.formulas, args.seed, args.kinds))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
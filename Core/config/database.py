@@ -5,6 +5,8 @@ from dotenv import load_dotenv
 # before create_app() has a chance to call load_dotenv()
 load_dotenv()
 
+from contextlib import contextmanager
+from flask import g, has_app_context
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 
@@ -27,3 +29,38 @@ engine = create_engine(DATABASE_URL, **_engine_kwargs)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
+
+
+@contextmanager
+def db_session():
+    """
+    Unit of work. Inside a Flask app context every caller shares one session (one
+    connection) for the whole request, closed by close_db_session at teardown; objects
+    stay usable after commit so a request never re-reads what it already loaded.
+    Outside a request (jobs, scripts) each block gets its own short-lived session.
+    """
+    if has_app_context():
+        session = g.get('db_session')
+        if session is None:
+            session = g.db_session = SessionLocal(expire_on_commit=False)
+        try:
+            yield session
+        except Exception:
+            session.rollback()
+            raise
+        return
+
+    session = SessionLocal()
+    try:
+        yield session
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def close_db_session(exception=None):
+    session = g.pop('db_session', None)
+    if session is not None:
+        session.close()
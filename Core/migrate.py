@@ -0,0 +1,47 @@
+"""
+Apply schema migrations (Core/migrations/) to the database in DATABASE_URL.
+
+Usage (from Core/):
+    python migrate.py                      # apply every pending migration
+    python migrate.py status               # list applied / pending versions
+    python migrate.py upgrade --target 0003
+    python migrate.py resync-heads         # recompute conversations.head_command_id / active_chart_command_id
+
+Rolling out without downtime: run `python migrate.py` while the current release is still
+serving (columns are added nullable and indexes are built online), deploy, then run
+`python migrate.py resync-heads` once the old workers are gone so conversations they
+modified after the backfill get their denormalized heads recomputed.
+"""
+import sys
+import argparse
+import importlib
+import migrations
+from config.database import engine
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', nargs='?', default='upgrade', choices=['upgrade', 'status', 'resync-heads'])
+    parser.add_argument('--target', help='stop after this version (e.g. 0003)')
+    args = parser.parse_args(argv)
+
+    if args.command == 'status':
+        done = set(migrations.applied(engine))
+        for version, module_name in migrations.available():
+            print(f"{'applied' if version in done else 'pending'}  {module_name}")
+        return 0
+
+    if args.command == 'resync-heads':
+        heads = importlib.import_module('migrations.0004_conversation_heads')
+        with engine.connect() as connection:
+            batches = heads.resync(connection)
+        print(f"Resynced conversation heads in {batches} batch(es)")
+        return 0
+
+    ran = migrations.upgrade(engine, target=args.target)
+    print(f"Applied {len(ran)} migration(s)" + (f": {', '.join(ran)}" if ran else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,8 @@
+"""Create any missing table from the models (existing tables are left untouched)."""
+from config.database import Base
+import app.models  # noqa: F401  (registers every table on Base.metadata)
+
+
+def upgrade(connection):
+    Base.metadata.create_all(connection, checkfirst=True)
+    connection.commit()
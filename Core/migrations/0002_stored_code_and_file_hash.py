@@ -0,0 +1,9 @@
+"""Add commands.code_hash / commands.compiled_code and conversations.file_hash."""
+from app.models import Command, Conversation
+from migrations import add_column
+
+
+def upgrade(connection):
+    add_column(connection, Command.__table__.c.code_hash)
+    add_column(connection, Command.__table__.c.compiled_code)
+    add_column(connection, Conversation.__table__.c.file_hash)
@@ -0,0 +1,10 @@
+"""Composite indexes for the active-history, user listing and TTL cleanup queries."""
+from app.models import Command, Conversation
+from migrations import create_index
+
+
+def upgrade(connection):
+    for table in (Command.__table__, Conversation.__table__):
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            if index.name.startswith('ix_commands_') or index.name.startswith('ix_conversations_'):
+                create_index(connection, index)
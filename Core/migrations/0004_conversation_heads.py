@@ -0,0 +1,28 @@
+"""Add and backfill conversations.head_command_id / active_chart_command_id."""
+from app.models import Conversation
+from migrations import add_column, backfill
+
+RESYNC_HEADS = """
+    UPDATE conversations SET
+        head_command_id = (
+            SELECT MAX(c.id) FROM commands c
+            WHERE c.conversation_id = conversations.id AND c.is_active = :active
+        ),
+        active_chart_command_id = (
+            SELECT MAX(c.id) FROM commands c
+            WHERE c.conversation_id = conversations.id AND c.is_active = :active
+              AND c.chart_generated_code IS NOT NULL
+        )
+    WHERE id BETWEEN :low AND :high
+"""
+
+
+def resync(connection) -> int:
+    """Recompute both heads from commands; safe to run at any time (python migrate.py resync-heads)."""
+    return backfill(connection, 'conversations', RESYNC_HEADS, active=True)
+
+
+def upgrade(connection):
+    add_column(connection, Conversation.__table__.c.head_command_id)
+    add_column(connection, Conversation.__table__.c.active_chart_command_id)
+    resync(connection)
@@ -0,0 +1,11 @@
+"""Add per-command request metrics (llm_ms, exec_ms, rows_in, rows_out, payload_bytes)."""
+from app.models import Command
+from migrations import add_column
+
+METRIC_COLUMNS = ('llm_ms', 'exec_ms', 'rows_in', 'rows_out', 'payload_bytes')
+
+
+def upgrade(connection):
+    # Older commands keep nulls: the metrics were never measured
+    for name in METRIC_COLUMNS:
+        add_column(connection, Command.__table__.c[name])
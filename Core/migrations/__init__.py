@@ -0,0 +1,130 @@
+"""
+Versioned schema migrations.
+
+Each module in this package named NNNN_description.py defines upgrade(connection) and
+runs once, in order; applied versions are recorded in the schema_migrations table.
+Every operation is idempotent (columns and indexes already present are skipped) so a
+database created by Base.metadata.create_all can be adopted as-is, and changes are
+written to roll out while the old code keeps serving:
+
+  - columns are added nullable (MySQL: ALGORITHM=INSTANT, falling back to INPLACE),
+  - indexes are built online (MySQL: ALGORITHM=INPLACE, LOCK=NONE),
+  - backfills run in short batches, one transaction each.
+
+Run them with `python migrate.py` (see migrate.py).
+"""
+import os
+import re
+import importlib
+from datetime import datetime
+from typing import Callable, List, Tuple
+from sqlalchemy import Column, DateTime, MetaData, String, Table, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+
+BACKFILL_BATCH_SIZE = int(os.getenv('MIGRATION_BATCH_SIZE', '1000'))
+
+_MIGRATION_FILE = re.compile(r'^(\d{4})_(\w+)\.py$')
+
+_metadata = MetaData()
+schema_migrations = Table(
+    'schema_migrations', _metadata,
+    Column('version', String(64), primary_key=True),
+    Column('applied_at', DateTime(), nullable=False),
+)
+
+
+def available() -> List[Tuple[str, str]]:
+    """(version, module name) for every migration in this package, oldest first."""
+    folder = os.path.dirname(os.path.abspath(__file__))
+    found = []
+    for name in sorted(os.listdir(folder)):
+        match = _MIGRATION_FILE.match(name)
+        if match:
+            found.append((match.group(1), name[:-3]))
+    return found
+
+
+def applied(engine: Engine) -> List[str]:
+    with engine.begin() as connection:
+        schema_migrations.create(connection, checkfirst=True)
+        return [row.version for row in connection.execute(select(schema_migrations.c.version))]
+
+
+def upgrade(engine: Engine, target: str = None, log: Callable[[str], None] = print) -> List[str]:
+    """Apply pending migrations up to target (inclusive); returns the versions applied."""
+    done = set(applied(engine))
+    ran = []
+    for version, module_name in available():
+        if target is not None and version > target:
+            break
+        if version in done:
+            continue
+        module = importlib.import_module(f'{__name__}.{module_name}')
+        summary = (module.__doc__ or '').strip().splitlines()
+        log(f"[MIGRATE] {module_name}: {summary[0] if summary else ''}")
+        with engine.connect() as connection:
+            module.upgrade(connection)
+            connection.execute(schema_migrations.insert().values(version=version, applied_at=datetime.utcnow()))
+            connection.commit()
+        ran.append(version)
+    return ran
+
+
+# --- operations ------------------------------------------------------------------
+
+def _is_mysql(connection: Connection) -> bool:
+    return connection.dialect.name in ('mysql', 'mariadb')
+
+
+def add_column(connection: Connection, column: Column) -> bool:
+    """Add a model column to its existing table (nullable, online); False if already there."""
+    table = column.table.name
+    if column.name in {c['name'] for c in inspect(connection).get_columns(table)}:
+        return False
+    ddl = (f"ALTER TABLE {table} ADD COLUMN {column.name} "
+           f"{column.type.compile(dialect=connection.dialect)} NULL")
+    if _is_mysql(connection):
+        try:
+            connection.execute(text(ddl + ", ALGORITHM=INSTANT"))
+        except Exception:
+            connection.rollback()
+            connection.execute(text(ddl + ", ALGORITHM=INPLACE, LOCK=NONE"))
+    else:
+        connection.execute(text(ddl))
+    connection.commit()
+    return True
+
+
+def create_index(connection: Connection, index) -> bool:
+    """Build a model Index without blocking writes; False if an index of that name exists."""
+    table = index.table.name
+    if index.name in {i['name'] for i in inspect(connection).get_indexes(table)}:
+        return False
+    columns = ', '.join(column.name for column in index.columns)
+    ddl = f"CREATE INDEX {index.name} ON {table} ({columns})"
+    if _is_mysql(connection):
+        ddl += " ALGORITHM=INPLACE LOCK=NONE"
+    connection.execute(text(ddl))
+    connection.commit()
+    return True
+
+
+def backfill(connection: Connection, table: str, statement: str, **params) -> int:
+    """
+    Run an UPDATE over table in primary-key ranges of BACKFILL_BATCH_SIZE, committing
+    after each range so no lock is held for long. statement must filter on
+    'id BETWEEN :low AND :high'. Returns the number of batches.
+    """
+    bounds = connection.execute(text(f"SELECT MIN(id), MAX(id) FROM {table}")).first()
+    connection.commit()
+    if bounds is None or bounds[0] is None:
+        return 0
+    low, last = bounds
+    batches = 0
+    while low <= last:
+        high = low + BACKFILL_BATCH_SIZE - 1
+        connection.execute(text(statement), {'low': low, 'high': high, **params})
+        connection.commit()
+        batches += 1
+        low = high + 1
+    return batches
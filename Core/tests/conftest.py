@@ -1,9 +1,16 @@
 import pytest
 import os
 import sys
+import tempfile
 
 # Point to SQLite BEFORE importing any app module so database.py picks it up
 os.environ['DATABASE_URL'] = 'sqlite:///:memory:'
+# Run generated code in-process; test_sandbox_pool.py exercises the worker pool directly
+os.environ.setdefault('SANDBOX_ENABLED', '0')
+# The in-memory database restarts ids every run; keep rendered exports and replay checkpoints
+# from older runs out of reach
+os.environ.setdefault('EXPORT_CACHE_FOLDER', tempfile.mkdtemp(prefix='datamind-exports-'))
+os.environ.setdefault('SNAPSHOT_FOLDER', tempfile.mkdtemp(prefix='datamind-snapshots-'))
 
 # Add Core/ to sys.path so that 'from app import ...' and 'from config import ...' work
 _core_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -0,0 +1,103 @@
+"""
+Tests for Arrow IPC grid responses (Accept: application/vnd.apache.arrow.stream).
+"""
+import io
+import json
+import openpyxl
+import pandas as pd
+import pyarrow as pa
+from unittest.mock import patch
+from uuid import uuid4
+
+from app.services.frame_serializer import FrameSerializer, ARROW_MIMETYPE
+
+ARROW_HEADERS = {'Accept': ARROW_MIMETYPE}
+
+
+def _read_stream(body: bytes) -> pd.DataFrame:
+    return pa.ipc.open_stream(pa.py_buffer(body)).read_all().to_pandas()
+
+
+def test_arrow_roundtrip_with_mixed_column():
+    df = pd.DataFrame({'n': [1.5, None, 3.0], 'mixed': [1, 'x', None]})
+    result = _read_stream(FrameSerializer.to_arrow_ipc(df))
+
+    assert result['n'].isna().tolist() == [False, True, False]
+    assert result['mixed'].tolist() == ['1', 'x', None]
+
+
+def _token(client):
+    email = f"arrow_{uuid4().hex[:8]}@example.com"
+    client.post('/auth/register', json={'email': email, 'password': 'Password1!'})
+    return client.post('/auth/login', json={'email': email, 'password': 'Password1!'}).get_json()['token']
+
+
+def _xlsx():
+    wb = openpyxl.Workbook()
+    wb.active.append(['Name', 'Value'])
+    for i in range(5):
+        wb.active.append([f'n{i}', i * 10])
+    buf = io.BytesIO()
+    wb.save(buf)
+    buf.seek(0)
+    return buf
+
+
+def test_upload_negotiates_arrow(client):
+    token = _token(client)
+    resp = client.post(
+        '/excel/upload',
+        data={'file': (_xlsx(), 'test.xlsx')},
+        headers={'Authorization': f'Bearer {token}', **ARROW_HEADERS},
+        content_type='multipart/form-data'
+    )
+    assert resp.status_code == 200, resp.data
+    assert resp.mimetype == ARROW_MIMETYPE
+    assert resp.headers['X-Total-Rows'] == '5'
+    assert resp.headers['X-Session-Id']
+    assert _read_stream(resp.data)['Value'].tolist() == [0, 10, 20, 30, 40]
+
+
+def test_json_remains_default(client):
+    token = _token(client)
+    resp = client.post(
+        '/excel/upload',
+        data={'file': (_xlsx(), 'test.xlsx')},
+        headers={'Authorization': f'Bearer {token}', 'Accept': '*/*'},
+        content_type='multipart/form-data'
+    )
+    assert resp.status_code == 200
+    assert resp.is_json
+
+
+def test_transform_done_references_rows_endpoint(client):
+    token = _token(client)
+    resp = client.post(
+        '/excel/upload',
+        data={'file': (_xlsx(), 'test.xlsx')},
+        headers={'Authorization': f'Bearer {token}'},
+        content_type='multipart/form-data'
+    )
+    session_id = resp.get_json()['session_id']
+
+    mock_return = {'code': "df['Value'] = df['Value'] + 1", 'explanation': 'Incremented.', 'intent': 'DATA_MUTATION'}
+    with patch('app.routes.excel.LLMService.generate_transformation_code', return_value=mock_return):
+        resp = client.post(
+            '/excel/transform',
+            data={'session_id': str(session_id), 'prompt': 'increment'},
+            headers={'Authorization': f'Bearer {token}', **ARROW_HEADERS},
+        )
+        raw = resp.data.decode('utf-8')
+
+    done = [b for b in raw.split('\n\n') if b.startswith('event: done')][0]
+    payload = json.loads(done.split('data: ', 1)[1])
+    assert payload['data'] is None
+    assert payload['data_ref']['url'] == f'/excel/conversation/{session_id}/rows'
+
+    resp = client.get(
+        payload['data_ref']['url'] + '?offset=3&limit=2',
+        headers={'Authorization': f'Bearer {token}', **ARROW_HEADERS},
+    )
+    assert resp.mimetype == ARROW_MIMETYPE
+    assert resp.headers['X-Offset'] == '3'
+    assert _read_stream(resp.data)['Value'].tolist() == [31, 41]
@@ -0,0 +1,86 @@
+"""
+Tests for the benchmark helpers: synthetic workbooks load with the requested shape and
+the fake LLM replays the same history on every run.
+"""
+import io
+import time
+import pandas as pd
+
+from benchmarks.fake_llm import FakeLLM, HISTORY_SCRIPT
+from benchmarks.workbook import make_shape, make_workbook
+from app.services.code_execution_service import CodeExecutionService
+
+
+def test_workbook_shape_round_trips():
+    df = pd.read_excel(io.BytesIO(make_workbook(50, columns=12, formulas=2)))
+
+    assert len(df) == 50
+    assert df.columns[:6].tolist() == ['id', 'region', 'amount', 'units', 'active', 'created']
+    assert df.columns[-2:].tolist() == ['formula_1', 'formula_2']
+    assert df.shape[1] == 14
+    assert pd.api.types.is_datetime64_any_dtype(df['created'])
+
+
+def test_workbook_kinds_and_formulas():
+    df, overlay = make_shape(20, columns=8, formulas=1, kinds=['mixed'])
+    assert ['mixed_1', 'mixed_2'] == df.columns[6:8].tolist()
+    assert {type(v) for v in df['mixed_1'].dropna()} <= {int, str}
+    assert overlay['I2'] == '=C2*2' and len(overlay) == 20
+
+
+def test_script_replays_to_any_length():
+    df, _ = make_shape(200)
+    for step in range(2 * len(HISTORY_SCRIPT)):
+        code = FakeLLM().reply(f'bench step {step}')['code']
+        df = CodeExecutionService.execute_transformation(df, code)
+    assert len(df) == 200 and 'score' not in df.columns
+
+
+def test_fake_llm_is_deterministic_and_streams():
+    fake = FakeLLM(latency_ms=60, first_token_ms=20, tokens=4)
+    assert fake.reply('free text prompt') == FakeLLM().reply('free text prompt')
+
+    started = time.perf_counter()
+    events = list(fake.generate_transformation_code('bench step 2', ['a'], stream=True))
+    elapsed = time.perf_counter() - started
+
+    tokens = [value for event, value in events if event == 'token']
+    assert ''.join(tokens) == HISTORY_SCRIPT[2]['explanation'] and len(tokens) >= 4
+    assert events[-1][0] == 'result' and events[-1][1]['code'] == HISTORY_SCRIPT[2]['code']
+    assert 0.06 <= elapsed < 1
+    assert fake.calls == 1
+
+
+def test_stub_serves_llm_service_end_to_end(monkeypatch):
+    from benchmarks import llm_stub
+    from app.services.llm_service import LLMService
+
+    server = llm_stub.start(0, FakeLLM(latency_ms=30, first_token_ms=10, tokens=6))
+    try:
+        monkeypatch.setenv('LLM_MODEL', f'openai/{llm_stub.MODEL}')
+        monkeypatch.setenv('OPENAI_API_BASE', f'http://127.0.0.1:{server.server_address[1]}/v1')
+        monkeypatch.setenv('OPENAI_API_KEY', 'stub')
+
+        plain = LLMService.generate_transformation_code('bench step 0', ['amount'], use_cache=False)
+        events = list(LLMService.generate_transformation_code('bench step 3', ['amount'], use_cache=False, stream=True))
+    finally:
+        server.shutdown()
+
+    assert plain['code'] == HISTORY_SCRIPT[0]['code']
+    assert ''.join(value for event, value in events if event == 'token') == HISTORY_SCRIPT[3]['explanation']
+    assert events[-1][1]['code'] == HISTORY_SCRIPT[3]['code']
+
+
+def test_load_report_percentiles():
+    from benchmarks.loadtest import parse_mix, percentile
+    values = list(range(1, 101))
+    assert (percentile(values, 50), percentile(values, 95), percentile(values, 99)) == (50, 95, 99)
+    assert percentile([7.0], 99) == 7.0 and percentile([], 50) is None
+    assert parse_mix('transform=3,undo=1') == {'transform': 3, 'undo': 1}
+
+
+def test_prompt_benchmark_counts_tokens_both_ways():
+    from benchmarks.bench_prompt import measure
+    result = measure(rows=50, columns=300, prompt='round amount', budget=400, model='gpt-4o')
+    assert result["tokens_after"] < result["tokens_before"] / 2
+    assert result["reduction"] > 0.5 and 0 < result["columns_detailed"] < 300
@@ -0,0 +1,134 @@
+"""
+Tests for AST validation and the compile-once code cache (CodeValidator + CodeExecutionService).
+"""
+import importlib.util
+import pytest
+import pandas as pd
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from app.services.code_validator import CodeValidator
+from app.services.code_execution_service import CodeExecutionService
+
+
+@pytest.mark.parametrize("code", [
+    "df['total'] = df.os_name.str.len()",        # attribute column access that the old substring scan rejected
+    "df = df[df['a'] > 1].sort_values('a')",
+    "df['b'] = [x * 2 for x in df['a']]",
+    "df['c'] = df['a'].apply(lambda v: v if v > 1 else 0)",
+    "df['r'] = np.random.rand(len(df)) + np.where(df['a'] > 1, 1, 0)",
+    "df = df.query('a > 1')",
+    "df['d'] = pd.to_datetime(df['a']) + pd.offsets.Day(1)",
+])
+def test_legitimate_code_passes(code):
+    CodeValidator.validate(code)
+
+
+@pytest.mark.parametrize("code", [
+    "import os",
+    "from os import system",
+    "df.__class__.__subclasses__()",
+    "__import__('os')",
+    "def f():\n    pass",
+    "while True:\n    pass",
+    "df.to_csv('/tmp/leak.csv')",
+    "df = pd.read_csv('/etc/passwd')",
+    "getattr(df, 'to_csv')('/tmp/x')",
+    "df['x'] = pd.io.common.os.popen('id').read()",
+    "df['x'] = pd.core.frame",
+    "df['x'] = np.lib.format",
+    "m = pd",
+    "df['x'] = [m for m in [np]]",
+    "df['x'] = df.eval('@pd.io.common.os.getpid()')",
+    "df = df.query(df.columns[0] + ' > 1')",
+    "df['x'] = pd.eval('1 + 1')",
+])
+def test_dangerous_code_rejected(code):
+    with pytest.raises(ValueError, match="Forbidden pattern"):
+        CodeValidator.validate(code)
+
+
+@pytest.mark.parametrize("code", [
+    "df['l'] = np.fromregex('/etc/passwd', r'(.*)', [('l', 'U200')])['l']",
+    "df['l'] = np.fromfile('/etc/hostname', dtype='u1')[:len(df)]",
+    "df['l'] = np.loadtxt('/etc/hostname', dtype=str)",
+    "df['l'] = np.genfromtxt('/etc/hostname', dtype=str)",
+    "df['l'] = np.load('/tmp/data.npy')[:len(df)]",
+    "df = pd.ExcelFile('/tmp/other.xlsx').parse()",
+    "df = pd.HDFStore('/tmp/store.h5').select('df')",
+    "df = pd.read_csv('/etc/passwd', sep=':')",
+    "df = pd.read_pickle('/tmp/payload.pkl')",
+    "df['x'] = np.lib.npyio.loadtxt('/etc/hostname')",
+    "df['x'] = pd.io.parsers.read_csv('/etc/passwd')",
+])
+def test_file_readers_are_not_allowed(code):
+    with pytest.raises(ValueError, match="Forbidden pattern"):
+        CodeValidator.validate(code)
+
+
+def test_module_escape_does_not_execute():
+    """Regression: public attribute chains used to reach os through pandas' own modules."""
+    df = pd.DataFrame({'x': [1, 2]})
+    with pytest.raises(ValueError, match="Forbidden pattern"):
+        CodeExecutionService.execute_transformation(df, "df['x'] = pd.io.common.os.popen('id').read()")
+
+
+def test_chart_code_is_validated():
+    df = pd.DataFrame({'x': [1, 2], 'y': [3, 4]})
+    assert CodeExecutionService.run_chart_generation(df, "fig = px.bar(df, x='x', y=[v * 2 for v in range(len(df))])")
+    assert CodeExecutionService.run_chart_generation(
+        df, "fig = px.bar(df, x='x', y='y', color_discrete_sequence=px.colors.qualitative.Plotly)\n"
+            "fig.update_layout(xaxis=go.layout.XAxis(title='x'))")
+    for code in ("import os\nfig = px.bar(df)", "fig = px.bar(df)\nfig.write_html('/tmp/leak.html')",
+                 "fig = px.bar(df, x='x', y='y', title=str(pd.io.common.os.getpid()))"):
+        with pytest.raises(ValueError, match="Forbidden pattern"):
+            CodeExecutionService.execute_chart_generation(df, code)
+    with pytest.raises(ValueError, match="Forbidden pattern"):  # Workers validate too
+        CodeExecutionService.run_chart_generation(df, "fig = px.bar(df, x='x', y='y', title=open('/etc/hostname').read())")
+
+
+def test_compile_once_per_content_hash():
+    code = "df['a'] = df['a'] + 41"
+    df = pd.DataFrame({'a': [1]})
+    with patch.object(CodeValidator, 'validate', wraps=CodeValidator.validate) as spy:
+        first = CodeExecutionService.compile_transformation(code)
+        second = CodeExecutionService.compile_transformation(code)
+        CodeExecutionService.execute_transformation(df, code)
+    assert first is second
+    assert spy.call_count <= 1, "Source must be parsed at most once per process"
+    assert CodeExecutionService.execute_transformation(df, first)['a'].tolist() == [42]
+
+
+def test_persisted_bytecode_is_loaded_without_recompiling():
+    code = "df['a'] = df['a'] * 3 + 7"
+    digest, blob = CodeExecutionService.dump_compiled(code)
+    assert blob.startswith(importlib.util.MAGIC_NUMBER)
+
+    from app.services import code_execution_service
+    code_execution_service._compiled.clear()  # Simulate a fresh worker
+    with patch.object(CodeValidator, 'validate') as validate:
+        compiled = CodeExecutionService.load_compiled(code, digest, blob)
+    validate.assert_not_called()
+    assert CodeExecutionService.execute_transformation(pd.DataFrame({'a': [1]}), compiled)['a'].tolist() == [10]
+
+    # A blob that does not belong to this source is ignored
+    code_execution_service._compiled.clear()
+    other = CodeExecutionService.load_compiled("df['a'] = df['a'] - 1", digest, blob)
+    assert CodeExecutionService.execute_transformation(pd.DataFrame({'a': [1]}), other)['a'].tolist() == [0]
+
+
+def test_replay_uses_stored_code_objects():
+    from app.routes.excel import _replay_session
+
+    code = "df['a'] = df['a'] * 10"
+    digest, blob = CodeExecutionService.dump_compiled(code)
+    session = {
+        'initial_df': pd.DataFrame({'a': [1, 2]}),
+        'commands': [SimpleNamespace(id=None, generated_code=code, intent_type='DATA_MUTATION',
+                                     code_hash=digest, compiled_code=blob)],
+        'conversation': SimpleNamespace(id=-3, file_path='unused.xlsx'),
+    }
+    with patch.object(CodeExecutionService, 'compile_transformation') as compile_spy:
+        result = _replay_session(session)
+    compile_spy.assert_not_called()
+    assert result['a'].tolist() == [10, 20]
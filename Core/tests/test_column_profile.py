@@ -0,0 +1,140 @@
+"""
+Tests for the column profile sent to the LLM instead of the raw first row: what a
+profile holds, its per-state cache, the token budget and how /transform uses it.
+"""
+import io
+import openpyxl
+import numpy as np
+import pandas as pd
+from unittest.mock import patch
+from uuid import uuid4
+
+from app.services.column_profile import ColumnProfiler, estimate_tokens
+from app.services.llm_service import LLMService
+
+
+def _frame():
+    return pd.DataFrame({
+        'amount': [10.5, None, 3.25, 10.5],
+        'region': ['North', 'South', None, 'North'],
+        'created': pd.to_datetime(['2024-01-01', '2024-03-01', None, '2024-02-01']),
+        'tags': [['a'], ['b'], None, ['a']],
+    })
+
+
+def test_profile_describes_each_column():
+    amount, region, created, tags = ColumnProfiler.profile(_frame())
+
+    assert amount == {"name": "amount", "letter": "A", "dtype": "float64", "nulls": 0.25, "unique": 2,
+                      "min": "3.25", "max": "10.5", "examples": ["10.5", "3.25"]}
+    assert region["unique"] == 2 and region["min"] is None and region["examples"] == ["'North'", "'South'"]
+    assert (created["min"], created["max"]) == ("2024-01-01", "2024-03-01")
+    assert tags["letter"] == "D" and tags["unique"] == 2  # Unhashable cells are counted by their text
+
+
+def test_profile_is_cached_per_state():
+    conversation_id = np.random.randint(10**6, 10**7)
+    df = _frame()
+    first = ColumnProfiler.get(conversation_id, 7, df)
+    assert ColumnProfiler.get(conversation_id, 7, df.iloc[:0]) is first, "Same state: not recomputed"
+    assert ColumnProfiler.get(conversation_id, 8, df.iloc[:1]) is not first
+    assert ColumnProfiler.stats()["hits"] >= 1
+
+
+def test_wide_sheet_fits_the_budget_and_keeps_mentioned_columns():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({f'metric_{i}': rng.normal(size=50) for i in range(300)})
+    profile = ColumnProfiler.profile(df)
+
+    schema, detailed = ColumnProfiler.render(profile, 'round Metric 250 to two decimals', len(df), budget=400)
+    assert estimate_tokens(schema) <= 420
+    assert "- IQ 'metric_250': float64" in schema
+    assert 0 < detailed < 300
+    assert 'more columns not shown' in schema
+
+    legacy = LLMService._system_content(df.columns.tolist(), df.iloc[0].to_dict())
+    assert len(LLMService._system_content(df.columns.tolist(), schema=schema)) < len(legacy) / 2
+
+
+def test_narrow_sheet_is_described_in_full():
+    df = _frame()
+    schema, detailed = ColumnProfiler.render(ColumnProfiler.profile(df), 'anything', len(df))
+    assert detailed == 4 and 'Other columns' not in schema
+    assert schema.startswith("The DataFrame 'df' has 4 rows and 4 columns")
+
+
+def _make_authenticated_client(client):
+    email = f"profile_{uuid4().hex[:8]}@example.com"
+    client.post('/auth/register', json={'email': email, 'password': 'Password1!'})
+    resp = client.post('/auth/login', json={'email': email, 'password': 'Password1!'})
+    return resp.get_json()['token']
+
+
+def _upload_test_xlsx(client, token):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(['Price', 'City'])
+    ws.append([100, 'Lima'])
+    ws.append([250, 'Quito'])
+    buf = io.BytesIO()
+    wb.save(buf)
+    buf.seek(0)
+    resp = client.post(
+        '/excel/upload',
+        data={'file': (buf, 'test.xlsx')},
+        headers={'Authorization': f'Bearer {token}'},
+        content_type='multipart/form-data'
+    )
+    assert resp.status_code == 200, f"Upload failed: {resp.data}"
+    return resp.get_json()['session_id']
+
+
+def _transform(client, token, session_id, code="df['Price'] = df['Price'] * 2"):
+    reply = {"code": code, "explanation": "Doble.", "intent": "DATA_MUTATION",
+             "cached": False, "cache_key": None}
+    with patch('app.routes.excel.LLMService.generate_transformation_code', return_value=reply) as llm:
+        client.post(
+            '/excel/transform',
+            data={'session_id': str(session_id), 'prompt': 'make every price twice as large'},
+            headers={'Authorization': f'Bearer {token}'}
+        ).get_data()
+    return llm.call_args
+
+
+def test_transform_sends_the_profile(client):
+    token = _make_authenticated_client(client)
+    session_id = _upload_test_xlsx(client, token)
+
+    call = _transform(client, token, session_id)
+    assert call.args[2] is None, "No raw sample row"
+    assert "- A 'Price': int64 | all distinct | 100..250" in call.kwargs['schema']
+
+    metrics = client.get('/excel/metrics', headers={'Authorization': f'Bearer {token}'}).get_json()['metrics']
+    assert metrics['column_profile']['requests'] >= 1
+
+
+def test_transform_without_profiles_sends_the_first_row(client, monkeypatch):
+    monkeypatch.setattr('app.routes.excel.COLUMN_PROFILE_ENABLED', False)
+    token = _make_authenticated_client(client)
+    session_id = _upload_test_xlsx(client, token)
+
+    call = _transform(client, token, session_id)
+    assert call.args[2] == {'Price': 100, 'City': 'Lima'}
+    assert call.kwargs['schema'] is None
+
+
+def test_profile_follows_undo_and_a_new_command(client):
+    """After undo + add the new command may reuse the undone one's id; its profile must not be reused."""
+    token = _make_authenticated_client(client)
+    session_id = _upload_test_xlsx(client, token)
+    auth = {'Authorization': f'Bearer {token}'}
+
+    _transform(client, token, session_id)  # Command 1: x2
+    _transform(client, token, session_id, "df['Price'] = df['Price'] * 10")  # Command 2: x10
+    _transform(client, token, session_id)  # Profiles the state at command 2
+    client.post('/excel/undo', data={'session_id': str(session_id)}, headers=auth)
+    client.post('/excel/undo', data={'session_id': str(session_id)}, headers=auth)
+    _transform(client, token, session_id, "df['Price'] = df['Price'] * 3")  # Takes command 2's id again
+
+    call = _transform(client, token, session_id)
+    assert "600..1500" in call.kwargs['schema'], call.kwargs['schema']
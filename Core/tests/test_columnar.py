@@ -0,0 +1,167 @@
+"""
+Tests for the columnar (Parquet) fast-load copy written at upload time.
+"""
+import io
+import os
+import time
+import openpyxl
+import pandas as pd
+from unittest.mock import patch
+from uuid import uuid4
+
+from app.services.excel_service import ExcelService
+
+
+def _write_xlsx(path, value=100):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws['A1'] = 'Name'
+    ws['B1'] = 'Value'
+    ws['A2'] = 'Alice'
+    ws['B2'] = value
+    wb.save(path)
+
+
+def test_load_prefers_columnar_copy(tmp_path):
+    """Once converted, loads never touch the XLSX parser."""
+    path = str(tmp_path / 'data.xlsx')
+    _write_xlsx(path)
+    original = ExcelService.convert_to_columnar(path)
+    assert os.path.exists(ExcelService.columnar_path(path))
+
+    with patch('pandas.read_excel', side_effect=AssertionError("XLSX parsed again")):
+        loaded = ExcelService.load_dataframe(path)
+    pd.testing.assert_frame_equal(original, loaded)
+
+
+def test_stale_copy_is_regenerated(tmp_path):
+    """Rewriting the original (e.g. a formula write) invalidates the columnar copy."""
+    path = str(tmp_path / 'data.xlsx')
+    _write_xlsx(path, value=100)
+    ExcelService.convert_to_columnar(path)
+
+    time.sleep(0.01)
+    _write_xlsx(path, value=555)
+    assert ExcelService.load_dataframe(path)['Value'].tolist() == [555]
+    assert ExcelService.read_columnar(ExcelService.columnar_path(path))['Value'].tolist() == [555]
+
+
+def test_mixed_sheet_keeps_a_copy(tmp_path):
+    """Columns Arrow cannot type are stored as text plus a type sidecar; a cold load equals the parsed frame."""
+    path = str(tmp_path / 'mixed.xlsx')
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(['Code', 'Name', 'Value'])
+    ws.append(['A-1', 'Alice', 1])
+    ws.append([2, None, 2])  # Text and numbers in one column; a blank name
+    wb.save(path)
+
+    original = ExcelService.convert_to_columnar(path)
+    with patch('pandas.read_excel', side_effect=AssertionError("XLSX parsed again")):
+        loaded = ExcelService.load_dataframe(path)
+    pd.testing.assert_frame_equal(original, loaded)
+
+
+def test_sheet_parquet_cannot_hold_is_parsed_again(tmp_path):
+    """No copy rather than a lossy one: the original is parsed on every load."""
+    path = str(tmp_path / 'dup.xlsx')
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(['Value', 'Value'])
+    ws.append([1, 2])
+    wb.save(path)
+    with patch.object(ExcelService, 'read_original',
+                      return_value=pd.DataFrame([[1, 2]], columns=['Value', 'Value'])) as parse:
+        ExcelService.load_dataframe(path)
+        ExcelService.load_dataframe(path)
+    assert not os.path.exists(ExcelService.columnar_path(path))
+    assert parse.call_count == 2
+
+
+def test_cold_load_keeps_missing_text_as_nan(tmp_path):
+    path = str(tmp_path / 'data.xlsx')
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(['Name', 'Value'])
+    ws.append(['Alice', 1])
+    ws.append([None, 2])
+    wb.save(path)
+
+    original = ExcelService.convert_to_columnar(path)
+    with open(ExcelService.columnar_path(path), 'rb') as f:
+        assert f.read(4) == b'PAR1'
+    loaded = ExcelService.load_dataframe(path)
+    assert loaded['Name'].iloc[1] is not None and pd.isna(loaded['Name'].iloc[1])
+    pd.testing.assert_frame_equal(original, loaded)
+
+
+def test_backfill_converts_existing_uploads(tmp_path):
+    from backfill_columnar import backfill
+
+    user_folder = tmp_path / '42'
+    user_folder.mkdir()
+    _write_xlsx(str(user_folder / 'old.xlsx'))
+
+    assert backfill(str(tmp_path)) == {"converted": 1, "skipped": 0, "failed": 0}
+    assert os.path.exists(ExcelService.columnar_path(str(user_folder / 'old.xlsx')))
+    assert backfill(str(tmp_path)) == {"converted": 0, "skipped": 1, "failed": 0}
+
+
+def test_upload_writes_columnar_copy(client):
+    """POST /excel/upload stores the Parquet copy next to the original file."""
+    from config.database import SessionLocal
+    from app.models.conversation import Conversation
+
+    email = f"columnar_{uuid4().hex[:8]}@example.com"
+    client.post('/auth/register', json={'email': email, 'password': 'Password1!'})
+    token = client.post('/auth/login', json={'email': email, 'password': 'Password1!'}).get_json()['token']
+
+    buf = io.BytesIO()
+    wb = openpyxl.Workbook()
+    wb.active['A1'] = 'Name'
+    wb.active['A2'] = 'Alice'
+    wb.save(buf)
+    buf.seek(0)
+    resp = client.post(
+        '/excel/upload',
+        data={'file': (buf, 'test.xlsx')},
+        headers={'Authorization': f'Bearer {token}'},
+        content_type='multipart/form-data'
+    )
+    assert resp.status_code == 200, resp.data
+
+    db = SessionLocal()
+    try:
+        conv = db.query(Conversation).filter_by(id=resp.get_json()['session_id']).first()
+        assert os.path.exists(ExcelService.columnar_path(conv.file_path))
+    finally:
+        db.close()
+
+
+def test_upload_over_the_session_limit_leaves_no_files(client):
+    """The workbook is parsed before the limit check; a rejected upload removes what it wrote."""
+    from flask_jwt_extended import decode_token
+    from app.services.excel_service import UPLOAD_FOLDER
+
+    email = f"columnar_{uuid4().hex[:8]}@example.com"
+    client.post('/auth/register', json={'email': email, 'password': 'Password1!'})
+    token = client.post('/auth/login', json={'email': email, 'password': 'Password1!'}).get_json()['token']
+    user_folder = os.path.join(UPLOAD_FOLDER, str(decode_token(token)['sub']))
+    before = set(os.listdir(user_folder)) if os.path.exists(user_folder) else set()
+
+    statuses = []
+    for _ in range(3):
+        buf = io.BytesIO()
+        wb = openpyxl.Workbook()
+        wb.active['A1'] = 'Name'
+        wb.save(buf)
+        buf.seek(0)
+        statuses.append(client.post(
+            '/excel/upload',
+            data={'file': (buf, 'test.xlsx')},
+            headers={'Authorization': f'Bearer {token}'},
+            content_type='multipart/form-data'
+        ).status_code)
+
+    assert statuses[:2] == [200, 200] and statuses[2] != 200
+    assert len(set(os.listdir(user_folder)) - before) == 4, "Two uploads, each with its columnar copy"
@@ -0,0 +1,144 @@
+"""
+Tests for the per-conversation DataFrame cache (DataFrameCache).
+"""
+import pandas as pd
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from app.services.dataframe_cache import DataFrameCache
+from app.services.code_execution_service import CodeExecutionService
+
+
+def _frame(rows: int) -> pd.DataFrame:
+    return pd.DataFrame({'a': range(rows)})
+
+
+def _nbytes(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(deep=True).sum())
+
+
+def test_hit_miss_counters():
+    cache = DataFrameCache(max_bytes=10 ** 6)
+    assert cache.get(1, 5) is None
+    df = _frame(10)
+    cache.put(1, 5, df)
+    assert cache.get(1, 5) is df
+    assert cache.get(1, 6) is None
+
+    stats = cache.stats()
+    assert stats['hits'] == 1 and stats['misses'] == 2
+    assert stats['entries'] == 1 and stats['bytes'] == _nbytes(df)
+
+
+def test_evicts_least_recently_used_by_bytes():
+    size = _nbytes(_frame(100))
+    cache = DataFrameCache(max_bytes=size * 2)
+    cache.put(1, 1, _frame(100))
+    cache.put(2, 1, _frame(100))
+    cache.get(1, 1)                 # conversation 1 becomes most recently used
+    cache.put(3, 1, _frame(100))    # over budget -> evicts conversation 2
+
+    assert cache.get(2, 1) is None
+    assert cache.get(1, 1) is not None
+    assert cache.stats()['evictions'] == 1
+    assert cache.stats()['bytes'] <= size * 2
+
+
+def test_new_head_replaces_previous_state():
+    cache = DataFrameCache(max_bytes=10 ** 6)
+    cache.put(1, None, _frame(3))
+    cache.put(1, 10, _frame(3))
+    cache.put(1, 11, _frame(4))
+    assert cache.get(1, 10) is None
+    assert cache.get(1, 11) is not None
+    assert cache.get(1, None) is not None
+
+
+def test_invalidate_keeps_initial_on_request():
+    cache = DataFrameCache(max_bytes=10 ** 6)
+    cache.put('7', None, _frame(3))
+    cache.put('7', 2, _frame(3))
+    cache.invalidate(7, keep_initial=True)
+    assert cache.get(7, 2) is None
+    assert cache.get(7, None) is not None
+    cache.invalidate('7')
+    assert cache.stats()['entries'] == 0
+
+
+def test_oversized_frame_not_cached():
+    cache = DataFrameCache(max_bytes=10)
+    cache.put(1, 1, _frame(100))
+    assert cache.stats()['entries'] == 0
+
+
+def test_replay_served_from_cache():
+    """_replay_session does not re-execute commands when the head is cached."""
+    from app.routes.excel import _replay_session
+
+    session = {
+        'initial_df': _frame(3),
+        'commands': [SimpleNamespace(id=1, generated_code="df['a'] = df['a'] * 2", intent_type='DATA_MUTATION')],
+        'conversation': SimpleNamespace(id=-2, file_path='unused.xlsx'),
+    }
+    first = _replay_session(session)
+    with patch.object(CodeExecutionService, 'execute_transformation') as spy:
+        second = _replay_session(session)
+    assert spy.call_count == 0
+    assert second is first
+
+
+def test_reused_command_id_is_a_new_state():
+    """
+    SQLite reuses the id of a command deleted after undo: add, add, undo, add gives ids
+    1, 2, 2. Another worker still holding the old head must not serve it.
+    """
+    from app.routes.excel import _replay_session
+    from app.services.snapshot_service import SnapshotService
+
+    conversation = SimpleNamespace(id=-3, file_path='unused.xlsx')
+    first = SimpleNamespace(id=1, generated_code="df['a'] = df['a'] + 1", intent_type='DATA_MUTATION')
+    undone = SimpleNamespace(id=2, generated_code="df['a'] = df['a'] * 10", intent_type='DATA_MUTATION')
+    reused = SimpleNamespace(id=2, generated_code="df['a'] = df['a'] * 100", intent_type='DATA_MUTATION')
+
+    with patch.object(SnapshotService, 'load_latest', return_value=(0, None)), \
+            patch.object(SnapshotService, 'should_checkpoint', return_value=False):
+        before = _replay_session({'initial_df': _frame(2), 'commands': [first, undone], 'conversation': conversation})
+        after = _replay_session({'initial_df': _frame(2), 'commands': [first, reused], 'conversation': conversation})
+
+    assert before['a'].tolist() == [10, 20]
+    assert after['a'].tolist() == [100, 200]
+
+
+def test_transform_result_is_served_to_the_next_request(client):
+    """The frame cached by /transform is found under the version the next request computes."""
+    import io
+    import openpyxl
+    from uuid import uuid4
+    from app.routes.excel import _replay_session
+    from app.services.state_manager import StateManager
+    from flask_jwt_extended import decode_token
+
+    email = f"dfcache_{uuid4().hex[:8]}@example.com"
+    client.post('/auth/register', json={'email': email, 'password': 'Password1!'})
+    token = client.post('/auth/login', json={'email': email, 'password': 'Password1!'}).get_json()['token']
+    wb = openpyxl.Workbook()
+    wb.active.append(['Value'])
+    wb.active.append([1])
+    buf = io.BytesIO()
+    wb.save(buf)
+    buf.seek(0)
+    session_id = client.post('/excel/upload', data={'file': (buf, 'test.xlsx')},
+                             headers={'Authorization': f'Bearer {token}'},
+                             content_type='multipart/form-data').get_json()['session_id']
+
+    reply = {"code": "df['Value'] = df['Value'] + 1", "explanation": "+1", "intent": "DATA_MUTATION",
+             "cached": False, "cache_key": None}
+    with patch('app.routes.excel.LLMService.generate_transformation_code', return_value=reply):
+        client.post('/excel/transform', data={'session_id': str(session_id), 'prompt': 'add one to every value'},
+                    headers={'Authorization': f'Bearer {token}'}).get_data()
+
+    session = StateManager.get_session(session_id, decode_token(token)['sub'])
+    with patch.object(CodeExecutionService, 'execute_transformation') as spy:
+        df = _replay_session(session)
+    spy.assert_not_called()
+    assert df['Value'].tolist() == [2]
@@ -0,0 +1,126 @@
+"""
+Tests for streaming exports (xlsx / csv / parquet) from /excel/download.
+"""
+import io
+import tracemalloc
+import numpy as np
+import openpyxl
+import pandas as pd
+import pytest
+from uuid import uuid4
+
+from app.services import export_service
+from app.services.export_service import ExportService
+
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame({
+        'name': ['Alice', 'Bob & <Co>', None],
+        'units': [1, 2, 3],
+        'price': [1.5, np.nan, 2.25],
+        'active': [True, False, True],
+        'when': pd.to_datetime(['2024-01-02 03:04:05', None, '2024-12-31 00:00:00']),
+        'mixed': [1, 'two', 3.5],
+    })
+
+
+def _load(chunks):
+    return openpyxl.load_workbook(io.BytesIO(b''.join(chunks))).active
+
+
+def test_xlsx_round_trips_types(frame):
+    ws = _load(ExportService.xlsx_chunks(frame))
+    rows = [list(row) for row in ws.iter_rows(values_only=True)]
+    assert rows[0] == ['name', 'units', 'price', 'active', 'when', 'mixed']
+    assert rows[1][:4] == ['Alice', 1, 1.5, True]
+    assert rows[1][4] == pd.Timestamp('2024-01-02 03:04:05').to_pydatetime()
+    assert rows[2][0] == 'Bob & <Co>'
+    assert rows[2][2] is None and rows[2][4] is None, "Missing values are blank cells"
+    assert rows[3][0] is None
+    assert [row[5] for row in rows[1:]] == [1, 'two', 3.5]
+
+
+def test_xlsx_writes_overlay_formulas(frame):
+    ws = _load(ExportService.xlsx_chunks(frame, {'B2': '=SUM(B3:B4)', 'H6': '=B2*2'}))
+    assert ws['B2'].value == '=SUM(B3:B4)'
+    assert ws['H6'].value == '=B2*2', "Formulas outside the data grow the sheet"
+    assert ws['B3'].value == 2
+
+
+def test_xlsx_streams_in_chunks(monkeypatch):
+    monkeypatch.setattr(export_service, 'EXPORT_CHUNK_ROWS', 500)
+    df = pd.DataFrame({'a': np.arange(20_000), 'b': np.random.default_rng(0).random(20_000)})
+    chunks = list(ExportService.xlsx_chunks(df))
+    assert len(chunks) > 5, "Bytes leave before the whole sheet is encoded"
+    assert _load(chunks).max_row == 20_001
+
+
+def test_xlsx_peak_memory_is_bounded(monkeypatch):
+    monkeypatch.setattr(export_service, 'EXPORT_CHUNK_ROWS', 2000)
+    df = pd.DataFrame({'a': np.arange(60_000), 'b': np.random.default_rng(0).random(60_000)})
+    tracemalloc.start()
+    try:
+        total = sum(len(chunk) for chunk in ExportService.xlsx_chunks(df))
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert total > 0
+    assert peak < 8 * 1024 * 1024, f"Peak {peak} bytes: export must not materialize the whole sheet"
+
+
+def test_csv_and_parquet(monkeypatch, frame):
+    monkeypatch.setattr(export_service, 'EXPORT_CHUNK_ROWS', 2)
+    text = b''.join(ExportService.csv_chunks(frame)).decode('utf-8-sig')
+    assert pd.read_csv(io.StringIO(text))['units'].tolist() == [1, 2, 3]
+
+    restored = pd.read_parquet(io.BytesIO(b''.join(ExportService.parquet_chunks(frame))))
+    assert restored['price'].tolist()[::2] == [1.5, 2.25]
+    assert restored['mixed'].tolist() == ['1', 'two', '3.5'], "Mixed object columns are exported as text"
+    assert len(restored) == 3
+
+
+def _make_authenticated_client(client):
+    email = f"export_{uuid4().hex[:8]}@example.com"
+    client.post('/auth/register', json={'email': email, 'password': 'Password1!'})
+    resp = client.post('/auth/login', json={'email': email, 'password': 'Password1!'})
+    return resp.get_json()['token']
+
+
+def _upload_test_xlsx(client, token):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(['Name', 'Value'])
+    ws.append(['Alice', 100])
+    ws.append(['Bob', 200])
+    buf = io.BytesIO()
+    wb.save(buf)
+    buf.seek(0)
+    resp = client.post(
+        '/excel/upload',
+        data={'file': (buf, 'test.xlsx')},
+        headers={'Authorization': f'Bearer {token}'},
+        content_type='multipart/form-data'
+    )
+    assert resp.status_code == 200, f"Upload failed: {resp.data}"
+    return resp.get_json()['session_id']
+
+
+def test_download_formats(client):
+    token = _make_authenticated_client(client)
+    auth = {'Authorization': f'Bearer {token}'}
+    session_id = _upload_test_xlsx(client, token)
+
+    csv = client.get(f'/excel/download/{session_id}?format=csv', headers=auth)
+    assert csv.status_code == 200 and csv.content_type.startswith('text/csv')
+    assert 'test.csv' in csv.headers['Content-Disposition']
+    assert pd.read_csv(io.StringIO(csv.data.decode('utf-8-sig')))['Value'].tolist() == [100, 200]
+
+    parquet = client.get(f'/excel/download/{session_id}?format=parquet', headers=auth)
+    assert pd.read_parquet(io.BytesIO(parquet.data))['Name'].tolist() == ['Alice', 'Bob']
+
+    xlsx = client.get(f'/excel/download/{session_id}', headers=auth)
+    assert 'test.xlsx' in xlsx.headers['Content-Disposition']
+    assert openpyxl.load_workbook(io.BytesIO(xlsx.data)).active['B3'].value == 200
+
+    assert client.get(f'/excel/download/{session_id}?format=pdf', headers=auth).status_code == 400
@@ -0,0 +1,148 @@
+"""
+Tests for state versions, ETag / If-None-Match and the on-disk export cache.
+"""
+import io
+import os
+import openpyxl
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from uuid import uuid4
+
+from app.services import export_cache
+from app.services.export_cache import ExportCache
+
+
+def _make_authenticated_client(client):
+    email = f"etag_{uuid4().hex[:8]}@example.com"
+    client.post('/auth/register', json={'email': email, 'password': 'Password1!'})
+    resp = client.post('/auth/login', json={'email': email, 'password': 'Password1!'})
+    return resp.get_json()['token']
+
+
+def _upload_test_xlsx(client, token):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(['Name', 'Value'])
+    ws.append(['Alice', 100])
+    ws.append(['Bob', 200])
+    buf = io.BytesIO()
+    wb.save(buf)
+    buf.seek(0)
+    resp = client.post(
+        '/excel/upload',
+        data={'file': (buf, 'test.xlsx')},
+        headers={'Authorization': f'Bearer {token}'},
+        content_type='multipart/form-data'
+    )
+    assert resp.status_code == 200, f"Upload failed: {resp.data}"
+    return resp.get_json()['session_id']
+
+
+def _transform(client, session_id, auth, code):
+    reply = {'code': code, 'explanation': 'ok', 'intent': 'DATA_MUTATION'}
+    with patch('app.routes.excel.LLMService.generate_transformation_code', return_value=reply):
+        client.post('/excel/transform', data={'session_id': str(session_id), 'prompt': code}, headers=auth).get_data()
+
+
+def test_conversation_etag_round_trip(client):
+    token = _make_authenticated_client(client)
+    auth = {'Authorization': f'Bearer {token}'}
+    session_id = _upload_test_xlsx(client, token)
+
+    first = client.get(f'/excel/conversation/{session_id}', headers=auth)
+    etag = first.headers['ETag']
+    with patch('app.routes.excel._replay_session') as replay:
+        again = client.get(f'/excel/conversation/{session_id}', headers={**auth, 'If-None-Match': etag})
+    assert again.status_code == 304 and again.data == b''
+    replay.assert_not_called()
+
+    columns = client.get(f'/excel/conversation/{session_id}?layout=columns', headers={**auth, 'If-None-Match': etag})
+    assert columns.status_code == 200, "Each layout is its own representation"
+
+    _transform(client, session_id, auth, "df['Value'] = df['Value'] * 2")
+    changed = client.get(f'/excel/conversation/{session_id}', headers={**auth, 'If-None-Match': etag})
+    assert changed.status_code == 200 and changed.headers['ETag'] != etag
+
+    # Undo returns to the original state, and to its original version
+    client.post('/excel/undo', data={'session_id': str(session_id)}, headers=auth)
+    assert client.get(f'/excel/conversation/{session_id}', headers=auth).headers['ETag'] == etag
+
+
+def test_download_is_rendered_once_per_version(client):
+    token = _make_authenticated_client(client)
+    auth = {'Authorization': f'Bearer {token}'}
+    session_id = _upload_test_xlsx(client, token)
+
+    first = client.get(f'/excel/download/{session_id}', headers=auth)
+    rendered = first.get_data()  # Streamed: the cache entry is complete once the body is drained
+    with patch('app.routes.excel._replay_session') as replay, \
+            patch('app.routes.excel.StateManager.get_session') as load:
+        cached = client.get(f'/excel/download/{session_id}', headers=auth)
+        not_modified = client.get(f'/excel/download/{session_id}', headers={**auth, 'If-None-Match': first.headers['ETag']})
+    replay.assert_not_called()
+    load.assert_not_called()  # A cache hit never loads the frames
+    assert cached.data == rendered and cached.headers['ETag'] == first.headers['ETag']
+    assert not_modified.status_code == 304
+
+    csv = client.get(f'/excel/download/{session_id}?format=csv', headers=auth)
+    csv.get_data()
+    assert csv.headers['ETag'] != first.headers['ETag']
+    assert len(os.listdir(os.path.join(export_cache.EXPORT_CACHE_FOLDER, str(session_id)))) == 2
+
+
+def test_evict_keeps_most_recently_served(tmp_path, monkeypatch):
+    monkeypatch.setattr(export_cache, 'EXPORT_CACHE_FOLDER', str(tmp_path))
+    for position, version in enumerate(['old', 'mid', 'new']):
+        b''.join(ExportCache.tee(-1, version, 'csv', [b'x' * 100]))
+        path = ExportCache._path(-1, version, 'csv')
+        os.utime(path, (1000 + position, 1000 + position))
+    ExportCache.get(-1, 'old', 'csv')  # A hit makes 'old' the most recent
+
+    assert ExportCache.evict(max_bytes=250) == 1
+    assert ExportCache.get(-1, 'mid', 'csv') is None
+    assert ExportCache.get(-1, 'old', 'csv') and ExportCache.get(-1, 'new', 'csv')
+
+
+def test_folder_is_walked_only_when_over_budget(tmp_path, monkeypatch):
+    monkeypatch.setattr(export_cache, 'EXPORT_CACHE_FOLDER', str(tmp_path))
+    monkeypatch.setattr(export_cache, 'EXPORT_CACHE_MAX_MB', 250 / (1024 * 1024))
+    monkeypatch.setitem(export_cache._usage, 'bytes', None)
+
+    with patch('app.services.export_cache.os.walk', wraps=os.walk) as walk:
+        b''.join(ExportCache.tee(-3, 'a', 'csv', [b'x' * 100]))  # First write measures the folder
+        b''.join(ExportCache.tee(-3, 'b', 'csv', [b'x' * 100]))
+        assert walk.call_count == 1
+        b''.join(ExportCache.tee(-3, 'c', 'csv', [b'x' * 100]))  # 300 bytes: over budget
+        assert walk.call_count == 2
+    assert sorted(os.listdir(tmp_path / '-3')) == ['b.csv', 'c.csv']
+    assert export_cache._usage['bytes'] == 200
+
+
+def test_aborted_render_leaves_no_entry(tmp_path, monkeypatch):
+    monkeypatch.setattr(export_cache, 'EXPORT_CACHE_FOLDER', str(tmp_path))
+    stream = ExportCache.tee(-2, 'v', 'xlsx', iter([b'a', b'b']))
+    next(stream)
+    stream.close()  # Client disconnected mid-download
+    assert ExportCache.get(-2, 'v', 'xlsx') is None
+    assert os.listdir(tmp_path / '-2') == []
+
+
+def test_cleanup_discards_exports_of_expired_conversations(client):
+    from config.database import SessionLocal
+    from app.models.conversation import Conversation
+    from app.jobs import cleanup_expired_files
+
+    token = _make_authenticated_client(client)
+    session_id = _upload_test_xlsx(client, token)
+    client.get(f'/excel/download/{session_id}', headers={'Authorization': f'Bearer {token}'}).get_data()
+    folder = os.path.join(export_cache.EXPORT_CACHE_FOLDER, str(session_id))
+    assert os.listdir(folder)
+
+    session = SessionLocal()
+    try:
+        session.get(Conversation, int(session_id)).expires_at = datetime.utcnow() - timedelta(days=1)
+        session.commit()
+    finally:
+        session.close()
+    cleanup_expired_files()
+    assert not os.path.exists(folder)
@@ -0,0 +1,127 @@
+"""
+Tests for the in-memory formula engine behind FORMULA_WRITE previews.
+"""
+import threading
+import pandas as pd
+import pytest
+
+from app.services.formula_engine import FormulaEngine
+from app.services.formula_overlay import FormulaOverlay
+
+
+@pytest.fixture
+def sales():
+    # Sheet layout: A=Region, B=Units, C=Price; data starts at row 2
+    return pd.DataFrame({
+        'Region': ['North', 'South', 'North', 'East'],
+        'Units': [10, 20, 30, None],
+        'Price': [1.5, 2.0, 2.5, 3.0],
+    })
+
+
+@pytest.mark.parametrize('formula, expected', [
+    ('=SUM(B2:B5)', 60),
+    ('=AVERAGE(B2:B5)', 20),
+    ('=MIN(B:B)', 10),
+    ('=MAX(B2:C5)', 30),
+    ('=COUNT(B2:B5)', 3),
+    ('=COUNTA(A2:A5)', 4),
+    ('=B2*C2+1', 16),
+    ('=-B2^2', 100),  # Excel: negation binds tighter than ^
+    ('=50%', 0.5),
+    ('=IF(B3>15,"big","small")', 'big'),
+    ('=IF(AND(B2>5,NOT(B2>20)),1,0)', 1),
+    ('=COUNTIF(A2:A5,"North")', 2),
+    ('=COUNTIF(B2:B5,">=20")', 2),
+    ('=COUNTIF(A2:A5,"*th")', 3),
+    ('=SUMIF(A2:A5,"North",B2:B5)', 40),
+    ('=AVERAGEIF(B2:B5,">10")', 25),
+    ('=VLOOKUP("south",A2:C5,3,FALSE)', 2),
+    ('=VLOOKUP(25,B2:C4,2)', 2),
+    ('=VLOOKUP("West",A2:C5,2,FALSE)', '#N/A'),
+    ('=B2/0', '#DIV/0!'),
+    ('=IFERROR(B2/0,"n/a")', 'n/a'),
+    ('=A2&"-"&B2', 'North-10'),
+    ('=ROUND(C3*1.234,2)', 2.47),
+    ('=A1', 'Region'),
+    ('=NOPE(1)', '#NAME?'),
+    ('=SUM(B2:B5', '#NAME?'),
+])
+def test_evaluates_supported_functions(sales, formula, expected):
+    engine = FormulaEngine(sales, {'E2': formula})
+    assert engine.values() == {'E2': expected}
+
+
+def test_formulas_see_other_formula_cells(sales):
+    engine = FormulaEngine(sales, {'B6': '=SUM(B2:B5)', 'B7': '=B6*2', 'D2': '=D3', 'D3': '=D2'})
+    values = engine.values()
+    assert values['B6'] == 60 and values['B7'] == 120
+    assert values['D2'] == '#REF!' and values['D3'] == '#REF!', "Circular references do not hang"
+
+
+def test_only_dependents_are_recomputed(sales):
+    engine = FormulaEngine(sales, {'E2': '=SUM(B2:B5)', 'E3': '=E2+1', 'F2': '=C2*2'})
+    engine.values()
+    assert engine.evaluations == 3
+
+    # B5 (the blank Units cell) sits inside E2's range: E2 and E3 change, F2 is untouched
+    changed = engine.sync({'E2': '=SUM(B2:B5)', 'E3': '=E2+1', 'F2': '=C2*2', 'B5': '=5'})
+    assert changed == {FormulaOverlay.cell_position('B5')}
+    values = engine.values()
+    assert engine.evaluations == 6
+    assert values['E2'] == 65 and values['E3'] == 66 and values['F2'] == 3
+
+    # Dropping a formula (undo) recomputes what read it
+    engine.sync({'E2': '=SUM(B2:B5)', 'E3': '=E2+1', 'F2': '=C2*2'})
+    assert engine.values()['E3'] == 61
+    assert engine.evaluations == 8
+
+
+def test_engine_is_reused_per_frame(sales):
+    first = FormulaEngine.for_conversation(-5, sales, {'E2': '=SUM(B2:B5)'})
+    first.values()
+    again = FormulaEngine.for_conversation(-5, sales, {'E2': '=SUM(B2:B5)'})
+    assert again is first and again.values() == {'E2': 60} and again.evaluations == 1
+
+    changed_data = sales.assign(Units=[1, 1, 1, 1])
+    rebuilt = FormulaEngine.for_conversation(-5, changed_data, {'E2': '=SUM(B2:B5)'})
+    assert rebuilt is not first and rebuilt.values() == {'E2': 4}
+
+
+def test_dependents_are_indexed_by_column(sales):
+    engine = FormulaEngine(sales, {'E2': '=SUM(B2:C5)', 'F2': '=A2', 'G2': '=E2'})
+    assert engine._dependents[1] == engine._dependents[2] == {FormulaOverlay.cell_position('E2')}
+    engine.sync({'F2': '=A2', 'G2': '=E2'})
+    assert 1 not in engine._dependents and 2 not in engine._dependents, "Dropped formulas leave the index"
+    assert engine.values() == {'F2': 'North', 'G2': None}
+
+
+def test_concurrent_requests_see_their_own_overlay(sales):
+    overlays = [{'E2': '=SUM(B2:B5)'}, {'E2': '=SUM(B2:B5)', 'E3': '=E2*2', 'B5': '=40'}]
+    expected = [{'E2': 60}, {'E2': 100, 'E3': 200, 'B5': 40}]
+    errors = []
+
+    def request(index):
+        try:
+            for _ in range(200):
+                values = FormulaEngine.values_for(-6, sales, overlays[index])
+                if values != expected[index]:
+                    errors.append(values)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=request, args=(i % 2,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors, errors[:3]
+
+
+def test_apply_shows_computed_values(sales):
+    overlay = {'B6': '=SUM(B2:B5)', 'A6': '=UPPER(A2)'}
+    display = FormulaOverlay.apply(sales, overlay, FormulaEngine(sales, overlay).values())
+    assert display.iloc[4]['Units'] == 60
+    assert display['Units'].dtype == 'float64', "Numeric results keep the column numeric"
+    assert display.iloc[4]['Region'] == 'NORTH'
+    assert sales.shape == (4, 3)
@@ -0,0 +1,108 @@
+"""
+Tests for the formula overlay (FORMULA_WRITE never rewrites the uploaded workbook).
+"""
+import io
+import json
+import hashlib
+import openpyxl
+import pandas as pd
+from types import SimpleNamespace
+from unittest.mock import patch
+from uuid import uuid4
+
+from app.services.formula_overlay import FormulaOverlay
+
+
+def _formula_cmd(*pairs):
+    return SimpleNamespace(
+        intent_type='FORMULA_WRITE',
+        generated_code=json.dumps([{"cell": cell, "formula": formula} for cell, formula in pairs])
+    )
+
+
+def test_build_folds_commands_in_order():
+    commands = [
+        _formula_cmd(('b3', '=SUM(B2:B2)')),
+        SimpleNamespace(intent_type='DATA_MUTATION', generated_code="df['a'] = 1"),
+        _formula_cmd(('B3', '=AVERAGE(B2:B2)'), ('C4', '=1+1')),
+    ]
+    assert FormulaOverlay.build(commands) == {'B3': '=AVERAGE(B2:B2)', 'C4': '=1+1'}
+
+
+def test_apply_shows_formulas_without_touching_the_frame():
+    df = pd.DataFrame({'a': [1, 2], 'b': [3.0, 4.0]})
+    display = FormulaOverlay.apply(df, {'B3': '=SUM(B2:B2)', 'D5': '=A2'})
+
+    assert df.shape == (2, 2) and df['b'].tolist() == [3.0, 4.0]
+    assert display.shape == (4, 4), "Grid grows to reach B3 (row 2) and D5 (row 3, column D)"
+    assert display.iloc[1, 1] == '=SUM(B2:B2)'
+    assert display.columns.tolist() == ['a', 'b', 'C', 'D']
+    assert display.iloc[3, 3] == '=A2'
+    assert FormulaOverlay.apply(df, {}) is df
+
+
+def _make_authenticated_client(client):
+    email = f"overlay_{uuid4().hex[:8]}@example.com"
+    client.post('/auth/register', json={'email': email, 'password': 'Password1!'})
+    resp = client.post('/auth/login', json={'email': email, 'password': 'Password1!'})
+    return resp.get_json()['token']
+
+
+def _upload_test_xlsx(client, token):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(['Name', 'Value'])
+    ws.append(['Alice', 100])
+    ws.append(['Bob', 200])
+    buf = io.BytesIO()
+    wb.save(buf)
+    buf.seek(0)
+    resp = client.post(
+        '/excel/upload',
+        data={'file': (buf, 'test.xlsx')},
+        headers={'Authorization': f'Bearer {token}'},
+        content_type='multipart/form-data'
+    )
+    assert resp.status_code == 200, f"Upload failed: {resp.data}"
+    return resp.get_json()['session_id']
+
+
+def _file_digest(session_id):
+    from config.database import SessionLocal
+    from app.models.conversation import Conversation
+    session = SessionLocal()
+    try:
+        path = session.get(Conversation, int(session_id)).file_path
+    finally:
+        session.close()
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def test_formula_lifecycle_never_rewrites_upload(client):
+    token = _make_authenticated_client(client)
+    auth = {'Authorization': f'Bearer {token}'}
+    session_id = _upload_test_xlsx(client, token)
+    original = _file_digest(session_id)
+
+    reply = {'code': [{'cell': 'B4', 'formula': '=SUM(B2:B3)'}], 'explanation': 'Total.', 'intent': 'FORMULA_WRITE'}
+    with patch('app.routes.excel.LLMService.generate_transformation_code', return_value=reply):
+        resp = client.post('/excel/transform', data={'session_id': str(session_id), 'prompt': 'total in B4'}, headers=auth)
+        body = resp.data.decode()
+
+        done = json.loads([b for b in body.split('\n\n') if b.startswith('event: done')][0].split('data: ', 1)[1])
+        assert done['type'] == 'formula'
+        assert done['data']['rows'][2]['Value'] == 300, "The grid shows the computed value"
+
+        state = client.get(f'/excel/conversation/{session_id}', headers=auth).get_json()
+        assert state['data']['grid']['rows'][2]['Value'] == 300
+
+        download = client.get(f'/excel/download/{session_id}', headers=auth)
+        exported = openpyxl.load_workbook(io.BytesIO(download.data), data_only=False).active
+        assert exported['B4'].value == '=SUM(B2:B3)'
+        assert exported['B2'].value == 100
+
+        undo = client.post('/excel/undo', data={'session_id': str(session_id)}, headers=auth).get_json()
+        assert [row['Value'] for row in undo['data']['rows']] == [100, 200]
+
+    assert _file_digest(session_id) == original, "The uploaded workbook must stay untouched"
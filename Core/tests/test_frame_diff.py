@@ -0,0 +1,133 @@
+"""
+Tests for grid patches (FrameDiff) and delta=1 on /transform and /undo.
+"""
+import io
+import json
+import numpy as np
+import pandas as pd
+import openpyxl
+from unittest.mock import patch
+from uuid import uuid4
+
+from app.services.frame_diff import FrameDiff
+from app.services.frame_serializer import FrameSerializer
+
+
+def _apply(patch_data: dict, rows: list) -> list:
+    """Reference client: same steps as applyGridPatch in src/utils/gridPatch.ts."""
+    rows = [dict(r) for r in rows[:patch_data['limit']]]
+    for start, stop in reversed(patch_data['deleted_rows']):
+        del rows[start:stop]
+    rows = [
+        {patch_data['renamed_columns'].get(k, k): v for k, v in r.items() if k not in patch_data['removed_columns']}
+        for r in rows
+    ]
+    for run in patch_data['inserted_rows']:
+        rows[run['at']:run['at']] = run['rows']
+    for col, change in patch_data['cells'].items():
+        for position, value in zip(change['rows'], change['values']):
+            rows[position][col] = value
+    return rows
+
+
+def _roundtrip(before: pd.DataFrame, after: pd.DataFrame, limit: int = 1000) -> dict:
+    patch_data = FrameDiff.compute(before, after, limit=limit)
+    assert patch_data is not None
+    patch_data = json.loads(FrameSerializer.dumps(patch_data))
+    old_rows = json.loads(FrameSerializer.dumps(FrameSerializer.to_records(before)))
+    new_rows = json.loads(FrameSerializer.dumps(FrameSerializer.to_records(after.iloc[:limit])))
+    assert _apply(patch_data, old_rows) == new_rows
+    return patch_data
+
+
+def _frame(rows: int = 100) -> pd.DataFrame:
+    return pd.DataFrame({'id': range(rows), 'name': [f'n{i}' for i in range(rows)], 'score': np.arange(rows) * 1.5})
+
+
+def test_single_cell_change():
+    before = _frame()
+    after = before.copy()
+    after.loc[7, 'score'] = 999
+    patch_data = _roundtrip(before, after)
+    assert patch_data['cells'] == {'score': {'rows': [7], 'values': [999.0]}}
+    assert patch_data['deleted_rows'] == [] and patch_data['inserted_rows'] == []
+
+
+def test_rename_is_detected():
+    before = _frame()
+    patch_data = _roundtrip(before, before.rename(columns={'name': 'label'}))
+    assert patch_data['renamed_columns'] == {'name': 'label'}
+    assert patch_data['cells'] == {}
+
+
+def test_filtered_rows_become_deleted_ranges():
+    before = _frame()
+    after = before[(before['id'] < 10) | (before['id'] >= 15)]
+    patch_data = _roundtrip(before, after)
+    assert patch_data['deleted_rows'] == [[10, 15]]
+    assert patch_data['total_rows'] == 95
+
+
+def test_window_pulls_in_rows_beyond_old_window():
+    before = _frame(50)
+    after = before.drop(index=[2, 3])
+    patch_data = _roundtrip(before, after, limit=20)
+    assert patch_data['deleted_rows'] == [[2, 4]]
+    assert [run['at'] for run in patch_data['inserted_rows']] == [18]
+
+
+def test_added_column_and_nulls():
+    before = _frame(10)
+    after = before.copy()
+    after['flag'] = None
+    after.loc[3, 'score'] = np.nan
+    _roundtrip(before, after)
+
+
+def test_sort_and_large_changes_fall_back():
+    before = _frame()
+    assert FrameDiff.compute(before, before.sort_values('id', ascending=False)) is None
+    assert FrameDiff.compute(before, before.assign(score=before['score'] + 1, id=before['id'] + 1)) is None
+
+
+def _session(client):
+    email = f"delta_{uuid4().hex[:8]}@example.com"
+    client.post('/auth/register', json={'email': email, 'password': 'Password1!'})
+    token = client.post('/auth/login', json={'email': email, 'password': 'Password1!'}).get_json()['token']
+    wb = openpyxl.Workbook()
+    wb.active.append(['Name', 'Value'])
+    for i in range(10):
+        wb.active.append([f'n{i}', i])
+    buf = io.BytesIO()
+    wb.save(buf)
+    buf.seek(0)
+    resp = client.post(
+        '/excel/upload',
+        data={'file': (buf, 'test.xlsx')},
+        headers={'Authorization': f'Bearer {token}'},
+        content_type='multipart/form-data'
+    )
+    return token, resp.get_json()['session_id']
+
+
+def test_transform_and_undo_emit_patches(client):
+    token, session_id = _session(client)
+    headers = {'Authorization': f'Bearer {token}'}
+
+    mock_return = {'code': "df.loc[4, 'Value'] = 999", 'explanation': 'Set one cell.', 'intent': 'DATA_MUTATION'}
+    with patch('app.routes.excel.LLMService.generate_transformation_code', return_value=mock_return):
+        resp = client.post(
+            '/excel/transform',
+            data={'session_id': str(session_id), 'prompt': 'set value', 'delta': '1'},
+            headers=headers,
+        )
+        raw = resp.data.decode('utf-8')
+    done = [b for b in raw.split('\n\n') if b.startswith('event: done')][0]
+    payload = json.loads(done.split('data: ', 1)[1])
+    assert payload['data'] is None
+    assert payload['patch']['cells'] == {'Value': {'rows': [4], 'values': [999]}}
+
+    resp = client.post('/excel/undo', data={'session_id': str(session_id), 'delta': '1'}, headers=headers)
+    body = resp.get_json()
+    assert body['data'] is None
+    assert body['patch']['cells'] == {'Value': {'rows': [4], 'values': [4]}}
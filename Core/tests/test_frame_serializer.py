@@ -0,0 +1,71 @@
+"""
+Tests for the vectorized grid serializer (FrameSerializer) and ?layout=columns.
+"""
+import io
+import json
+import numpy as np
+import pandas as pd
+import openpyxl
+from uuid import uuid4
+
+from app.services.frame_serializer import FrameSerializer
+from app.services.excel_service import ExcelService
+
+
+def test_records_match_legacy_shape():
+    df = pd.DataFrame({
+        'name': ['a', None, 'c'],
+        'value': [1.5, np.nan, 3.0],
+        'count': [1, 2, 3],
+        'when': pd.to_datetime(['2024-01-02 03:04:05', None, '2024-12-31 00:00:00']),
+    })
+    rows = json.loads(FrameSerializer.dumps(FrameSerializer.to_records(df)))
+    assert rows[0] == {'name': 'a', 'value': 1.5, 'count': 1, 'when': '2024-01-02 03:04:05'}
+    assert rows[1] == {'name': None, 'value': None, 'count': 2, 'when': None}
+    assert rows[2]['when'] == '2024-12-31 00:00:00'
+
+
+def test_mixed_and_extension_columns():
+    df = pd.DataFrame({
+        'mixed': pd.Series([np.int64(7), pd.Timestamp('2024-01-01'), pd.NaT, 'x'], dtype=object),
+        'nullable': pd.array([1, None, 3, 4], dtype='Int64'),
+        'category': pd.Categorical(['u', None, 'u', 'v']),
+    })
+    rows = json.loads(FrameSerializer.dumps(FrameSerializer.to_records(df)))
+    assert [r['mixed'] for r in rows] == [7, '2024-01-01T00:00:00', None, 'x']
+    assert [r['nullable'] for r in rows] == [1, None, 3, 4]
+    assert [r['category'] for r in rows] == ['u', None, 'u', 'v']
+
+
+def test_column_layout_payload():
+    df = pd.DataFrame({'a': [1.0, np.nan, 2.0], 'b': ['x', 'y', None]})
+    data = ExcelService.format_dataframe_response(df, layout='columns')
+    payload = json.loads(FrameSerializer.dumps(data))
+
+    assert 'rows' not in payload
+    assert payload['layout'] == 'columns'
+    assert payload['columns'] == ['a', 'b']
+    assert payload['values'] == [[1.0, None, 2.0], ['x', 'y', None]]
+    assert payload['nulls'] == [[1], [2]]
+
+
+def test_upload_with_column_layout(client):
+    email = f"layout_{uuid4().hex[:8]}@example.com"
+    client.post('/auth/register', json={'email': email, 'password': 'Password1!'})
+    token = client.post('/auth/login', json={'email': email, 'password': 'Password1!'}).get_json()['token']
+
+    wb = openpyxl.Workbook()
+    wb.active.append(['Name', 'Value'])
+    wb.active.append(['Alice', 100])
+    buf = io.BytesIO()
+    wb.save(buf)
+    buf.seek(0)
+    resp = client.post(
+        '/excel/upload?layout=columns',
+        data={'file': (buf, 'test.xlsx')},
+        headers={'Authorization': f'Bearer {token}'},
+        content_type='multipart/form-data'
+    )
+    assert resp.status_code == 200, resp.data
+    data = resp.get_json()['data']
+    assert data['values'] == [['Alice'], [100]]
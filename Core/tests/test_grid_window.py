@@ -0,0 +1,73 @@
+"""
+Tests for windowed grid responses and GET /excel/conversation/<id>/rows.
+"""
+import io
+import openpyxl
+import pandas as pd
+from uuid import uuid4
+
+from app.services.excel_service import ExcelService
+
+
+def test_response_carries_first_window_only():
+    df = pd.DataFrame({'a': range(2500), 'b': ['x'] * 2500})
+    data = ExcelService.format_dataframe_response(df, limit=100)
+
+    assert data['total_rows'] == 2500
+    assert len(data['rows']) == 100
+    assert data['columns'] == ['a', 'b']
+    assert data['schema'] == [{'name': 'a', 'dtype': 'int64'}, {'name': 'b', 'dtype': 'object'}]
+
+
+def test_window_offset_and_column_subset():
+    df = pd.DataFrame({'a': range(50), 'b': range(50, 100)})
+    data = ExcelService.format_dataframe_response(df, offset=45, limit=10, columns=['b'])
+
+    assert data['columns'] == ['b']
+    assert [row['b'] for row in data['rows']] == [95, 96, 97, 98, 99]
+    assert len(data['schema']) == 2, "Schema always describes the whole frame"
+
+
+def _upload(client, rows):
+    email = f"window_{uuid4().hex[:8]}@example.com"
+    client.post('/auth/register', json={'email': email, 'password': 'Password1!'})
+    token = client.post('/auth/login', json={'email': email, 'password': 'Password1!'}).get_json()['token']
+
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(['Id', 'Name'])
+    for i in range(rows):
+        ws.append([i, f'name_{i}'])
+    buf = io.BytesIO()
+    wb.save(buf)
+    buf.seek(0)
+    resp = client.post(
+        '/excel/upload',
+        data={'file': (buf, 'rows.xlsx')},
+        headers={'Authorization': f'Bearer {token}'},
+        content_type='multipart/form-data'
+    )
+    assert resp.status_code == 200, resp.data
+    return token, resp.get_json()['session_id']
+
+
+def test_rows_endpoint_returns_range(client):
+    token, session_id = _upload(client, rows=30)
+
+    resp = client.get(
+        f'/excel/conversation/{session_id}/rows?offset=10&limit=5&columns=Id',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+    assert resp.status_code == 200, resp.data
+    data = resp.get_json()['data']
+    assert data['total_rows'] == 30
+    assert data['rows'] == [{'Id': i} for i in range(10, 15)]
+
+
+def test_rows_endpoint_validates_input(client):
+    token, session_id = _upload(client, rows=3)
+    headers = {'Authorization': f'Bearer {token}'}
+
+    assert client.get(f'/excel/conversation/{session_id}/rows?limit=0', headers=headers).status_code == 400
+    assert client.get(f'/excel/conversation/{session_id}/rows?offset=-1', headers=headers).status_code == 400
+    assert client.get(f'/excel/conversation/{session_id}/rows?columns=Nope', headers=headers).status_code == 400
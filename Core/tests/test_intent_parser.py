@@ -0,0 +1,139 @@
+"""
+Tests for the rule-based fast path (IntentParser) in front of the LLM.
+"""
+import io
+import json
+import pytest
+import openpyxl
+import pandas as pd
+from unittest.mock import patch
+from uuid import uuid4
+
+from app.services.intent_parser import IntentParser
+from app.services.code_execution_service import CodeExecutionService
+
+COLUMNS = ['Name', 'Sales Total', 'Region']
+DTYPES = ['object', 'int64', 'object']
+
+
+def _frame():
+    return pd.DataFrame({
+        'Name': ['Alice', 'Bob', 'Alice', 'Carol'],
+        'Sales Total': [300, 100, 300, 200],
+        'Region': ['North', 'South', 'North', 'North'],
+    })
+
+
+def _run(prompt):
+    result = IntentParser.parse(prompt, COLUMNS, DTYPES, 4)
+    assert result is not None, f"Expected a fast-path match for {prompt!r}"
+    return CodeExecutionService.execute_transformation(_frame(), result['code'])
+
+
+@pytest.mark.parametrize("prompt", ["sort by sales total descending", "Ordena por 'Sales Total' descendente"])
+def test_sort(prompt):
+    assert _run(prompt)['Sales Total'].tolist() == [300, 300, 200, 100]
+
+
+@pytest.mark.parametrize("prompt", ["filter rows where Sales Total > 150", "filtra donde Sales Total mayor que 150"])
+def test_filter_numeric(prompt):
+    assert _run(prompt)['Sales Total'].tolist() == [300, 300, 200]
+
+
+def test_decimal_values_still_parse():
+    assert IntentParser._parse_value('1,5') == 1.5
+    assert IntentParser._parse_value('2.25') == 2.25
+    assert IntentParser._parse_value('1000') == 1000
+
+
+def test_filter_text_equality():
+    assert _run("keep rows where Region = 'North'")['Name'].tolist() == ['Alice', 'Alice', 'Carol']
+
+
+@pytest.mark.parametrize("prompt", ["drop column Region", "elimina la columna region"])
+def test_drop_column(prompt):
+    assert _run(prompt).columns.tolist() == ['Name', 'Sales Total']
+
+
+@pytest.mark.parametrize("prompt", ["rename Name to Customer", "renombra la columna Name a Customer"])
+def test_rename_column(prompt):
+    assert _run(prompt).columns.tolist() == ['Customer', 'Sales Total', 'Region']
+
+
+@pytest.mark.parametrize("prompt", ["set B3 to 999", "pon la celda B3 en 999"])
+def test_set_cell(prompt):
+    # Row 1 is the header, so B3 is the second data row of the second column
+    assert _run(prompt).iloc[1, 1] == 999
+
+
+@pytest.mark.parametrize("prompt", ["remove duplicates", "Elimina los duplicados."])
+def test_remove_duplicates(prompt):
+    assert len(_run(prompt)) == 3
+
+
+@pytest.mark.parametrize("prompt", [
+    "sort by Revenue",                       # unknown column
+    "filter where Region > 5",               # ordering comparison on a text column
+    "set B99 to 1",                          # out of range
+    "set B3 to =SUM(B2:B4)",                 # formulas belong to FORMULA_WRITE
+    "sort by sales and then remove outliers",
+    "double all values",
+    "filter where Sales Total > 1,000",      # thousands separator or decimal comma
+    "filtra donde Sales Total mayor que 1.000",
+    "set B3 to 2,500",
+    "keep rows where Sales Total = 'high'",  # text value against a numeric column
+    "filter where Sales Total is North",
+])
+def test_ambiguous_prompts_fall_through(prompt):
+    assert IntentParser.parse(prompt, COLUMNS, DTYPES, 4) is None
+
+
+def _make_authenticated_client(client):
+    email = f"fastpath_{uuid4().hex[:8]}@example.com"
+    client.post('/auth/register', json={'email': email, 'password': 'Password1!'})
+    resp = client.post('/auth/login', json={'email': email, 'password': 'Password1!'})
+    return resp.get_json()['token']
+
+
+def _upload_test_xlsx(client, token):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(['Name', 'Value'])
+    ws.append(['Alice', 100])
+    ws.append(['Bob', 300])
+    buf = io.BytesIO()
+    wb.save(buf)
+    buf.seek(0)
+    resp = client.post(
+        '/excel/upload',
+        data={'file': (buf, 'test.xlsx')},
+        headers={'Authorization': f'Bearer {token}'},
+        content_type='multipart/form-data'
+    )
+    assert resp.status_code == 200, f"Upload failed: {resp.data}"
+    return resp.get_json()['session_id']
+
+
+def test_transform_uses_fast_path_without_llm(client):
+    token = _make_authenticated_client(client)
+    session_id = _upload_test_xlsx(client, token)
+    before = IntentParser.stats()
+
+    with patch('app.routes.excel.LLMService.generate_transformation_code') as llm:
+        resp = client.post(
+            '/excel/transform',
+            data={'session_id': str(session_id), 'prompt': 'sort by Value descending'},
+            headers={'Authorization': f'Bearer {token}'},
+        )
+        body = resp.data.decode()
+
+    assert llm.call_count == 0
+    done = [block for block in body.split('\n\n') if block.startswith('event: done')]
+    assert done, f"No done event in: {body}"
+    payload = json.loads(done[0].split('data: ', 1)[1])
+    assert [row['Value'] for row in payload['data']['rows']] == [300, 100]
+
+    resp = client.get('/excel/metrics', headers={'Authorization': f'Bearer {token}'})
+    fast_path = resp.get_json()['metrics']['fast_path']
+    assert fast_path['hits'] == before['hits'] + 1
+    assert fast_path['rules']['sort'] >= 1
@@ -0,0 +1,84 @@
+"""
+Tests for the persistent LLM result cache (LLMCacheService).
+"""
+import json
+from unittest.mock import patch, MagicMock
+from uuid import uuid4
+
+from app.services import llm_cache_service
+from app.services.llm_cache_service import LLMCacheService
+from app.services.llm_service import LLMService
+
+
+def _response(payload: dict) -> MagicMock:
+    msg = MagicMock()
+    msg.content = json.dumps(payload)
+    choice = MagicMock()
+    choice.message = msg
+    response = MagicMock()
+    response.choices = [choice]
+    return response
+
+
+def test_key_normalizes_prompt_and_includes_schema():
+    base = LLMCacheService.make_key("Remove duplicates", ['a', 'b'], ['int64', 'object'], 'm')
+    assert base == LLMCacheService.make_key("  remove   DUPLICATES. ", ['a', 'b'], ['int64', 'object'], 'm')
+    assert base != LLMCacheService.make_key("remove duplicates", ['a', 'c'], ['int64', 'object'], 'm')
+    assert base != LLMCacheService.make_key("remove duplicates", ['a', 'b'], ['float64', 'object'], 'm')
+    assert base != LLMCacheService.make_key("remove duplicates", ['a', 'b'], ['int64', 'object'], 'other')
+
+
+def test_second_identical_request_skips_model(app):
+    columns = [f'col_{uuid4().hex[:6]}']
+    payload = {"code": "df = df.drop_duplicates()", "explanation": "dedupe", "intent": "DATA_MUTATION"}
+
+    with patch("litellm.completion", return_value=_response(payload)) as completion:
+        first = LLMService.generate_transformation_code("remove duplicates", columns, dtypes=['int64'])
+        second = LLMService.generate_transformation_code("Remove duplicates!", columns, dtypes=['int64'])
+
+    assert completion.call_count == 1
+    assert first['cached'] is False and second['cached'] is True
+    assert second['code'] == payload['code'] and second['intent'] == 'DATA_MUTATION'
+    assert LLMCacheService.stats()['hits'] >= 1
+
+
+def test_bypass_flag_calls_model(app):
+    columns = [f'col_{uuid4().hex[:6]}']
+    payload = {"code": [{"cell": "A1", "formula": "=SUM(B1:B2)"}], "explanation": "sum", "intent": "FORMULA_WRITE"}
+
+    with patch("litellm.completion", return_value=_response(payload)) as completion:
+        LLMService.generate_transformation_code("sum", columns)
+        cached = LLMService.generate_transformation_code("sum", columns)
+        LLMService.generate_transformation_code("sum", columns, use_cache=False)
+
+    assert completion.call_count == 2
+    assert cached['code'] == payload['code'], "FORMULA_WRITE instructions come back as a list"
+
+
+def test_expired_entry_is_a_miss(app, monkeypatch):
+    key = LLMCacheService.make_key(uuid4().hex, ['a'], None, 'm')
+    LLMCacheService.put(key, 'm', 'p', {"code": "pass", "explanation": "", "intent": "DATA_MUTATION"})
+    monkeypatch.setattr(llm_cache_service, 'LLM_CACHE_TTL_HOURS', 0)
+    assert LLMCacheService.get(key) is None
+
+
+def test_size_cap_evicts_least_recently_used(app, monkeypatch):
+    from config.database import SessionLocal
+    from app.models.llm_cache import LLMCacheEntry
+
+    session = SessionLocal()
+    session.query(LLMCacheEntry).delete()
+    session.commit()
+    session.close()
+    monkeypatch.setattr(llm_cache_service, 'LLM_CACHE_MAX_ENTRIES', 2)
+
+    keys = [LLMCacheService.make_key(uuid4().hex, ['a'], None, 'm') for _ in range(3)]
+    LLMCacheService.put(keys[0], 'm', 'first', {"code": "pass", "intent": "DATA_MUTATION"})
+    LLMCacheService.put(keys[1], 'm', 'second', {"code": "pass", "intent": "DATA_MUTATION"})
+    assert LLMCacheService.get(keys[0]) is not None  # first becomes most recently used
+    LLMCacheService.put(keys[2], 'm', 'third', {"code": "pass", "intent": "DATA_MUTATION"})
+
+    assert LLMCacheService.stats()['entries'] == 2
+    assert LLMCacheService.get(keys[1]) is None
+    assert LLMCacheService.get(keys[0]) is not None
+    assert LLMCacheService.get(keys[2]) is not None
@@ -0,0 +1,157 @@
+"""
+Tests for the background LLM call: heartbeats while the model is silent, cancellation when
+the stream is closed (client disconnect), the hard timeout and the thread-pool fallback.
+"""
+import io
+import json
+import time
+import asyncio
+import threading
+import openpyxl
+from types import SimpleNamespace
+from unittest.mock import patch
+from uuid import uuid4
+
+import pytest
+
+from app.services import llm_service
+from app.services.llm_service import LLMService, LLMTimeout
+
+
+class _SlowModel:
+    """litellm.acompletion stand-in that never answers; records when its request is cancelled."""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.cancelled = threading.Event()
+
+    async def __call__(self, **request):
+        self.started.set()
+        try:
+            await asyncio.sleep(30)
+        except asyncio.CancelledError:
+            self.cancelled.set()
+            raise
+
+
+@pytest.fixture
+def fast_heartbeat(monkeypatch):
+    monkeypatch.setattr(llm_service, 'LLM_HEARTBEAT_SECONDS', 0.05)
+
+
+def _columns():
+    return [f'col_{uuid4().hex[:6]}']  # Unique schema: never answered from the LLM cache
+
+
+def test_silent_model_yields_heartbeats_and_close_cancels_it(app, fast_heartbeat):
+    model = _SlowModel()
+    with patch('litellm.acompletion', new=model):
+        stream = LLMService.generate_transformation_code('double it', _columns(), stream=True)
+        assert next(stream) == ('waiting', None)
+        assert next(stream) == ('waiting', None)
+        stream.close()
+
+    assert model.started.is_set()
+    assert model.cancelled.wait(2), "Closing the stream must abort the provider request"
+
+
+def test_hard_timeout(app, fast_heartbeat, monkeypatch):
+    monkeypatch.setattr(llm_service, 'LLM_TIMEOUT_SECONDS', 0.2)
+    model = _SlowModel()
+    started = time.monotonic()
+    with patch('litellm.acompletion', new=model), pytest.raises(LLMTimeout):
+        list(LLMService.generate_transformation_code('double it', _columns(), stream=True))
+
+    assert time.monotonic() - started < 2
+    assert model.cancelled.wait(2)
+
+
+def test_thread_pool_fallback_stops_reading_once_closed(app, fast_heartbeat, monkeypatch):
+    monkeypatch.setattr(llm_service, 'LLM_ASYNC_ENABLED', False)
+    read = []
+    finished = threading.Event()
+
+    def slow_chunks(**request):
+        try:
+            for position in range(20):
+                time.sleep(0.1)  # Slower than the heartbeat
+                read.append(position)
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=' '))])
+        finally:
+            finished.set()
+
+    with patch('litellm.completion', side_effect=slow_chunks):
+        stream = LLMService.generate_transformation_code('double it', _columns(), stream=True)
+        next(stream)
+        stream.close()
+        assert finished.wait(2), "The pool thread must stop consuming the stream"
+    assert len(read) < 20
+
+
+def _make_authenticated_client(client):
+    email = f"cancel_{uuid4().hex[:8]}@example.com"
+    client.post('/auth/register', json={'email': email, 'password': 'Password1!'})
+    resp = client.post('/auth/login', json={'email': email, 'password': 'Password1!'})
+    return resp.get_json()['token']
+
+
+def _upload_test_xlsx(client, token):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append([f'Value_{uuid4().hex[:6]}'])
+    ws.append([100])
+    buf = io.BytesIO()
+    wb.save(buf)
+    buf.seek(0)
+    resp = client.post(
+        '/excel/upload',
+        data={'file': (buf, 'test.xlsx')},
+        headers={'Authorization': f'Bearer {token}'},
+        content_type='multipart/form-data'
+    )
+    assert resp.status_code == 200, f"Upload failed: {resp.data}"
+    return resp.get_json()['session_id']
+
+
+def test_disconnect_abandons_the_transform(client, fast_heartbeat):
+    from app.models import Command
+    from config.database import SessionLocal
+    token = _make_authenticated_client(client)
+    session_id = _upload_test_xlsx(client, token)
+    model = _SlowModel()
+
+    with patch('litellm.acompletion', new=model), \
+            patch('app.routes.excel.CodeExecutionService.execute_transformation') as execute:
+        resp = client.post(
+            '/excel/transform',
+            data={'session_id': str(session_id), 'prompt': 'make every value twice as large'},
+            headers={'Authorization': f'Bearer {token}'},
+            buffered=False
+        )
+        chunks = iter(resp.response)
+        received = ''
+        while ': keepalive' not in received:
+            chunk = next(chunks)
+            received += chunk.decode() if isinstance(chunk, bytes) else chunk
+        resp.close()  # What the server does when a write to the closed socket fails
+
+    assert model.cancelled.wait(2), "The model call is cancelled with the stream"
+    execute.assert_not_called()
+    with SessionLocal() as db:
+        assert db.query(Command).filter_by(conversation_id=session_id).count() == 0
+
+
+def test_timeout_reaches_the_client(client, fast_heartbeat, monkeypatch):
+    monkeypatch.setattr(llm_service, 'LLM_TIMEOUT_SECONDS', 0.2)
+    token = _make_authenticated_client(client)
+    session_id = _upload_test_xlsx(client, token)
+
+    with patch('litellm.acompletion', new=_SlowModel()):
+        body = client.post(
+            '/excel/transform',
+            data={'session_id': str(session_id), 'prompt': 'make every value twice as large'},
+            headers={'Authorization': f'Bearer {token}'}
+        ).get_data(as_text=True)
+
+    error = [block for block in body.split('\n\n') if block.startswith('event: error')]
+    assert error and 'tardó demasiado' in json.loads(error[0].split('data: ', 1)[1])['error']
@@ -0,0 +1,204 @@
+"""
+Tests for the LLM governor: fair per-user queueing, queue-position progress events,
+retries with backoff on 429/5xx and the circuit breaker.
+"""
+import io
+import json
+import time
+import threading
+import openpyxl
+import litellm
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+from uuid import uuid4
+
+import pytest
+
+from app.services import llm_governor as governor_module
+from app.services import llm_service
+from app.services.llm_governor import LLMGovernor, LLMUnavailable
+from app.services.llm_service import LLMService
+
+PAYLOAD = {"intent": "DATA_MUTATION", "explanation": "Duplica los valores.", "code": "df['v'] = df['v'] * 2"}
+
+
+class _ProviderError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class _AsyncChunks:
+    def __init__(self, text: str, size: int = 7):
+        self.chunks = [SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text[i:i + size]))])
+                       for i in range(0, len(text), size)]
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+@pytest.fixture
+def governor(monkeypatch):
+    """A private governor (one slot, fast backoff) in place of the process-wide one."""
+    instance = LLMGovernor(max_concurrency=1, threshold=2, cooldown=0.2)
+    monkeypatch.setattr(llm_service, 'llm_governor', instance)
+    monkeypatch.setattr(llm_service, 'LLM_HEARTBEAT_SECONDS', 0.05)
+    monkeypatch.setattr(governor_module, 'LLM_RETRY_BASE_SECONDS', 0.01)
+    return instance
+
+
+def _columns():
+    return [f'col_{uuid4().hex[:6]}']  # Unique schema: never answered from the LLM cache
+
+
+def test_queue_is_round_robin_across_users():
+    governor = LLMGovernor(max_concurrency=1)
+    holder = governor.enqueue('a')
+    assert holder.granted.is_set()
+
+    a1, a2, a3 = governor.enqueue('a'), governor.enqueue('a'), governor.enqueue('a')
+    b1 = governor.enqueue('b')
+    assert [governor.position(t) for t in (a1, b1, a2, a3)] == [1, 2, 3, 4]
+
+    governor.leave(holder)
+    assert a1.granted.is_set() and not a2.granted.is_set()
+    governor.leave(a1)
+    assert b1.granted.is_set(), "The second user is served before the first one's backlog"
+    assert not a2.granted.is_set()
+
+    governor.leave(a3)  # Abandoned while waiting
+    stats = governor.stats()
+    assert stats["in_flight"] == 1 and stats["queue_depth"] == 1 and stats["cancelled"] == 1
+    assert stats["granted"] == 3 and stats["max_queue_depth"] == 4 and stats["avg_wait_ms"] is not None
+
+
+def test_breaker_opens_on_outages_and_probes_after_cooldown():
+    governor = LLMGovernor(max_concurrency=4, threshold=2, cooldown=0.1)
+    governor.record_failure(_ProviderError(429))
+    governor.record_failure(_ProviderError(429))
+    governor.leave(governor.enqueue())  # Rate limits never open the circuit
+
+    governor.record_failure(_ProviderError(503))
+    governor.record_failure(_ProviderError(502))
+    with pytest.raises(LLMUnavailable):
+        governor.enqueue()
+    assert governor.stats()["breaker"] == "open"
+
+    time.sleep(0.12)
+    probe = governor.enqueue()
+    with pytest.raises(LLMUnavailable):
+        governor.enqueue()  # Only one probe while half-open
+    governor.record_success()
+    governor.leave(probe)
+    governor.leave(governor.enqueue())
+    stats = governor.stats()
+    assert stats["breaker"] == "closed" and stats["rejected"] == 2 and stats["breaker_opened"] == 1
+
+
+def test_stream_retries_rate_limits_before_the_first_token(app, governor):
+    model = AsyncMock(side_effect=[
+        litellm.RateLimitError('slow down', 'openai', 'm'),
+        _ProviderError(503),
+        _AsyncChunks(json.dumps(PAYLOAD)),
+    ])
+    with patch('litellm.acompletion', new=model):
+        events = list(LLMService.generate_transformation_code('double it', _columns(), stream=True))
+
+    assert events[-1][0] == 'result' and events[-1][1]['code'] == PAYLOAD['code']
+    assert model.call_count == 3
+    stats = governor.stats()
+    assert stats["retries"] == 2 and stats["failures"] == 1 and stats["in_flight"] == 0
+    assert stats["breaker"] == "closed"
+
+
+def test_client_errors_are_not_retried(app, governor):
+    model = AsyncMock(side_effect=_ProviderError(400))
+    with patch('litellm.acompletion', new=model), pytest.raises(Exception, match='No se pudo generar'):
+        list(LLMService.generate_transformation_code('double it', _columns(), stream=True))
+    assert model.call_count == 1
+    assert governor.stats()["retries"] == 0
+
+
+def test_open_circuit_fails_fast_without_calling_the_model(app, governor):
+    governor.record_failure(_ProviderError(500))
+    governor.record_failure(_ProviderError(500))
+    model = AsyncMock()
+    with patch('litellm.acompletion', new=model), pytest.raises(LLMUnavailable):
+        list(LLMService.generate_transformation_code('double it', _columns(), stream=True))
+    model.assert_not_called()
+
+
+def test_non_streaming_call_goes_through_the_governor(app, governor):
+    response = SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=json.dumps(PAYLOAD)))])
+    with patch('litellm.completion', side_effect=[_ProviderError(503), response]) as completion:
+        result = LLMService.generate_transformation_code('double it', _columns(), user_id=7)
+    assert result['code'] == PAYLOAD['code'] and completion.call_count == 2
+    assert governor.stats()["granted"] == 1 and governor.stats()["in_flight"] == 0
+
+
+def _make_authenticated_client(client):
+    email = f"governor_{uuid4().hex[:8]}@example.com"
+    client.post('/auth/register', json={'email': email, 'password': 'Password1!'})
+    resp = client.post('/auth/login', json={'email': email, 'password': 'Password1!'})
+    return resp.get_json()['token']
+
+
+def _upload_test_xlsx(client, token):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append([f'Value_{uuid4().hex[:6]}'])
+    ws.append([100])
+    buf = io.BytesIO()
+    wb.save(buf)
+    buf.seek(0)
+    resp = client.post(
+        '/excel/upload',
+        data={'file': (buf, 'test.xlsx')},
+        headers={'Authorization': f'Bearer {token}'},
+        content_type='multipart/form-data'
+    )
+    assert resp.status_code == 200, f"Upload failed: {resp.data}"
+    return resp.get_json()['session_id']
+
+
+def _events(body: str, name: str):
+    return [json.loads(block.split('data: ', 1)[1]) for block in body.split('\n\n') if block.startswith(f'event: {name}')]
+
+
+def test_queued_transform_reports_its_position(client, governor, monkeypatch):
+    monkeypatch.setattr('app.routes.excel.llm_governor', governor)
+    token = _make_authenticated_client(client)
+    session_id = _upload_test_xlsx(client, token)
+    payload = {"intent": "DATA_MUTATION", "explanation": "Duplica.", "code": "df.iloc[:, 0] = df.iloc[:, 0] * 2"}
+
+    holder = governor.enqueue('someone else')
+    threading.Timer(0.3, governor.leave, [holder]).start()
+    with patch('litellm.acompletion', new=AsyncMock(return_value=_AsyncChunks(json.dumps(payload)))):
+        body = client.post(
+            '/excel/transform',
+            data={'session_id': str(session_id), 'prompt': f'make every value twice as large {uuid4().hex[:6]}'},
+            headers={'Authorization': f'Bearer {token}'}
+        ).get_data(as_text=True)
+
+    queued = [event for event in _events(body, 'progress') if 'queue_position' in event]
+    assert queued and queued[0]['queue_position'] == 1
+    assert _events(body, 'done'), body
+
+    metrics = client.get('/excel/metrics', headers={'Authorization': f'Bearer {token}'}).get_json()['metrics']
+    assert metrics['llm_governor']['granted'] == 2 and metrics['llm_governor']['max_wait_ms'] >= 200
+
+
+def test_open_circuit_reaches_the_client(client, governor):
+    token = _make_authenticated_client(client)
+    session_id = _upload_test_xlsx(client, token)
+    governor.record_failure(_ProviderError(503))
+    governor.record_failure(_ProviderError(503))
+
+    body = client.post(
+        '/excel/transform',
+        data={'session_id': str(session_id), 'prompt': f'make every value twice as large {uuid4().hex[:6]}'},
+        headers={'Authorization': f'Bearer {token}'}
+    ).get_data(as_text=True)
+    error = _events(body, 'error')
+    assert error and 'no está disponible' in error[0]['error']
@@ -0,0 +1,110 @@
+"""
+Tests for streamed LLM generation (token SSE events on /transform).
+"""
+import io
+import json
+import openpyxl
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+from uuid import uuid4
+
+from app.services.llm_service import LLMService, _ExplanationStream
+
+
+def _chunks(text: str, size: int = 7):
+    """litellm-shaped streaming chunks of `text`."""
+    return iter([
+        SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text[i:i + size]))])
+        for i in range(0, len(text), size)
+    ])
+
+
+class _AsyncChunks:
+    """What an awaited litellm.acompletion(stream=True) returns: an async iterator of chunks."""
+
+    def __init__(self, text: str, size: int = 7):
+        self.chunks = list(_chunks(text, size))
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+def _acompletion(text: str):
+    return AsyncMock(return_value=_AsyncChunks(text))
+
+
+def test_explanation_stream_decodes_split_escapes():
+    raw = json.dumps({"intent": "DATA_MUTATION", "explanation": 'Duplica "Valor" é\n', "code": "pass"})
+    stream = _ExplanationStream()
+    text = ''.join(stream.feed(raw[i:i + 3]) for i in range(0, len(raw), 3))
+    assert text == 'Duplica "Valor" é\n'
+    assert stream.finished
+
+
+def test_stream_yields_tokens_then_result(app):
+    payload = {"intent": "DATA_MUTATION", "explanation": "Doubles every value in the column.", "code": "df['v'] = df['v'] * 2"}
+    columns = [f'col_{uuid4().hex[:6]}']
+
+    with patch("litellm.acompletion", new=_acompletion(json.dumps(payload))) as completion:
+        events = list(LLMService.generate_transformation_code("double", columns, stream=True))
+
+    assert completion.call_args.kwargs.get('stream') is True
+    tokens = [value for event, value in events if event == 'token']
+    assert len(tokens) > 1, "Explanation should arrive in several pieces"
+    assert ''.join(tokens) == payload['explanation']
+    assert events[-1][0] == 'result'
+    assert events[-1][1]['code'] == payload['code'] and events[-1][1]['cached'] is False
+
+    # A cache hit replays the explanation as a single token
+    cached = list(LLMService.generate_transformation_code("double", columns, stream=True))
+    assert cached[0] == ('token', payload['explanation'])
+    assert cached[-1][1]['cached'] is True
+
+
+def _make_authenticated_client(client):
+    email = f"streamtest_{uuid4().hex[:8]}@example.com"
+    client.post('/auth/register', json={'email': email, 'password': 'Password1!'})
+    resp = client.post('/auth/login', json={'email': email, 'password': 'Password1!'})
+    return resp.get_json()['token']
+
+
+def _upload_test_xlsx(client, token):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append([f'Value_{uuid4().hex[:6]}'])  # Unique schema so the LLM cache cannot answer
+    ws.append([100])
+    buf = io.BytesIO()
+    wb.save(buf)
+    buf.seek(0)
+    resp = client.post(
+        '/excel/upload',
+        data={'file': (buf, 'test.xlsx')},
+        headers={'Authorization': f'Bearer {token}'},
+        content_type='multipart/form-data'
+    )
+    assert resp.status_code == 200, f"Upload failed: {resp.data}"
+    body = resp.get_json()
+    return body['session_id'], body['data']['columns'][0]
+
+
+def test_transform_emits_token_events_before_done(client):
+    token = _make_authenticated_client(client)
+    session_id, column = _upload_test_xlsx(client, token)
+    payload = {"intent": "DATA_MUTATION", "explanation": "Doubles the values.", "code": f"df['{column}'] = df['{column}'] * 2"}
+
+    with patch("litellm.acompletion", new=_acompletion(json.dumps(payload))):
+        resp = client.post(
+            '/excel/transform',
+            data={'session_id': str(session_id), 'prompt': 'make every value twice as large'},
+            headers={'Authorization': f'Bearer {token}'},
+        )
+        blocks = [block for block in resp.data.decode().split('\n\n') if block]
+
+    events = [block.split('\n')[0][len('event: '):] for block in blocks]
+    assert 'token' in events and events[-1] == 'done'
+    assert events.index('token') < events.index('done')
+    text = ''.join(json.loads(block.split('data: ', 1)[1])['text'] for block in blocks if block.startswith('event: token'))
+    assert text == payload['explanation']
+    done = json.loads(blocks[-1].split('data: ', 1)[1])
+    assert done['data']['rows'][0][column] == 200
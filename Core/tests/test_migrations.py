@@ -0,0 +1,130 @@
+"""
+Tests for the schema migration runner (Core/migrations, migrate.py).
+"""
+import io
+import openpyxl
+from uuid import uuid4
+from sqlalchemy import create_engine, inspect, text
+
+import migrations
+
+
+# Schema as created by Base.metadata.create_all before stored bytecode, file hashes,
+# history indexes and denormalized heads existed
+LEGACY_SCHEMA = [
+    """CREATE TABLE users (id INTEGER PRIMARY KEY, email VARCHAR(120) NOT NULL UNIQUE,
+        password VARCHAR(255) NOT NULL, is_active BOOLEAN NOT NULL, created_at DATETIME NOT NULL)""",
+    """CREATE TABLE conversations (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES users(id),
+        file_path VARCHAR(255) NOT NULL, filename VARCHAR(255) NOT NULL, is_active BOOLEAN,
+        created_at DATETIME NOT NULL, expires_at DATETIME)""",
+    """CREATE TABLE commands (id INTEGER PRIMARY KEY, conversation_id INTEGER NOT NULL REFERENCES conversations(id),
+        prompt TEXT NOT NULL, chart_generated_code TEXT, generated_code TEXT NOT NULL, explanation TEXT,
+        intent_type VARCHAR(20) NOT NULL, is_active BOOLEAN NOT NULL, created_at DATETIME NOT NULL)""",
+]
+
+
+def _legacy_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as connection:
+        for ddl in LEGACY_SCHEMA:
+            connection.execute(text(ddl))
+        connection.execute(text("INSERT INTO users VALUES (1, 'a@b.c', 'x', 1, '2024-01-01')"))
+        for conversation_id in range(1, 6):
+            connection.execute(text(
+                "INSERT INTO conversations VALUES (:id, 1, 'f.xlsx', 'f.xlsx', 1, '2024-01-01', NULL)"
+            ), {'id': conversation_id})
+        # Conversation 1: mutation, chart, mutation, undone chart; 2..5 have no commands
+        for command_id, chart, active in [(1, None, 1), (2, 'fig = 1', 1), (3, None, 1), (4, 'fig = 2', 0)]:
+            connection.execute(text(
+                "INSERT INTO commands VALUES (:id, 1, 'p', :chart, 'pass', NULL, 'DATA_MUTATION', :active, '2024-01-01')"
+            ), {'id': command_id, 'chart': chart, 'active': active})
+    return engine
+
+
+def test_upgrade_legacy_database(tmp_path, monkeypatch):
+    monkeypatch.setattr(migrations, 'BACKFILL_BATCH_SIZE', 2)
+    engine = _legacy_engine(tmp_path)
+
+    assert migrations.upgrade(engine, log=lambda line: None) == ['0001', '0002', '0003', '0004', '0005']
+
+    inspector = inspect(engine)
+    assert 'llm_cache' in inspector.get_table_names()
+    assert {'code_hash', 'compiled_code'} <= {c['name'] for c in inspector.get_columns('commands')}
+    assert {'llm_ms', 'exec_ms', 'rows_in', 'rows_out', 'payload_bytes'} <= \
+        {c['name'] for c in inspector.get_columns('commands')}
+    assert {'file_hash', 'head_command_id', 'active_chart_command_id'} <= \
+        {c['name'] for c in inspector.get_columns('conversations')}
+    assert {i['name']: i['column_names'] for i in inspector.get_indexes('commands')}[
+        'ix_commands_conversation_active_id'] == ['conversation_id', 'is_active', 'id']
+    assert {'ix_conversations_user_active_created', 'ix_conversations_active_expires'} <= \
+        {i['name'] for i in inspector.get_indexes('conversations')}
+
+    with engine.connect() as connection:
+        heads = connection.execute(text(
+            "SELECT id, head_command_id, active_chart_command_id FROM conversations ORDER BY id"
+        )).all()
+    assert heads[0] == (1, 3, 2), "Undone commands are not heads"
+    assert all(row[1:] == (None, None) for row in heads[1:])
+
+    assert migrations.upgrade(engine) == [], "Applied versions are recorded"
+
+
+def test_upgrade_adopts_a_create_all_database(tmp_path):
+    from config.database import Base
+    engine = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    Base.metadata.create_all(engine)
+    assert migrations.upgrade(engine, target='0003', log=lambda line: None) == ['0001', '0002', '0003']
+    assert migrations.applied(engine) == ['0001', '0002', '0003']
+    assert migrations.upgrade(engine, log=lambda line: None) == ['0004', '0005']
+
+
+def _make_authenticated_client(client):
+    email = f"heads_{uuid4().hex[:8]}@example.com"
+    client.post('/auth/register', json={'email': email, 'password': 'Password1!'})
+    resp = client.post('/auth/login', json={'email': email, 'password': 'Password1!'})
+    return resp.get_json()['token']
+
+
+def _upload_test_xlsx(client, token):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(['Name', 'Value'])
+    ws.append(['Alice', 100])
+    buf = io.BytesIO()
+    wb.save(buf)
+    buf.seek(0)
+    resp = client.post(
+        '/excel/upload',
+        data={'file': (buf, 'test.xlsx')},
+        headers={'Authorization': f'Bearer {token}'},
+        content_type='multipart/form-data'
+    )
+    assert resp.status_code == 200, f"Upload failed: {resp.data}"
+    return resp.get_json()['session_id']
+
+
+def test_state_manager_keeps_heads_in_sync(client):
+    from app.services.state_manager import StateManager
+    from config.database import engine
+
+    def heads(session_id):
+        with engine.connect() as connection:
+            return tuple(connection.execute(text(
+                "SELECT head_command_id, active_chart_command_id FROM conversations WHERE id = :id"
+            ), {'id': session_id}).first())
+
+    token = _make_authenticated_client(client)
+    session_id = _upload_test_xlsx(client, token)
+    assert heads(session_id) == (None, None)
+
+    first = StateManager.add_command(session_id, 'p', "df['a'] = 1")
+    chart = StateManager.add_command(session_id, 'p', 'pass', chart_code='fig = 1', intent_type='VISUAL_UPDATE')
+    last = StateManager.add_command(session_id, 'p', "df['b'] = 2")
+    assert heads(session_id) == (last, chart)
+
+    StateManager.undo_last_command(session_id)
+    StateManager.undo_last_command(session_id)
+    assert heads(session_id) == (first, None)
+
+    StateManager.clear_commands(session_id)
+    assert heads(session_id) == (None, None)
@@ -0,0 +1,97 @@
+"""
+Tests that requests load conversation state in a fixed number of queries (no N+1).
+"""
+import io
+import re
+import openpyxl
+from contextlib import contextmanager
+from unittest.mock import patch
+from uuid import uuid4
+from sqlalchemy import event
+
+import config.database
+from config.database import engine, SessionLocal, close_db_session
+
+
+@contextmanager
+def _count_queries():
+    # pytest-flask keeps one app context (and so one g) around the whole test: drop the
+    # request session first so the measured request starts like a production request
+    close_db_session()
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+
+def _selects(statements):
+    return [s for s in statements if re.match(r'\s*SELECT', s, re.I)]
+
+
+def _make_authenticated_client(client):
+    email = f"queries_{uuid4().hex[:8]}@example.com"
+    client.post('/auth/register', json={'email': email, 'password': 'Password1!'})
+    resp = client.post('/auth/login', json={'email': email, 'password': 'Password1!'})
+    return resp.get_json()['token']
+
+
+def _upload_test_xlsx(client, token):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(['Name', 'Value'])
+    ws.append(['Alice', 100])
+    ws.append(['Bob', 200])
+    buf = io.BytesIO()
+    wb.save(buf)
+    buf.seek(0)
+    resp = client.post(
+        '/excel/upload',
+        data={'file': (buf, 'test.xlsx')},
+        headers={'Authorization': f'Bearer {token}'},
+        content_type='multipart/form-data'
+    )
+    assert resp.status_code == 200, f"Upload failed: {resp.data}"
+    return resp.get_json()['session_id']
+
+
+def _transform(client, session_id, auth, code, intent='DATA_MUTATION'):
+    reply = {'code': code, 'explanation': 'ok', 'intent': intent}
+    with patch('app.routes.excel.LLMService.generate_transformation_code', return_value=reply):
+        return client.post('/excel/transform', data={'session_id': str(session_id), 'prompt': 'step'}, headers=auth).get_data()
+
+
+def test_requests_use_fixed_query_counts(client):
+    token = _make_authenticated_client(client)
+    auth = {'Authorization': f'Bearer {token}'}
+    session_id = _upload_test_xlsx(client, token)
+    _transform(client, session_id, auth, "df['Value'] = df['Value'] + 1")
+
+    with _count_queries() as short_history:
+        client.get(f'/excel/conversation/{session_id}', headers=auth)
+    for _ in range(5):
+        _transform(client, session_id, auth, "df['Value'] = df['Value'] + 1")
+    _transform(client, session_id, auth, "fig = px.bar(df, x='Name', y='Value')", intent='VISUAL_UPDATE')
+    with _count_queries() as long_history:
+        client.get(f'/excel/conversation/{session_id}', headers=auth)
+
+    # Version lookup + conversation joined with its commands, whatever the history length
+    assert len(short_history) == len(long_history) == 2, long_history
+
+    with _count_queries() as transform:
+        _transform(client, session_id, auth, "df['Value'] = df['Value'] + 1")
+    # Session load + stale-command lookup, insert + head update in one transaction, then
+    # the request's metrics onto the new command
+    assert len(_selects(transform)) == 2 and len(transform) == 5, transform
+
+    with _count_queries() as undo, \
+            patch.object(config.database, 'SessionLocal', wraps=SessionLocal) as sessions:
+        resp = client.post('/excel/undo', data={'session_id': str(session_id)}, headers=auth)
+    assert resp.get_json()['has_chart'] is True, "Chart code comes from the loaded history"
+    assert len(undo) == 3 and len(_selects(undo)) == 1, undo
+    assert sessions.call_count == 1, "One session (and connection) per request"
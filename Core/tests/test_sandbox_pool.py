@@ -0,0 +1,161 @@
+"""
+Tests for the warm process-pool sandbox (SandboxPool).
+"""
+import io
+import json
+import pytest
+import threading
+import openpyxl
+import pandas as pd
+from unittest.mock import patch
+from uuid import uuid4
+
+from app.services.sandbox_pool import SandboxPool, SandboxError
+from app.services.code_execution_service import CodeExecutionService
+from app.services.dataframe_cache import dataframe_cache
+
+
+@pytest.fixture(scope='module')
+def pool():
+    pool = SandboxPool(workers=1, timeout=10, memory_mb=1024)
+    yield pool
+    pool.shutdown()
+
+
+def _compiled(code):
+    return CodeExecutionService.compile_transformation(code)
+
+
+def test_transformation_round_trips_frame(pool):
+    df = pd.DataFrame({
+        'name': ['a', None, 'c'],
+        'value': [1, 2, 3],
+        'when': pd.to_datetime(['2024-01-01', '2024-02-01', None]),
+    }, index=[10, 20, 30])
+    result = pool.run_transformation(df, _compiled("df['value'] = df['value'] * 2"))
+    expected = df.copy()
+    expected['value'] = expected['value'] * 2
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_mixed_object_columns_travel_as_text(pool):
+    df = pd.DataFrame({'a': [1, 'x', None], 'b': ['p', 'q', 'r']})
+    with patch('pandas.read_pickle', side_effect=AssertionError("nothing is unpickled")):
+        result = pool.run_transformation(df, _compiled("df['c'] = 1"))
+    assert result['a'].tolist() == ['1', 'x', None]
+    assert result['b'].tolist() == ['p', 'q', 'r']
+
+
+def test_errors_keep_their_type(pool):
+    with pytest.raises(ValueError, match="empty"):
+        pool.run_transformation(pd.DataFrame({'a': [1]}), _compiled("df = df[df['a'] > 5]"))
+    with pytest.raises(Exception, match="Code execution error"):
+        pool.run_transformation(pd.DataFrame({'a': [1]}), _compiled("df['b'] = df['missing']"))
+
+
+def test_chart_generation(pool):
+    chart = pool.run_chart_generation(pd.DataFrame({'x': [1, 2], 'y': [3, 4]}), "fig = px.bar(df, x='x', y='y')")
+    assert 'data' in json.loads(chart)
+
+
+def test_timeout_kills_and_respawns(pool):
+    spin = _compiled("for i in pd.RangeIndex(10 ** 12):\n    pass")
+    with pytest.raises(SandboxError, match="timed out"):
+        pool.run_transformation(pd.DataFrame({'a': [1]}), spin, timeout=1)
+    assert pool.stats()['timeouts'] >= 1
+    # The replacement worker serves the next task
+    assert pool.run_transformation(pd.DataFrame({'a': [1]}), _compiled("df['a'] = 2"))['a'].tolist() == [2]
+
+
+def test_memory_ceiling_kills_worker():
+    pool = SandboxPool(workers=1, timeout=20, memory_mb=400)
+    try:
+        hog = _compiled("blocks = [np.ones(10 ** 6) for i in pd.RangeIndex(10 ** 5)]")
+        with pytest.raises(SandboxError, match="memory limit"):
+            pool.run_transformation(pd.DataFrame({'a': [1]}), hog)
+        assert pool.stats()['memory_kills'] == 1
+    finally:
+        pool.shutdown()
+
+
+def test_single_large_allocation_hits_the_address_space_limit():
+    """One 4 GB request: RSS polling never sees it, RLIMIT_AS refuses it."""
+    pool = SandboxPool(workers=1, timeout=20, memory_mb=400)
+    try:
+        with pytest.raises(SandboxError, match="memory limit"):
+            pool.run_transformation(pd.DataFrame({'a': [1]}), _compiled("df['b'] = np.ones(5 * 10 ** 8)[:1]"))
+        assert pool.stats()['memory_kills'] == 1
+        assert pool.run_transformation(pd.DataFrame({'a': [1]}), _compiled("df['a'] = 2"))['a'].tolist() == [2]
+    finally:
+        pool.shutdown()
+
+
+def test_waiting_for_a_busy_pool_times_out():
+    pool = SandboxPool(workers=1, timeout=20, memory_mb=0, queue_timeout=0.5)
+    try:
+        spin = _compiled("for i in pd.RangeIndex(10 ** 12):\n    pass")
+        busy = threading.Thread(
+            target=lambda: pytest.raises(SandboxError, pool.run_transformation, pd.DataFrame({'a': [1]}), spin, 3),
+            daemon=True)
+        busy.start()
+        while pool.stats()['idle'] != 0:  # The spin holds the only worker
+            busy.join(0.05)
+        with pytest.raises(SandboxError, match="no sandbox worker"):
+            pool.run_transformation(pd.DataFrame({'a': [1]}), _compiled("df['a'] = 2"))
+        assert pool.stats()['queue_timeouts'] == 1
+        busy.join()
+    finally:
+        pool.shutdown()
+
+
+def _make_authenticated_client(client):
+    email = f"sandbox_{uuid4().hex[:8]}@example.com"
+    client.post('/auth/register', json={'email': email, 'password': 'Password1!'})
+    resp = client.post('/auth/login', json={'email': email, 'password': 'Password1!'})
+    return resp.get_json()['token']
+
+
+def _upload_test_xlsx(client, token):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(['Name', 'Value'])
+    ws.append(['Alice', 100])
+    ws.append([None, 200])
+    buf = io.BytesIO()
+    wb.save(buf)
+    buf.seek(0)
+    resp = client.post(
+        '/excel/upload',
+        data={'file': (buf, 'test.xlsx')},
+        headers={'Authorization': f'Bearer {token}'},
+        content_type='multipart/form-data'
+    )
+    assert resp.status_code == 200, f"Upload failed: {resp.data}"
+    return resp.get_json()['session_id']
+
+
+def test_transform_round_trip_through_the_sandbox(client, pool, monkeypatch):
+    """conftest runs generated code in-process; this request goes through a real worker, as in production."""
+    monkeypatch.setattr('app.services.code_execution_service.sandbox_pool', pool)
+    token = _make_authenticated_client(client)
+    auth = {'Authorization': f'Bearer {token}'}
+    session_id = _upload_test_xlsx(client, token)
+    tasks = pool.stats()['tasks']
+
+    reply = {"code": "df['Value'] = df['Value'] * 2\ndf['Label'] = df['Name'].fillna('?')",
+             "explanation": "Doble.", "intent": "DATA_MUTATION", "cached": False, "cache_key": None}
+    with patch('app.routes.excel.LLMService.generate_transformation_code', return_value=reply):
+        body = client.post(
+            '/excel/transform',
+            data={'session_id': str(session_id), 'prompt': 'double every value and label the names'},
+            headers=auth
+        ).get_data(as_text=True)
+    assert 'event: done' in body, body
+    assert pool.stats()['tasks'] > tasks, "The generated code ran in the sandbox"
+
+    dataframe_cache.invalidate(session_id)  # The next read replays the command from the upload
+    tasks = pool.stats()['tasks']
+    rows = client.get(f'/excel/conversation/{session_id}', headers=auth).get_json()['data']['grid']['rows']
+    assert [row['Value'] for row in rows] == [200, 400]
+    assert [row['Label'] for row in rows] == ['Alice', '?']
+    assert pool.stats()['tasks'] > tasks, "Replay ran in the sandbox too"
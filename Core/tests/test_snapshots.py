@@ -0,0 +1,133 @@
+"""
+Tests for replay checkpoints (SnapshotService + _replay_session).
+"""
+import io
+import os
+import pytest
+import openpyxl
+import pandas as pd
+from types import SimpleNamespace
+from unittest.mock import patch
+from uuid import uuid4
+
+from app.services import snapshot_service
+from app.services.snapshot_service import SnapshotService
+from app.services.code_execution_service import CodeExecutionService
+from app.services.dataframe_cache import dataframe_cache
+
+
+@pytest.fixture()
+def snapshot_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot_service, 'SNAPSHOT_FOLDER', str(tmp_path))
+    monkeypatch.setattr(snapshot_service, 'SNAPSHOT_INTERVAL', 2)
+    monkeypatch.setattr(snapshot_service, 'SNAPSHOT_MIN_SECONDS', 60.0)
+    return tmp_path
+
+
+def _fake_session(conversation_id, codes):
+    commands = [
+        SimpleNamespace(id=i + 1, generated_code=code, intent_type='DATA_MUTATION')
+        for i, code in enumerate(codes)
+    ]
+    return {
+        'initial_df': pd.DataFrame({'a': [1, 2, 3]}),
+        'commands': commands,
+        'conversation': SimpleNamespace(id=conversation_id, file_path='unused.xlsx'),
+    }
+
+
+def test_replay_resumes_from_checkpoint(snapshot_dir):
+    """A second replay loads the newest checkpoint and only executes the tail."""
+    from app.routes.excel import _replay_session
+
+    session = _fake_session(-1, ["df['a'] = df['a'] + 1"] * 3)
+    full = _replay_session(session)
+    assert os.path.exists(os.path.join(snapshot_dir, '-1', '2.parquet'))
+    dataframe_cache.invalidate(-1)  # Simulate a cold worker
+
+    with patch.object(
+        CodeExecutionService, 'execute_transformation',
+        wraps=CodeExecutionService.execute_transformation
+    ) as spy:
+        resumed = _replay_session(session)
+
+    assert spy.call_count == 1, f"Expected only the tail to run, got {spy.call_count} executions"
+    pd.testing.assert_frame_equal(full, resumed)
+    assert resumed['a'].tolist() == [4, 5, 6]
+
+
+def test_load_latest_ignores_foreign_commands(snapshot_dir):
+    """Checkpoints for commands no longer in the active history are not used."""
+    SnapshotService.save(2, 99, pd.DataFrame({'a': [0]}))
+    applied, df = SnapshotService.load_latest(2, [1, 2, 3])
+    assert applied == 0 and df is None
+
+
+def test_mixed_frame_is_checkpointed(snapshot_dir):
+    """Mixed object columns are stored as text and restored cell by cell from the type sidecar."""
+    mixed = pd.DataFrame({'a': [1, 'x', 2.5, True]})
+    assert SnapshotService.save(3, 1, mixed) is True
+    applied, df = SnapshotService.load_latest(3, [1])
+    assert applied == 1 and df['a'].tolist() == [1, 'x', 2.5, True]
+    assert [type(value) for value in df['a']] == [int, str, float, bool]
+
+
+def test_frames_parquet_cannot_hold_are_not_checkpointed(snapshot_dir):
+    assert SnapshotService.save(3, 1, pd.DataFrame({'a': [1, 'x', pd.Timedelta('1h')]})) is False
+    assert SnapshotService.save(3, 2, pd.DataFrame({0: [1, 2]})) is False
+    assert SnapshotService.load_latest(3, [1, 2]) == (0, None)
+
+
+def _make_authenticated_client(client):
+    email = f"snaptest_{uuid4().hex[:8]}@example.com"
+    client.post('/auth/register', json={'email': email, 'password': 'Password1!'})
+    resp = client.post('/auth/login', json={'email': email, 'password': 'Password1!'})
+    return resp.get_json()['token']
+
+
+def _upload_test_xlsx(client, token):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws['A1'] = 'Name'
+    ws['B1'] = 'Value'
+    ws['A2'] = 'Alice'
+    ws['B2'] = 100
+    buf = io.BytesIO()
+    wb.save(buf)
+    buf.seek(0)
+    resp = client.post(
+        '/excel/upload',
+        data={'file': (buf, 'test.xlsx')},
+        headers={'Authorization': f'Bearer {token}'},
+        content_type='multipart/form-data'
+    )
+    assert resp.status_code == 200, f"Upload failed: {resp.data}"
+    return resp.get_json()['session_id']
+
+
+def test_undo_discards_checkpoint(client, snapshot_dir, monkeypatch):
+    """Undoing a checkpointed command removes its snapshot so it can never be replayed."""
+    monkeypatch.setattr(snapshot_service, 'SNAPSHOT_INTERVAL', 1)
+    token = _make_authenticated_client(client)
+    session_id = _upload_test_xlsx(client, token)
+
+    mock_return = {'code': "df['Value'] = df['Value'] * 2", 'explanation': 'Doubled.', 'intent': 'DATA_MUTATION'}
+    with patch('app.routes.excel.LLMService.generate_transformation_code', return_value=mock_return):
+        resp = client.post(
+            '/excel/transform',
+            data={'session_id': str(session_id), 'prompt': 'double'},
+            headers={'Authorization': f'Bearer {token}'},
+        )
+        resp.data
+
+    folder = os.path.join(snapshot_dir, str(session_id))
+    assert len(os.listdir(folder)) == 1, "Transform should have checkpointed the new command"
+
+    resp = client.post(
+        '/excel/undo',
+        data={'session_id': str(session_id)},
+        headers={'Authorization': f'Bearer {token}'},
+    )
+    assert resp.status_code == 200
+    assert resp.get_json()['data']['rows'][0]['Value'] == 100
+    assert os.listdir(folder) == [], "Undo must discard the undone command's checkpoint"
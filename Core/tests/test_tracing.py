@@ -0,0 +1,147 @@
+"""
+Tests for per-stage transform tracing: the Trace timer, the [TRACE] log line, the
+debug timings on the done event and the metrics stored on each command.
+"""
+import io
+import json
+import time
+import openpyxl
+from unittest.mock import patch
+from uuid import uuid4
+
+import app.routes.excel
+from app.services.tracing import Trace
+
+
+def _make_authenticated_client(client):
+    email = f"trace_{uuid4().hex[:8]}@example.com"
+    client.post('/auth/register', json={'email': email, 'password': 'Password1!'})
+    resp = client.post('/auth/login', json={'email': email, 'password': 'Password1!'})
+    return resp.get_json()['token']
+
+
+def _upload_test_xlsx(client, token):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(['Name', 'Value'])
+    ws.append(['Alice', 100])
+    ws.append(['Bob', 200])
+    ws.append(['Carol', 300])
+    buf = io.BytesIO()
+    wb.save(buf)
+    buf.seek(0)
+    resp = client.post(
+        '/excel/upload',
+        data={'file': (buf, 'test.xlsx')},
+        headers={'Authorization': f'Bearer {token}'},
+        content_type='multipart/form-data'
+    )
+    assert resp.status_code == 200, f"Upload failed: {resp.data}"
+    return resp.get_json()['session_id']
+
+
+def _transform(client, session_id, token, code, intent='DATA_MUTATION'):
+    reply = {'code': code, 'explanation': 'ok', 'intent': intent}
+    with patch('app.routes.excel.LLMService.generate_transformation_code', return_value=reply):
+        body = client.post(
+            '/excel/transform',
+            data={'session_id': str(session_id), 'prompt': 'step'},
+            headers={'Authorization': f'Bearer {token}'}
+        ).get_data(as_text=True)
+    done = [b for b in body.split('\n\n') if b.startswith('event: done')][0]
+    return json.loads(done.split('data: ', 1)[1])
+
+
+def _commands(session_id):
+    from app.models import Command
+    from config.database import SessionLocal
+    with SessionLocal() as db:
+        return db.query(Command).filter_by(conversation_id=session_id).order_by(Command.id).all()
+
+
+def _trace_lines(output):
+    return [json.loads(line[len('[TRACE] '):]) for line in output.splitlines() if line.startswith('[TRACE] {')]
+
+
+def test_stages_accumulate():
+    trace = Trace('unit', user='u1')
+    with trace.stage('llm'):
+        time.sleep(0.01)
+    with trace.stage('llm'):
+        time.sleep(0.01)
+    trace.count(rows_in=3)
+
+    assert trace.ms('llm') >= 20
+    assert trace.ms('execute') is None
+    breakdown = trace.breakdown()
+    assert list(breakdown) == ['llm', 'total']
+    assert breakdown['total'] >= breakdown['llm']
+
+
+def test_stage_is_timed_when_it_raises():
+    trace = Trace('unit')
+    try:
+        with trace.stage('execute'):
+            raise ValueError('boom')
+    except ValueError:
+        pass
+    assert 'execute' in trace.timings
+
+
+def test_transform_logs_one_trace_line(client, capsys):
+    token = _make_authenticated_client(client)
+    session_id = _upload_test_xlsx(client, token)
+    capsys.readouterr()
+
+    done = _transform(client, session_id, token, "df = df[df['Value'] > 100]")
+
+    assert 'timings' not in done, "Timings only ride the event in debug mode"
+    [line] = _trace_lines(capsys.readouterr().out)
+    assert line['trace'] == 'transform' and line['intent'] == 'DATA_MUTATION'
+    assert {'session', 'replay', 'parse', 'llm', 'execute', 'grid', 'serialize', 'total'} <= set(line['ms'])
+    assert line['rows_in'] == 3 and line['rows_out'] == 2
+    assert line['payload_bytes'] > 0
+
+
+def test_transform_persists_command_metrics(client):
+    token = _make_authenticated_client(client)
+    session_id = _upload_test_xlsx(client, token)
+
+    _transform(client, session_id, token, "df = df[df['Value'] > 100]")
+    _transform(client, session_id, token, "fig = px.bar(df, x='Name', y='Value')", intent='VISUAL_UPDATE')
+
+    mutation, chart = _commands(session_id)
+    assert mutation.llm_ms is not None and mutation.exec_ms is not None
+    assert (mutation.rows_in, mutation.rows_out) == (3, 2)
+    assert mutation.payload_bytes > 0
+    assert (chart.rows_in, chart.rows_out) == (2, 2)
+    assert chart.exec_ms is None, "Chart rendering is timed as its own stage"
+    assert chart.payload_bytes > mutation.payload_bytes
+
+
+def test_fast_path_has_no_llm_time(client):
+    token = _make_authenticated_client(client)
+    session_id = _upload_test_xlsx(client, token)
+
+    with patch('app.routes.excel.LLMService.generate_transformation_code') as llm:
+        client.post(
+            '/excel/transform',
+            data={'session_id': str(session_id), 'prompt': 'sort by Value descending'},
+            headers={'Authorization': f'Bearer {token}'}
+        ).get_data()
+    llm.assert_not_called()
+
+    [command] = _commands(session_id)
+    assert command.llm_ms is None
+    assert command.exec_ms is not None
+
+
+def test_debug_flag_attaches_timings(client, monkeypatch):
+    monkeypatch.setattr(app.routes.excel, 'TRACE_DEBUG', True)
+    token = _make_authenticated_client(client)
+    session_id = _upload_test_xlsx(client, token)
+
+    done = _transform(client, session_id, token, "df['Value'] = df['Value'] * 2")
+
+    assert done['data'] is not None
+    assert {'session', 'llm', 'execute', 'total'} <= set(done['timings'])
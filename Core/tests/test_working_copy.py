@@ -0,0 +1,55 @@
+"""
+Tests for working copies on the replay path: the caller's frame is never changed, only
+the first replay step copies, and generated code keeps pandas' default (non copy-on-write)
+semantics, so stored command histories replay to the same data.
+"""
+import pandas as pd
+import pytest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from app.services.code_execution_service import CodeExecutionService
+from app.services.sandbox_pool import sandbox_pool
+
+
+@pytest.fixture(autouse=True)
+def in_process(monkeypatch):
+    """Pin the in-process path regardless of the environment the suite runs in."""
+    monkeypatch.setenv('SANDBOX_ENABLED', '0')
+    monkeypatch.setattr(sandbox_pool, 'enabled', False)
+
+
+def test_copy_on_write_is_not_forced(app):
+    assert not pd.options.mode.copy_on_write
+
+
+@pytest.mark.parametrize('code, column, expected', [
+    ("df['a'].fillna(0, inplace=True)", 'a', [1.0, 0.0, 3.0]),
+    ("df['b'][0] = 999", 'b', [999, 5, 6]),
+])
+def test_generated_idioms_modify_the_frame(app, code, column, expected):
+    shared = pd.DataFrame({'a': [1.0, None, 3.0], 'b': [4, 5, 6]})
+    result = CodeExecutionService.execute_transformation(shared, code)
+    assert result[column].tolist() == expected
+    assert shared['a'].isna().sum() == 1 and shared['b'].tolist() == [4, 5, 6], "The caller's frame must never change"
+
+
+def test_replay_copies_only_for_the_first_step(app):
+    from app.routes.excel import _replay_session
+
+    initial = pd.DataFrame({'a': [1, 2, 3]})
+    commands = [
+        SimpleNamespace(id=None, generated_code="df.loc[0, 'a'] = df.loc[0, 'a'] + 10", intent_type='DATA_MUTATION')
+        for _ in range(4)
+    ]
+    session = {
+        'initial_df': initial,
+        'commands': commands,
+        'conversation': SimpleNamespace(id=-4, file_path='unused.xlsx'),
+    }
+    with patch.object(CodeExecutionService, 'working_copy', wraps=CodeExecutionService.working_copy) as spy:
+        result = _replay_session(session)
+
+    assert spy.call_count == 1
+    assert result['a'].tolist() == [41, 2, 3]
+    assert initial['a'].tolist() == [1, 2, 3]
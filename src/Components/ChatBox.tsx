@@ -5,6 +5,7 @@ import { Sparkles, X, Send, Bot, User, Code, BarChart, Type } from 'lucide-react
 import type { Message } from '../Pages/Dashboard';
 import { toast } from 'sonner';
 import { API_BASE_URL } from '../utils/api';
+import type { GridData, GridPatch } from '../utils/gridPatch';
 
 interface ChatBoxProps {
     isOpen?: boolean;
@@ -14,6 +15,7 @@ interface ChatBoxProps {
     onLoadingStep?: (step: string) => void;
     file?: File | null;
     onUpdateGrid?: (data: { columns: string[], rows: Record<string, unknown>[] }) => void;
+    onPatchGrid?: (patch: GridPatch) => Promise<GridData | null>;
     onUpdateFile?: (file: File) => void;
     onChartGenerated?: (chartData: { data: Data[]; layout: Record<string, unknown> }) => void;
     messages: Message[];
@@ -57,7 +59,7 @@ const generateCsvFile = (columns: string[], rows: Record<string, unknown>[]): Fi
 
 export function ChatBox({
     isOpen = false, onOpenChange, setAppState, onLoadingStep,
-    file: _file, onUpdateFile, onUpdateGrid, onChartGenerated,
+    file: _file, onUpdateFile, onUpdateGrid, onPatchGrid, onChartGenerated,
     messages, setMessages, sessionId,
 }: ChatBoxProps) {
     const [prompt, setPrompt] = useState('');
@@ -105,6 +107,7 @@ export function ChatBox({
                 body: new URLSearchParams({
                     ...(sessionId ? { session_id: sessionId } : {}),
                     prompt: contentToSend,
+                    ...(onPatchGrid ? { delta: '1' } : {}),
                 }),
             });
 
@@ -117,6 +120,7 @@ export function ChatBox({
             const reader = response.body!.getReader();
             const decoder = new TextDecoder();
             let buffer = '';
+            let streamedExplanation = '';
 
             while (true) {
                 const { done, value } = await reader.read();
@@ -137,8 +141,17 @@ export function ChatBox({
                     if (eventType === 'progress') {
                         if (payload.step) onLoadingStep?.(payload.step);
                         setAppState?.('result');
+                    } else if (eventType === 'token') {
+                        streamedExplanation += payload.text;
+                        onLoadingStep?.(streamedExplanation);
                     } else if (eventType === 'done') {
                         onLoadingStep?.('Done');
+                        if ((payload.type === 'update' || payload.type === 'formula') && payload.patch && onPatchGrid) {
+                            const patched = await onPatchGrid(payload.patch);
+                            if (patched && onUpdateFile) {
+                                onUpdateFile(generateCsvFile(patched.columns, patched.rows));
+                            }
+                        }
                         if ((payload.type === 'update' || payload.type === 'formula') && onUpdateGrid && payload.data) {
                             onUpdateGrid(payload.data);
                             if (onUpdateFile) {
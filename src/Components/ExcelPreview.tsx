@@ -7,9 +7,10 @@ interface ExcelPreviewProps {
   file?: File | null;
   gridData?: { columns: string[]; rows: Record<string, unknown>[] } | null;
   className?: string;
+  onLoadMore?: () => void;
 }
 
-export function ExcelPreview({ file, gridData, className }: ExcelPreviewProps) {
+export function ExcelPreview({ file, gridData, className, onLoadMore }: ExcelPreviewProps) {
   const [parsedData, setParsedData] = useState<{
     columns: string[];
     rows: Record<string, unknown>[];
@@ -75,6 +76,10 @@ export function ExcelPreview({ file, gridData, className }: ExcelPreviewProps) {
           className="rdg-light h-full border-0 text-sm"
           defaultColumnOptions={{ sortable: true, resizable: true }}
           style={{ height: '100%' }}
+          onScroll={(e) => {
+            const target = e.currentTarget;
+            if (onLoadMore && target.scrollTop + target.clientHeight >= target.scrollHeight - 300) onLoadMore();
+          }}
         />
       </div>
     );
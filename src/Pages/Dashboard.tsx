@@ -1,4 +1,4 @@
-import { useEffect, useState } from 'react'
+import { useEffect, useRef, useState } from 'react'
 import {
   Upload, FileSpreadsheet, Sparkles, ChevronLeft, ChevronRight,
   Undo, LogOut, Trash, Search,
@@ -10,6 +10,7 @@ import { ExcelPreview } from '../Components/ExcelPreview';
 import { useNavigate } from 'react-router-dom';
 import { toast, Toaster } from 'sonner';
 import { apiFetch } from '../utils/api';
+import { applyGridPatch, type GridData, type GridPatch } from '../utils/gridPatch';
 
 export interface Message {
   id: string;
@@ -30,6 +31,8 @@ export interface Conversation {
   messages: Message[];
 }
 
+const MAX_WINDOW_ROWS = 10000; // GRID_MAX_WINDOW_ROWS on the server
+
 // ─── tiny hover helper (avoids repetitive onMouseEnter/Leave pairs) ──────────
 function useHover(
   normalStyle: React.CSSProperties,
@@ -50,7 +53,9 @@ function Dashboard() {
   const [chatOpen, setChatOpen] = useState(false);
   const [conversations, setConversations] = useState<Conversation[]>([]);
   const [fileName, setFileName] = useState('');
-  const [gridData, setGridData] = useState<{ columns: string[], rows: Record<string, unknown>[] } | null>(null);
+  const [gridData, setGridData] = useState<GridData | null>(null);
+  const gridRef = useRef<GridData | null>(null);
+  gridRef.current = gridData;
   const [currentFile, setCurrentFile] = useState<File | null>(null);
   const [user, setUser] = useState<User | null>(null);
   const [chartData, setChartData] = useState<{ data: Data[]; layout: Record<string, unknown> } | null>(null);
@@ -65,6 +70,7 @@ function Dashboard() {
   const [searchTerm, setSearchTerm] = useState('');
   const [activeConversationId, setActiveConversationId] = useState<string | null>(null);
   const [loadingStep, setLoadingStep] = useState('');
+  const [isFetchingRows, setIsFetchingRows] = useState(false);
 
   const findColumnByValues = (arr: unknown[] | undefined, grid: { columns: string[]; rows: Record<string, unknown>[] } | null) => {
     if (!arr || !grid) return null;
@@ -221,11 +227,13 @@ function Dashboard() {
     try {
       const formData = new FormData();
       formData.append('session_id', sessionId);
+      formData.append('delta', '1');
       const response = await apiFetch('/excel/undo', { method: 'POST', body: formData });
       if (!response.ok) throw new Error('Failed to undo');
       const data = await response.json();
-      if (data.status === 'success' && data.data) {
-        setGridData(data.data);
+      if (data.status === 'success' && (data.data || data.patch)) {
+        if (data.patch) await patchGrid(data.patch);
+        else setGridData(data.data);
         if (!data.has_chart) setChartData(null);
         else if (data.chart_data) setChartData(data.chart_data);
         if (data.undone === false) setHasModifications(false);
@@ -318,6 +326,56 @@ function Dashboard() {
     setHasModifications(true);
   };
 
+  // A patch only covers the embedded window: rows the user had already scrolled past it
+  // are reloaded from the new state instead of being dropped
+  const patchGrid = async (patch: GridPatch): Promise<GridData | null> => {
+    const current = gridRef.current;
+    if (!current) return null;
+    let next = applyGridPatch(current, patch);
+    const held = Math.min(current.rows.length, patch.total_rows);
+    if (sessionId && held > next.rows.length) {
+      // The server caps one request at GRID_MAX_WINDOW_ROWS; scrolling loads anything beyond
+      const limit = Math.min(held - next.rows.length, MAX_WINDOW_ROWS);
+      try {
+        const response = await apiFetch(
+          `/excel/conversation/${sessionId}/rows?offset=${next.rows.length}&limit=${limit}`
+        );
+        if (!response.ok) throw new Error('Failed to load rows');
+        const data = await response.json();
+        if (data.status === 'success' && data.data) next = { ...next, rows: [...next.rows, ...data.data.rows] };
+      } catch (error) {
+        console.error('Error reloading rows:', error);
+      }
+    }
+    setGridData(next);
+    return next;
+  };
+
+  const handleGridPatch = async (patch: GridPatch) => {
+    const next = await patchGrid(patch);
+    setHasModifications(true);
+    return next;
+  };
+
+  // Responses only embed the first window of rows; fetch the next one as the grid scrolls
+  const handleLoadMoreRows = async () => {
+    if (!gridData || !sessionId || isFetchingRows) return;
+    if (gridData.total_rows === undefined || gridData.rows.length >= gridData.total_rows) return;
+    setIsFetchingRows(true);
+    try {
+      const response = await apiFetch(`/excel/conversation/${sessionId}/rows?offset=${gridData.rows.length}`);
+      if (!response.ok) throw new Error('Failed to load rows');
+      const data = await response.json();
+      if (data.status === 'success' && data.data) {
+        setGridData(prev => prev ? { ...prev, rows: [...prev.rows, ...data.data.rows] } : prev);
+      }
+    } catch (error) {
+      console.error('Error loading rows:', error);
+    } finally {
+      setIsFetchingRows(false);
+    }
+  };
+
   // ── hover helpers ────────────────────────────────────────────────────────
   const sidebarToggleHover = useHover(
     { color: 'rgba(255,255,255,0.35)' },
@@ -712,7 +770,7 @@ function Dashboard() {
                         <div>
                           <h3 className="text-sm font-semibold" style={{ color: '#f8fafc' }}>Data Preview</h3>
                           <p className="text-[11px]" style={{ color: 'rgba(255,255,255,0.32)' }}>
-                            {filteredRows.length} rows · {gridData.columns.length} columns
+                            {searchTerm ? filteredRows.length : (gridData.total_rows ?? filteredRows.length)} rows · {gridData.columns.length} columns
                           </p>
                         </div>
                       </div>
@@ -744,6 +802,7 @@ function Dashboard() {
                     <div className="flex-1 overflow-hidden min-h-0">
                       <ExcelPreview
                         gridData={searchTerm ? { columns: gridData.columns, rows: filteredRows } : gridData}
+                        onLoadMore={searchTerm ? undefined : handleLoadMoreRows}
                         className="h-full"
                       />
                     </div>
@@ -774,6 +833,7 @@ function Dashboard() {
                 file={currentFile}
                 onUpdateFile={setCurrentFile}
                 onUpdateGrid={handleGridUpdate}
+                onPatchGrid={handleGridPatch}
                 messages={messages}
                 setMessages={setMessages}
                 onChartGenerated={setChartData}
@@ -0,0 +1,51 @@
+export interface GridData {
+    columns: string[];
+    rows: Record<string, unknown>[];
+    total_rows?: number;
+}
+
+export interface GridPatch {
+    columns: string[];
+    total_rows: number;
+    limit: number;
+    removed_columns: string[];
+    renamed_columns: Record<string, string>;
+    deleted_rows: [number, number][];
+    inserted_rows: { at: number; rows: Record<string, unknown>[] }[];
+    cells: Record<string, { rows: number[]; values: unknown[] }>;
+}
+
+/**
+ * Apply a server grid patch (sent for delta=1 requests) to the rows currently held.
+ * Order matters and mirrors FrameDiff on the backend: truncate to the patched window,
+ * delete old positions, rename/remove columns, insert at new positions, then set cells.
+ * Rows held past the window are stale after the patch; the dashboard reloads them.
+ */
+export const applyGridPatch = (grid: GridData, patch: GridPatch): GridData => {
+    let rows = grid.rows.slice(0, patch.limit);
+
+    for (const [start, stop] of [...patch.deleted_rows].reverse()) {
+        rows.splice(start, stop - start);
+    }
+
+    rows = rows.map(row => {
+        const next: Record<string, unknown> = {};
+        for (const [key, value] of Object.entries(row)) {
+            if (patch.removed_columns.includes(key)) continue;
+            next[patch.renamed_columns[key] ?? key] = value;
+        }
+        return next;
+    });
+
+    for (const run of patch.inserted_rows) {
+        rows.splice(run.at, 0, ...run.rows);
+    }
+
+    for (const [col, change] of Object.entries(patch.cells)) {
+        change.rows.forEach((position, i) => {
+            rows[position] = { ...rows[position], [col]: change.values[i] };
+        });
+    }
+
+    return { columns: patch.columns, rows, total_rows: patch.total_rows };
+};